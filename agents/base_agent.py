@@ -4,6 +4,9 @@ import json
 from datetime import datetime
 
 class BaseAgent(ABC):
+    # Learned state kept across restarts by services.agent_state
+    STATE_FIELDS = ()
+    
     def __init__(self, agent_id, role, goal, backstory):
         self.agent_id = agent_id
         self.role = role
@@ -23,7 +26,7 @@ class BaseAgent(ABC):
         }
         try:
             response = requests.post(f"http://localhost:5000/api/agent/{recipient_id}/message", 
-                                   json=payload)
+                                   json=payload, timeout=5)
             return response.json()
         except Exception as e:
             print(f"Message send failed: {e}")
@@ -36,4 +39,14 @@ class BaseAgent(ABC):
     
     def update_status(self, status):
         self.status = status
-        self.last_update = datetime.now()
\ No newline at end of file
+        self.last_update = datetime.now()
+    
+    def export_state(self):
+        """Learned state to snapshot (field name -> value)"""
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+    
+    def load_state(self, state):
+        """Restore learned state produced by export_state"""
+        for field in self.STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
@@ -0,0 +1,225 @@
+"""
+Bundle Auction - Winner determination for combinatorial (multi-order) bids
+Orders in a batch are grouped into candidate bundles of nearby orders, each
+agent bids its cost for every bundle it can carry, and the allocation that
+covers the most orders at the lowest total cost is chosen: exactly by CP-SAT
+within a time limit, or greedily by cost per order when no solver is available.
+Orders left over are re-auctioned in further rounds at each agent's marginal
+cost, so an agent can win several disjoint bundles, and the result is never
+worse than auctioning the orders one at a time.
+"""
+
+import os
+import time
+from itertools import combinations
+
+import numpy as np
+
+from services.pricing import haversine_km
+
+BUNDLE_MAX_SIZE = int(os.getenv('BUNDLE_MAX_SIZE', '3'))
+BUNDLE_RADIUS_KM = float(os.getenv('BUNDLE_RADIUS_KM', '5'))
+BUNDLE_MAX_CANDIDATES = int(os.getenv('BUNDLE_MAX_CANDIDATES', '2000'))
+BUNDLE_SOLVER_TIME = int(os.getenv('BUNDLE_SOLVER_TIME_MS', '200')) / 1000
+
+# Costs go to the solver as integers in hundredths
+COST_SCALE = 100
+
+def _cp_model():
+    """OR-Tools CP-SAT, imported on first solve (it adds ~0.4 s to startup); None if not installed"""
+    try:
+        from ortools.sat.python import cp_model
+    except ImportError:
+        return None
+    return cp_model
+
+def _coordinates(orders, key):
+    return np.array([[o[key]['lat'], o[key]['lng']] for o in orders], dtype=np.float64)
+
+def _pairwise_km(points):
+    return haversine_km(points[:, None, 0], points[:, None, 1], points[None, :, 0], points[None, :, 1])
+
+def candidate_bundles(orders, max_size=BUNDLE_MAX_SIZE, radius_km=BUNDLE_RADIUS_KM,
+                      max_candidates=BUNDLE_MAX_CANDIDATES):
+    """Tuples of order indexes: every single order, then groups of up to max_size
+    orders whose pickups and deliveries are all within radius_km of each other"""
+    bundles = [(i,) for i in range(len(orders))]
+    if len(orders) < 2 or max_size < 2:
+        return bundles
+
+    near = ((_pairwise_km(_coordinates(orders, 'pickup_location')) <= radius_km) &
+            (_pairwise_km(_coordinates(orders, 'delivery_location')) <= radius_km))
+    neighbours = [set(np.flatnonzero(row[i + 1:]) + i + 1) for i, row in enumerate(near)]
+
+    # Smaller bundles first, so the cap drops the largest combinations
+    for size in range(2, max_size + 1):
+        for i in range(len(orders)):
+            for rest in combinations(sorted(neighbours[i]), size - 1):
+                if all(b in neighbours[a] for a, b in combinations(rest, 2)):
+                    if len(bundles) >= max_candidates:
+                        return bundles
+                    bundles.append((i,) + rest)
+    return bundles
+
+def greedy_allocation(bids, order_count):
+    """Cheapest cost per order first; each agent wins at most one bundle"""
+    taken_agents, covered, allocation = set(), set(), []
+    for agent_id, bundle, cost in sorted(bids, key=lambda bid: bid[2] / len(bid[1])):
+        if agent_id in taken_agents or covered.intersection(bundle):
+            continue
+        allocation.append((agent_id, bundle, cost))
+        taken_agents.add(agent_id)
+        covered.update(bundle)
+        if len(covered) == order_count:
+            break
+    return allocation
+
+def solve_allocation(bids, order_count, time_limit=BUNDLE_SOLVER_TIME):
+    """Pick winning bids: each order at most once, each agent at most one bundle,
+    fewest unassigned orders, then lowest total cost
+
+    bids are (agent_id, bundle, cost) tuples. Returns (allocation, info) where
+    info has the solver used, whether the result is proven optimal and solve_ms.
+    With no time left (time_limit <= 0) the greedy allocation is returned.
+    """
+    started = time.perf_counter()
+    allocation, solver_name, optimal = None, 'greedy', False
+
+    cp_model = _cp_model() if bids and time_limit > 0 else None
+    if cp_model is not None:
+        model = cp_model.CpModel()
+        chosen = [model.NewBoolVar(f'b{k}') for k in range(len(bids))]
+        unassigned = [model.NewBoolVar(f'u{i}') for i in range(order_count)]
+        by_order = [[] for _ in range(order_count)]
+        by_agent = {}
+        for k, (agent_id, bundle, _) in enumerate(bids):
+            for i in bundle:
+                by_order[i].append(chosen[k])
+            by_agent.setdefault(agent_id, []).append(chosen[k])
+        for i in range(order_count):
+            model.Add(sum(by_order[i]) + unassigned[i] == 1)
+        for variables in by_agent.values():
+            model.AddAtMostOne(variables)
+
+        costs = [int(round(cost * COST_SCALE)) for _, _, cost in bids]
+        # Leaving an order out always costs more than any assignment could save
+        penalty = sum(costs) + 1
+        model.Minimize(sum(c * x for c, x in zip(costs, chosen)) + penalty * sum(unassigned))
+
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = max(0.01, time_limit)
+        status = solver.Solve(model)
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            allocation = [bids[k] for k, x in enumerate(chosen) if solver.Value(x)]
+            solver_name, optimal = 'cp-sat', status == cp_model.OPTIMAL
+
+    if allocation is None:
+        allocation = greedy_allocation(bids, order_count)
+
+    return allocation, {
+        'solver': solver_name,
+        'optimal': optimal,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def _marginal_bids(orders, agents, won, spent, remaining, deadline):
+    """Bids on bundles of the remaining orders at what each adds to the agent's
+    cost of carrying the orders it already won; bundles index into remaining.
+    Single orders are priced first, larger bundles only until the deadline."""
+    subset = [orders[i] for i in remaining]
+    bids = []
+    for bundle in candidate_bundles(subset):
+        if len(bundle) > 1 and time.perf_counter() > deadline:
+            break
+        extra = [subset[i] for i in bundle]
+        for agent_id, agent in agents.items():
+            cost = agent.calculate_bundle_cost([orders[j] for j in won[agent_id]] + extra)
+            if cost is not None:
+                bids.append((agent_id, bundle, max(0.0, cost - spent[agent_id])))
+    return bids
+
+def _auction_one_at_a_time(orders, agents, won, spent, indexes):
+    """Each order to the lowest marginal bid given what the agents already won;
+    won and spent (agent id -> order indexes / cost of carrying them) are updated"""
+    for i in indexes:
+        best = None
+        for agent_id, agent in agents.items():
+            cost = agent.calculate_bundle_cost([orders[j] for j in won[agent_id]] + [orders[i]])
+            if cost is not None and (best is None or cost - spent[agent_id] < best[1]):
+                best = (agent_id, cost - spent[agent_id], cost)
+        if best is not None:
+            won[best[0]].append(i)
+            spent[best[0]] = best[2]
+
+def allocate_bundles(orders, agents, bids, time_limit=BUNDLE_SOLVER_TIME):
+    """Winner determination in rounds, so an agent can win several disjoint bundles
+
+    The first round solves the agents' own bids (bundle indexes into orders); each
+    later round re-prices the bundles of the orders still unassigned at their
+    marginal cost to every agent, until all are covered or nothing more fits.
+    Rounds share time_limit; orders still open when it runs out are auctioned one
+    at a time. An agent's cost is that of carrying everything it won, and when
+    auctioning all the orders one at a time covers more orders, or as many for
+    less, that allocation is returned instead.
+
+    agents maps agent id -> an agent with calculate_bundle_cost. Returns
+    {agent id: [order indexes]}, the total cost and an info dict.
+    """
+    started = time.perf_counter()
+    deadline = started + time_limit
+    won = {agent_id: [] for agent_id in agents}
+    spent = {agent_id: 0.0 for agent_id in agents}
+    remaining = list(range(len(orders)))
+    first, rounds = None, 0
+
+    while remaining and bids:
+        allocation, info = solve_allocation(bids, len(remaining), deadline - time.perf_counter())
+        first = first or info
+        rounds += 1
+        if not allocation:
+            break
+        assigned = set()
+        for agent_id, bundle, _ in allocation:
+            won[agent_id].extend(remaining[i] for i in bundle)
+            spent[agent_id] = agents[agent_id].calculate_bundle_cost([orders[i] for i in won[agent_id]])
+            assigned.update(remaining[i] for i in bundle)
+        remaining = [i for i in remaining if i not in assigned]
+        if not remaining:
+            break
+        if time.perf_counter() > deadline:
+            _auction_one_at_a_time(orders, agents, won, spent, remaining)
+            break
+        bids = _marginal_bids(orders, agents, won, spent, remaining, deadline)
+
+    won = {agent_id: indexes for agent_id, indexes in won.items() if indexes}
+    cost = sum(spent[agent_id] for agent_id in won)
+    assigned_count = sum(len(indexes) for indexes in won.values())
+
+    sequential, sequential_cost = sequential_allocation(orders, agents)
+    sequential_assigned = sum(len(indexes) for indexes in sequential.values())
+    fallback = (sequential_assigned > assigned_count or
+                (sequential_assigned == assigned_count and sequential_cost < cost))
+    if fallback:
+        won, cost = sequential, sequential_cost
+
+    first = first or {'solver': 'greedy', 'optimal': False}
+    return won, cost, {
+        'solver': 'sequential' if fallback else first['solver'],
+        'optimal': not fallback and rounds == 1 and first['optimal'],
+        'rounds': rounds,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1),
+        'sequential_cost': sequential_cost,
+        'sequential_assigned': sequential_assigned
+    }
+
+def sequential_allocation(orders, agents):
+    """Baseline: the orders auctioned one at a time, each to the lowest marginal bid
+    given what that agent already won earlier in the batch
+
+    agents maps agent id -> an agent with calculate_bundle_cost. Returns
+    {agent id: [order indexes]} and the total cost.
+    """
+    won = {agent_id: [] for agent_id in agents}
+    spent = {agent_id: 0.0 for agent_id in agents}
+    _auction_one_at_a_time(orders, agents, won, spent, range(len(orders)))
+    return {agent_id: indexes for agent_id, indexes in won.items() if indexes}, sum(spent.values())
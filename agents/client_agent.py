@@ -3,6 +3,8 @@ from datetime import datetime
 import requests
 
 class ClientAgent(BaseAgent):
+    STATE_FIELDS = ('learned_patterns', 'order_history', 'satisfaction_scores')
+    
     def __init__(self, agent_id, client_name, preferences=None):
         super().__init__(
             agent_id=agent_id,
@@ -24,7 +24,7 @@ class CoordinatorAgent(BaseAgent):
     def redistribute_tasks(self, failed_agent_id):
         """Redistribute tasks when an agent fails"""
         # Get failed agent's assignments
-        response = requests.get(f"http://localhost:5000/api/agent/{failed_agent_id}/assignments")
+        response = requests.get(f"http://localhost:5000/api/agent/{failed_agent_id}/assignments", timeout=5)
         
         if response.status_code == 200:
             assignments = response.json()["assignments"]
@@ -74,7 +74,7 @@ class CoordinatorAgent(BaseAgent):
         # Collect metrics from all agents
         for agent_id in self.active_agents:
             try:
-                response = requests.get(f"http://localhost:5000/api/agent/{agent_id}/metrics")
+                response = requests.get(f"http://localhost:5000/api/agent/{agent_id}/metrics", timeout=5)
                 if response.status_code == 200:
                     metrics = response.json()
                     self.system_metrics[agent_id] = metrics
@@ -1,8 +1,21 @@
 from .base_agent import BaseAgent
 import requests
+import threading
 from datetime import datetime
+from optimization.eta_model import RouteEta, network_traffic_curve
+from optimization.route_optimizer import build_route_plan
+
+# Insertions are checked against the current plan while it is this fresh (seconds);
+# an older one is rebuilt from the current time first
+ROUTE_PLAN_MAX_AGE = 60
+
+def _has_coordinates(order_data):
+    return all(isinstance(order_data.get(key), dict) and "lat" in order_data[key] and "lng" in order_data[key]
+               for key in ("pickup_location", "delivery_location"))
 
 class DeliveryAgent(BaseAgent):
+    STATE_FIELDS = ('learned_patterns', 'delivery_history', 'route_performance', 'prediction_accuracy')
+    
     def __init__(self, agent_id, vehicle_type="van", capacity=20):
         super().__init__(
             agent_id=agent_id,
@@ -14,8 +27,16 @@ class DeliveryAgent(BaseAgent):
         self.capacity = capacity
         self.current_load = 0
         self.assigned_orders = []
+        # Guards assigned_orders/current_load against readers on other threads (fleet sweeps)
+        self._orders_lock = threading.RLock()
         self.current_location = {"lat": 0, "lng": 0}
         self.route = []
+        # Arrival times and time windows behind self.route
+        self.route_plan = None
+        # Per-stop ETAs from the delivery time model, updated as the driver moves
+        self.route_eta = None
+        # Bumped whenever the route changes, so the traffic agent re-indexes the plan
+        self.route_version = 0
         
         # INTELLIGENCE ADDITIONS
         self.delivery_history = []  # Learn from past deliveries
@@ -38,7 +59,7 @@ class DeliveryAgent(BaseAgent):
         
         try:
             response = requests.post("http://localhost:5000/api/negotiate-assignment", 
-                                   json=negotiation_request)
+                                   json=negotiation_request, timeout=5)
             return response.json() if response.status_code == 200 else {"status": "failed"}
         except:
             return {"status": "failed"}
@@ -61,38 +82,194 @@ class DeliveryAgent(BaseAgent):
         
         return adjusted_cost
     
+    def calculate_bundle_cost(self, orders):
+        """Cost of taking several orders on one trip: all pickups, then all deliveries,
+        each leg to the nearest remaining stop (None when they exceed spare capacity)"""
+        weight = sum(order.get("weight", 1) for order in orders)
+        if self.current_load + weight > self.capacity:
+            return None
+        
+        position = self.current_location
+        distance = 0
+        for key in ("pickup_location", "delivery_location"):
+            remaining = [order[key] for order in orders]
+            while remaining:
+                nearest = min(remaining, key=lambda stop: self.calculate_distance(position, stop))
+                distance += self.calculate_distance(position, nearest)
+                position = nearest
+                remaining.remove(nearest)
+        
+        # Same factors as a single-order bid, so a one-order bundle costs the same
+        base_cost = distance + (self.current_load * 0.1)
+        return base_cost * self._get_time_factor() * self._predict_traffic_impact(orders[0])
+    
+    def calculate_bundle_costs(self, orders, bundles):
+        """Bids for candidate bundles (tuples of indexes into orders) this agent can carry"""
+        bids = []
+        for bundle in bundles:
+            cost = self.calculate_bundle_cost([orders[i] for i in bundle])
+            if cost is not None:
+                bids.append((bundle, cost))
+        return bids
+    
     def calculate_distance(self, loc1, loc2):
         """Simple Euclidean distance calculation"""
         return ((loc1["lat"] - loc2["lat"])**2 + (loc1["lng"] - loc2["lng"])**2)**0.5
     
     def accept_order(self, order_data):
-        """Accept assigned order"""
-        if self.current_load + order_data.get("weight", 1) <= self.capacity:
+        """Accept assigned order if it fits: capacity, and a position that keeps every time window"""
+        # Checked and inserted under one lock, so concurrent assignments cannot both fit
+        with self._orders_lock:
+            if self.current_load + order_data.get("weight", 1) > self.capacity:
+                return False
+            if not self.can_accept(order_data):
+                print(f"\n⏱️ {self.agent_id} cannot meet the time window of order {order_data['order_id']}")
+                return False
+            
             self.assigned_orders.append(order_data)
             self.current_load += order_data.get("weight", 1)
             print(f"\n🚚 {self.agent_id} accepted order {order_data['order_id']}")
             print(f"   Current load: {self.current_load}/{self.capacity} kg")
-            self.optimize_route()
-            return True
-        return False
+            if not self._insert_into_plan(order_data):
+                self.optimize_route()
+        return True
+    
+    def can_accept(self, order_data):
+        """Quick check: can the order be inserted into the plan without breaking a time window?"""
+        if not _has_coordinates(order_data):
+            return True  # no coordinates to plan with: capacity is all that can be checked
+        plan = self.route_plan if self._plan_is_fresh() else None
+        if plan is None:
+            plan, _ = build_route_plan(self.current_location, self.assigned_orders, capacity=self.capacity)
+        return plan.insertion(order_data) is not None
     
     def optimize_route(self):
-        """Request route optimization"""
+        """Plan pickups and deliveries around each order's time window, with arrival times"""
         if self.assigned_orders:
-            # Simple route: pickup then delivery for each order
-            self.route = []
+            plan, rejected = build_route_plan(self.current_location, self.assigned_orders, capacity=self.capacity)
+            # Orders whose window can no longer be met are still delivered, after the rest
+            late = {item['order_id'] for item in rejected if item['reason'] != 'missing_location'}
             for order in self.assigned_orders:
-                self.route.append({
-                    'location': order['pickup_location'],
-                    'type': 'pickup',
-                    'order_id': order['order_id']
-                })
-                self.route.append({
-                    'location': order['delivery_location'],
-                    'type': 'delivery',
-                    'order_id': order['order_id']
-                })
-            print(f"   🛣️ Route optimized: {len(self.route)} stops")
+                if order['order_id'] in late:
+                    plan.append(order, late=True)
+            self.route_plan = plan
+            self.route_eta = RouteEta.from_plan(plan, self.current_location, network_traffic_curve())
+            self._publish_route()
+            print(f"   🛣️ Route optimized: {len(self.route)} stops, {plan.total_minutes:.0f} min"
+                  + (f" ({len(late)} orders late)" if late else ""))
+        elif self.route:
+            self.route = []
+            self.route_plan = None
+            self.route_eta = None
+            self.route_version += 1
+    
+    def _insert_into_plan(self, order_data):
+        """Add an order to a fresh plan at its cheapest feasible position, timing only the
+        new legs of the ETAs; False when the route has to be planned again instead"""
+        plan, route_eta = self.route_plan, self.route_eta
+        if route_eta is None or not self._plan_is_fresh() or not _has_coordinates(order_data):
+            return False
+        best = plan.insertion(order_data)
+        if best is None:
+            return False
+        _, i, j = best
+        pickup, delivery = plan.insert_at(order_data, i, j)
+        # Each goes ahead of the stop that follows it in the plan (the delivery first: it may follow the pickup)
+        for stop, k in ((delivery, j + 2), (pickup, i + 1)):
+            following = plan.stops[k] if k < len(plan.stops) else None
+            before = (following['order_id'], following['type']) if following else None
+            if not route_eta.insert(stop, before, plan.start_time):
+                return False
+        self._publish_route()
+        print(f"   🛣️ Order inserted: {len(self.route)} stops, {plan.total_minutes:.0f} min")
+        return True
+    
+    def _plan_is_fresh(self):
+        return self.route_plan is not None and \
+            (datetime.now() - self.route_plan.start_time).total_seconds() <= ROUTE_PLAN_MAX_AGE
+    
+    def _publish_route(self):
+        """self.route from the plan; orders without coordinates cannot be scheduled and keep
+        plain stops at the end"""
+        route = self.route_plan.route()
+        planned = {stop['order_id'] for stop in self.route_plan.stops}
+        for order in self.assigned_orders:
+            if order['order_id'] not in planned:
+                if order.get('status') != 'picked_up':
+                    route.append({'location': order['pickup_location'], 'type': 'pickup',
+                                  'order_id': order['order_id']})
+                route.append({'location': order['delivery_location'], 'type': 'delivery',
+                              'order_id': order['order_id']})
+        self.route = route
+        self.route_version += 1
+    
+    def get_eta(self, order_id):
+        """Current ETAs of an order on this driver's route (None if it is not on it)"""
+        return self.route_eta.eta(order_id) if self.route_eta is not None else None
+    
+    def update_position(self, lat, lng):
+        """Driver position sample: move and shift the ETAs of the stops ahead"""
+        self.current_location = dict(self.current_location, lat=lat, lng=lng)
+        if self.route_eta is not None:
+            self.route_eta.move(self.current_location)
+    
+    def pickup_order(self, order_id):
+        """The driver collected the order: it stays on board and its pickup leaves the ETAs"""
+        with self._orders_lock:
+            order = next((o for o in self.assigned_orders if o["order_id"] == order_id), None)
+            if order is None:
+                return False
+            order["status"] = "picked_up"
+        self._stop_served(order_id, "pickup")
+        return True
+    
+    def _stop_served(self, order_id, stop_type):
+        """Take a served stop out of the plan and the ETAs; the plan restarts from there"""
+        if not self.assigned_orders:
+            self.optimize_route()
+            return
+        if self.route_plan is not None:
+            self.route_plan.serve(order_id, stop_type)
+        if self.route_eta is not None:
+            self.route_eta.complete(order_id, stop_type)
+        if self.route_plan is not None:
+            self._publish_route()
+    
+    def release_order(self, order_id):
+        """Give up an order not yet picked up (fleet transfer); None if it is not ours to give"""
+        with self._orders_lock:
+            order = next((o for o in self.assigned_orders if o["order_id"] == order_id), None)
+            if order is None or order.get("status") == "picked_up":
+                return None
+            self.assigned_orders.remove(order)
+            self.current_load -= order.get("weight", 1)
+        self.optimize_route()
+        return order
+    
+    def restore_order(self, order_data):
+        """Take back an order released for a transfer that did not go through"""
+        with self._orders_lock:
+            self.assigned_orders.append(order_data)
+            self.current_load += order_data.get("weight", 1)
+        self.optimize_route()
+    
+    def fleet_snapshot(self):
+        """Consistent copy of what a fleet sweep plans with: position, capacity and orders"""
+        with self._orders_lock:
+            return {
+                "agent_id": self.agent_id,
+                "location": dict(self.current_location),
+                "capacity": self.capacity,
+                "orders": [dict(order) for order in self.assigned_orders]
+            }
+    
+    def planned_path(self):
+        """(lat, lng) points of the current plan: position (once known), then each stop"""
+        points = [(stop['location']['lat'], stop['location']['lng'])
+                  for stop in self.route if 'lat' in (stop.get('location') or {})]
+        if points and (self.current_location['lat'] or self.current_location['lng']):
+            points.insert(0, (self.current_location['lat'], self.current_location['lng']))
+        return points
     
     def _get_time_factor(self):
         """LEARNING: Time-based cost adjustment"""
@@ -131,10 +308,13 @@ class DeliveryAgent(BaseAgent):
     
     def complete_delivery(self, order_id, actual_time=None, actual_cost=None):
         """LEARNING: Complete delivery with learning update"""
-        order = next((o for o in self.assigned_orders if o["order_id"] == order_id), None)
+        with self._orders_lock:
+            order = next((o for o in self.assigned_orders if o["order_id"] == order_id), None)
+            if order:
+                self.assigned_orders.remove(order)
+                self.current_load -= order.get("weight", 1)
         if order:
-            self.assigned_orders.remove(order)
-            self.current_load -= order.get("weight", 1)
+            self._stop_served(order_id, "delivery")
             
             # LEARNING: Update from actual results
             if actual_time and actual_cost:
@@ -184,8 +364,16 @@ class DeliveryAgent(BaseAgent):
             order = message["data"]["order"]
             self.accept_order(order)
         
+        elif message["message_type"] == "order_picked_up":
+            self.pickup_order(message["data"]["order_id"])
+        
+        elif message["message_type"] == "order_delivered":
+            data = message["data"]
+            self.complete_delivery(data["order_id"], data.get("actual_time"), data.get("actual_cost"))
+        
         elif message["message_type"] == "route_update":
             self.route = message["data"]["new_route"]
+            self.route_version += 1
             print(f"   🔄 {self.agent_id} received route update")
         
         elif message["message_type"] == "traffic_alert":
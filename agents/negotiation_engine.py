@@ -1,61 +1,267 @@
 """
 Simple negotiation engine for agent communication
 Replaces CrewAI functionality with lightweight implementation
+
+Auctions are sealed-bid: participants near the pickup are asked for their
+cost concurrently, bids that arrive after the auction's deadline are
+excluded, and resolved auctions move to a bounded history. A batch of
+orders can also be auctioned as a whole, with bids on bundles of nearby
+orders (see agents/bundle_auction.py).
 """
 
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from agents.bundle_auction import BUNDLE_SOLVER_TIME, allocate_bundles, candidate_bundles
+
+AUCTION_DEADLINE = int(os.getenv('AUCTION_DEADLINE_MS', '500')) / 1000
+AUCTION_WORKERS = int(os.getenv('AUCTION_WORKERS', '16'))
+AUCTION_MAX_PARTICIPANTS = int(os.getenv('AUCTION_MAX_PARTICIPANTS', '10'))
+AUCTION_RADIUS_KM = float(os.getenv('AUCTION_RADIUS_KM', '15'))
+AUCTION_HISTORY_SIZE = int(os.getenv('AUCTION_HISTORY_SIZE', '1000'))
+
+def _distance_km(location, target):
+    """Haversine distance; infinite when the location is unknown (0, 0)"""
+    if not location or not (location.get('lat') or location.get('lng')):
+        return math.inf
+    lat1, lng1 = math.radians(location['lat']), math.radians(location['lng'])
+    lat2, lng2 = math.radians(target['lat']), math.radians(target['lng'])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
 class NegotiationEngine:
-    def __init__(self):
+    def __init__(self, deadline=AUCTION_DEADLINE, max_workers=AUCTION_WORKERS, history_size=AUCTION_HISTORY_SIZE):
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self.history_size = history_size
         self.active_negotiations = {}
+        self.history = OrderedDict()  # resolved negotiations, oldest first
         self.agent_registry = {}
-    
+        self._lock = threading.Lock()
+        self._executor = None
+        self.stats = {'auctions': 0, 'bids': 0, 'late_bids': 0, 'failed_bids': 0, 'unsold': 0,
+                      'bundle_auctions': 0}
+
     def register_agent(self, agent_id, agent_instance):
         """Register agent for negotiations"""
         self.agent_registry[agent_id] = agent_instance
-    
-    def start_negotiation(self, negotiation_id, participants, task_data):
-        """Start negotiation between agents"""
-        self.active_negotiations[negotiation_id] = {
+
+    def select_participants(self, task_data, limit=AUCTION_MAX_PARTICIPANTS, radius_km=AUCTION_RADIUS_KM):
+        """Registered bidders nearest the pickup: those within radius_km, or the nearest
+        ones anywhere when nobody is that close (unknown positions rank last)"""
+        pickup = task_data.get('pickup_location') or {}
+        bidders = [(agent_id, agent) for agent_id, agent in list(self.agent_registry.items())
+                   if hasattr(agent, 'calculate_delivery_cost')]
+        if 'lat' not in pickup or 'lng' not in pickup:
+            return [agent_id for agent_id, _ in bidders[:limit]]
+
+        ranked = sorted((_distance_km(getattr(agent, 'current_location', None), pickup), agent_id)
+                        for agent_id, agent in bidders)
+        nearby = [agent_id for distance, agent_id in ranked if distance <= radius_km]
+        return (nearby or [agent_id for _, agent_id in ranked])[:limit]
+
+    def start_negotiation(self, negotiation_id, participants, task_data, deadline=None):
+        """Start negotiation between agents: ask every registered participant for a bid
+        concurrently; bids count only if they arrive before the deadline"""
+        self._expire_stale()
+        deadline = self.deadline if deadline is None else deadline
+        negotiation = {
             'participants': participants,
             'task_data': task_data,
             'bids': {},
-            'status': 'active'
+            'status': 'active',
+            'started_at': time.monotonic(),
+            'deadline_at': time.monotonic() + deadline,
+            'pending': {}
         }
-        
+        with self._lock:
+            self.active_negotiations[negotiation_id] = negotiation
+            self.stats['auctions'] += 1
+
         # Request bids from all participants
         for agent_id in participants:
-            if agent_id in self.agent_registry:
-                agent = self.agent_registry[agent_id]
-                if hasattr(agent, 'calculate_delivery_cost'):
-                    cost = agent.calculate_delivery_cost(task_data)
-                    self.submit_bid(negotiation_id, agent_id, cost)
-    
+            agent = self.agent_registry.get(agent_id)
+            if hasattr(agent, 'calculate_delivery_cost'):
+                negotiation['pending'][agent_id] = self._get_executor().submit(agent.calculate_delivery_cost, task_data)
+        return negotiation
+
     def submit_bid(self, negotiation_id, agent_id, bid_value):
-        """Submit bid for negotiation"""
-        if negotiation_id in self.active_negotiations:
-            self.active_negotiations[negotiation_id]['bids'][agent_id] = bid_value
-    
+        """Submit bid for negotiation; False once it is closed or past its deadline"""
+        with self._lock:
+            negotiation = self.active_negotiations.get(negotiation_id)
+            if negotiation is None or negotiation['status'] != 'active' or time.monotonic() > negotiation['deadline_at']:
+                self.stats['late_bids'] += 1
+                return False
+            self._accept_bid(negotiation, agent_id, bid_value)
+            return True
+
+    def _accept_bid(self, negotiation, agent_id, bid_value):
+        negotiation['bids'][agent_id] = bid_value
+        self.stats['bids'] += 1
+
     def resolve_negotiation(self, negotiation_id):
-        """Resolve negotiation and select winner"""
-        if negotiation_id not in self.active_negotiations:
+        """Wait for bids until the deadline at most, close the auction and select the winner"""
+        with self._lock:
+            negotiation = self.active_negotiations.get(negotiation_id)
+        if negotiation is None:
             return None
-        
-        negotiation = self.active_negotiations[negotiation_id]
+
+        excluded = self._close(negotiation_id, negotiation)
+
         bids = negotiation['bids']
-        
         if not bids:
+            self.stats['unsold'] += 1
             return None
-        
+
         # Select agent with lowest cost
         winner = min(bids.keys(), key=lambda x: bids[x])
-        
-        negotiation['status'] = 'resolved'
         negotiation['winner'] = winner
-        
+
         return {
             'winner': winner,
             'winning_bid': bids[winner],
-            'all_bids': bids
+            'all_bids': bids,
+            'excluded': excluded,
+            'elapsed_ms': round((time.monotonic() - negotiation['started_at']) * 1000, 1)
+        }
+
+    def run_auction(self, negotiation_id, task_data, participants=None, deadline=None):
+        """Sealed-bid auction among participants (default: registered agents near the pickup)"""
+        if participants is None:
+            participants = self.select_participants(task_data)
+        self.start_negotiation(negotiation_id, participants, task_data, deadline)
+        return self.resolve_negotiation(negotiation_id)
+
+    def run_bundle_auction(self, negotiation_id, orders, participants=None, deadline=None,
+                           time_limit=BUNDLE_SOLVER_TIME):
+        """Combinatorial auction for a batch of orders: every participant bids on each
+        candidate bundle it can carry, the solver picks the winners in rounds (an agent
+        can win several bundles, priced at its marginal cost) and the result is never
+        worse than auctioning the orders one at a time"""
+        self._expire_stale()
+        deadline = self.deadline if deadline is None else deadline
+        if participants is None:
+            # Everyone who would have bid on any of the orders individually
+            participants = list(dict.fromkeys(agent_id for order in orders
+                                              for agent_id in self.select_participants(order)))
+        bundles = candidate_bundles(orders)
+        negotiation = {
+            'type': 'bundle',
+            'participants': participants,
+            'order_ids': [order['order_id'] for order in orders],
+            'bids': {},
+            'status': 'active',
+            'started_at': time.monotonic(),
+            'deadline_at': time.monotonic() + deadline,
+            'pending': {}
         }
+        with self._lock:
+            self.active_negotiations[negotiation_id] = negotiation
+            self.stats['bundle_auctions'] += 1
+
+        for agent_id in participants:
+            agent = self.agent_registry.get(agent_id)
+            if hasattr(agent, 'calculate_bundle_costs'):
+                negotiation['pending'][agent_id] = self._get_executor().submit(
+                    agent.calculate_bundle_costs, orders, bundles)
+        excluded = self._close(negotiation_id, negotiation)
+
+        bids = [(agent_id, tuple(bundle), cost)
+                for agent_id, agent_bids in negotiation['bids'].items() for bundle, cost in agent_bids]
+        if not bids:
+            self.stats['unsold'] += 1
+            return None
+
+        won, bundle_cost, report = allocate_bundles(
+            orders, {agent_id: self.agent_registry[agent_id] for agent_id in negotiation['bids']},
+            bids, time_limit)
+        assignments = {agent_id: [orders[i]['order_id'] for i in indexes] for agent_id, indexes in won.items()}
+        assigned = {order_id for order_ids in assignments.values() for order_id in order_ids}
+        negotiation['winner'] = assignments
+
+        sequential_cost = report.pop('sequential_cost')
+        report.update({
+            'bundles': len(bundles),
+            'bids': len(bids),
+            'bundle_cost': round(bundle_cost, 4),
+            'bundle_assigned': len(assigned),
+            'sequential_cost': round(sequential_cost, 4),
+            # Only comparable when both allocations cover the same number of orders
+            'savings_pct': round((sequential_cost - bundle_cost) / sequential_cost * 100, 1)
+                           if sequential_cost and report['sequential_assigned'] == len(assigned) else None
+        })
+        return {
+            'assignments': assignments,
+            'unassigned': [order_id for order_id in negotiation['order_ids'] if order_id not in assigned],
+            'excluded': excluded,
+            'report': report,
+            'elapsed_ms': round((time.monotonic() - negotiation['started_at']) * 1000, 1)
+        }
+
+    def get_negotiation(self, negotiation_id):
+        return self.active_negotiations.get(negotiation_id) or self.history.get(negotiation_id)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['active'] = len(self.active_negotiations)
+        stats['history'] = len(self.history)
+        stats['registered_agents'] = len(self.agent_registry)
+        return stats
+
+    def _close(self, negotiation_id, negotiation):
+        """Wait for pending bids until the deadline, record the ones that made it and
+        archive the negotiation; returns the excluded (late) bidders"""
+        pending = negotiation['pending']
+        if pending:
+            wait(list(pending.values()), timeout=max(0, negotiation['deadline_at'] - time.monotonic()))
+        excluded = []
+        # Futures finished by the time wait() returned were on time
+        with self._lock:
+            for agent_id, future in pending.items():
+                if not future.done():
+                    # Late bidder: excluded, and its computation skipped if not yet started
+                    future.cancel()
+                    excluded.append(agent_id)
+                    self.stats['late_bids'] += 1
+                elif future.exception() is not None:
+                    self.stats['failed_bids'] += 1
+                else:
+                    self._accept_bid(negotiation, agent_id, future.result())
+
+            negotiation['status'] = 'resolved'
+            negotiation['pending'] = {}
+            self._archive(negotiation_id)
+        return excluded
+
+    def _archive(self, negotiation_id):
+        """Move a negotiation to the bounded history (caller holds the lock)"""
+        negotiation = self.active_negotiations.pop(negotiation_id, None)
+        if negotiation is None:
+            return
+        negotiation.pop('task_data', None)
+        self.history[negotiation_id] = negotiation
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+    def _expire_stale(self):
+        """Close auctions nobody resolved well past their deadline"""
+        cutoff = time.monotonic() - max(1.0, self.deadline * 10)
+        with self._lock:
+            for negotiation_id in [n for n, negotiation in self.active_negotiations.items()
+                                   if negotiation['deadline_at'] < cutoff]:
+                self.active_negotiations[negotiation_id]['status'] = 'expired'
+                self._archive(negotiation_id)
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='auction')
+        return self._executor
 
 # Global negotiation engine
-negotiation_engine = NegotiationEngine()
\ No newline at end of file
+negotiation_engine = NegotiationEngine()
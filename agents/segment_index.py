@@ -0,0 +1,108 @@
+"""
+Segment Index - Which drivers' planned paths cross which road segments
+Segments and driver paths are rasterized onto a lat/lng grid; a segment's
+drivers are those whose path passes through one of its cells, so a traffic
+alert reaches only them instead of the whole fleet.
+"""
+
+import math
+import os
+import threading
+
+ALERT_CELL_DEGREES = float(os.getenv('TRAFFIC_ALERT_CELL_DEG', '0.01'))
+
+def path_cells(points, cell=ALERT_CELL_DEGREES):
+    """Grid cells touched by a polyline of (lat, lng) points"""
+    cells = set()
+    if len(points) == 1:
+        lat, lng = points[0]
+        cells.add((math.floor(lat / cell), math.floor(lng / cell)))
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        # Half-cell steps so a leg never jumps over a cell it crosses
+        steps = max(1, math.ceil(max(abs(lat2 - lat1), abs(lng2 - lng1)) / (cell / 2)))
+        for k in range(steps + 1):
+            t = k / steps
+            cells.add((math.floor((lat1 + (lat2 - lat1) * t) / cell),
+                       math.floor((lng1 + (lng2 - lng1) * t) / cell)))
+    return cells
+
+class SegmentDriverIndex:
+    """segment id -> drivers whose planned path crosses it
+
+    Segment geometry comes from the segments file ([lng, lat] points) and is
+    rasterized the first time a segment raises an alert. A segment without
+    geometry cannot be placed, so it matches no driver.
+    """
+
+    def __init__(self, segment_paths, cell=ALERT_CELL_DEGREES):
+        self.cell = cell
+        self._segment_paths = segment_paths
+        self._segment_cells = {}  # segment id -> cells (lazily built)
+        self._cell_drivers = {}   # cell -> {driver id}
+        self._driver_cells = {}   # driver id -> cells of its planned path
+        self._driver_versions = {}
+        self._lock = threading.Lock()
+
+    def sync(self, agents):
+        """Re-index agents whose plan changed (route_version) and forget the ones that left"""
+        seen = set()
+        for agent in agents:
+            if not hasattr(agent, 'planned_path'):
+                continue
+            seen.add(agent.agent_id)
+            version = getattr(agent, 'route_version', None)
+            if agent.agent_id not in self._driver_versions or self._driver_versions[agent.agent_id] != version:
+                self.update_driver(agent.agent_id, agent.planned_path())
+                self._driver_versions[agent.agent_id] = version
+        for driver_id in [d for d in self._driver_cells if d not in seen]:
+            self.remove_driver(driver_id)
+
+    def update_driver(self, driver_id, points):
+        """Index a driver's planned path ((lat, lng) points; empty when idle)"""
+        cells = path_cells(points, self.cell) if points else set()
+        with self._lock:
+            self._unindex(driver_id)
+            self._driver_cells[driver_id] = cells
+            for cell in cells:
+                self._cell_drivers.setdefault(cell, set()).add(driver_id)
+
+    def remove_driver(self, driver_id):
+        with self._lock:
+            self._unindex(driver_id)
+            self._driver_cells.pop(driver_id, None)
+        self._driver_versions.pop(driver_id, None)
+
+    def drivers_for(self, segment_id):
+        """Drivers whose planned path crosses the segment (none for a segment without geometry)"""
+        cells = self._cells_for_segment(segment_id)
+        if not cells:
+            return set()
+        with self._lock:
+            drivers = set()
+            for cell in cells:
+                drivers |= self._cell_drivers.get(cell, set())
+            return drivers
+
+    def get_stats(self):
+        return {
+            'drivers': len(self._driver_cells),
+            'cells': len(self._cell_drivers),
+            'segments_indexed': len(self._segment_cells)
+        }
+
+    def _cells_for_segment(self, segment_id):
+        if segment_id not in self._segment_cells:
+            coordinates = self._segment_paths.get(segment_id)
+            # Segment files use GeoJSON [lng, lat] order
+            self._segment_cells[segment_id] = (
+                path_cells([(lat, lng) for lng, lat in coordinates], self.cell) if coordinates else None
+            )
+        return self._segment_cells[segment_id]
+
+    def _unindex(self, driver_id):
+        for cell in self._driver_cells.get(driver_id, ()):
+            drivers = self._cell_drivers.get(cell)
+            if drivers:
+                drivers.discard(driver_id)
+                if not drivers:
+                    del self._cell_drivers[cell]
@@ -1,26 +1,126 @@
 from .base_agent import BaseAgent
+from .segment_index import SegmentDriverIndex
 import requests
+import json
+import math
+import os
 import time
-from threading import Thread
+import numpy as np
+from threading import Lock, Thread
 from collections import deque
 from datetime import datetime, timedelta
 
+# Road segments to monitor (JSON list or GeoJSON); the built-in routes otherwise
+TRAFFIC_SEGMENTS_FILE = os.getenv('TRAFFIC_SEGMENTS_FILE', '')
+# ([lng, lat] points in Manhattan, where the demo orders are)
+DEFAULT_SEGMENTS = [
+    {'id': 'route_1', 'coordinates': [[-74.0110, 40.7060], [-74.0060, 40.7128], [-73.9973, 40.7209]]},
+    {'id': 'route_2', 'coordinates': [[-73.9970, 40.7320], [-73.9851, 40.7484], [-73.9740, 40.7644]]},
+    {'id': 'route_3', 'coordinates': [[-73.9990, 40.7600], [-73.9851, 40.7589], [-73.9720, 40.7510]]},
+    {'id': 'highway_a', 'coordinates': [[-73.9770, 40.7100], [-73.9730, 40.7300], [-73.9680, 40.7500], [-73.9480, 40.7700]]},
+    {'id': 'highway_b', 'coordinates': [[-74.0140, 40.7100], [-74.0120, 40.7300], [-74.0080, 40.7500], [-73.9960, 40.7700]]}
+]
+
+# Observations kept per route (ring buffer of timestamp/level pairs, 12 bytes each)
+HISTORY_SIZE = int(os.getenv('TRAFFIC_HISTORY_SIZE', '500'))
+HISTORY_DTYPE = np.dtype([('timestamp', 'f8'), ('level', 'f4')])
+
+# Level assumed for an hour before anything is learned: rush hours, night, daytime
+DEFAULT_LEVELS = np.array([70 if 7 <= h <= 9 or 17 <= h <= 19 else 20 if h >= 22 or h <= 6 else 40
+                           for h in range(24)], dtype=np.float32)
+
+# Prediction confidence by observation count: none, <10, <50, <100, more
+CONFIDENCE_STEPS = np.array([1, 10, 50, 100])
+CONFIDENCE_LEVELS = np.array([0.3, 0.4, 0.6, 0.8, 0.95])
+
+# Seconds before a segment alerts again at the same or a lower status
+TRAFFIC_ALERT_COOLDOWN = float(os.getenv('TRAFFIC_ALERT_COOLDOWN', '300'))
+
+# Forecast curves: 96 steps of 15 minutes (24 h) from the current quarter hour
+FORECAST_STEP_MINUTES = 15
+FORECAST_STEPS = 96
+
+# Status by level: below 30, 60, 80, and above; heavy and severe raise alerts
+STATUS_THRESHOLDS = np.array([30, 60, 80])
+STATUS_NAMES = ("clear", "moderate", "heavy", "severe")
+HEAVY = 2
+UNKNOWN = -1
+
+def load_segments(path):
+    """Road segments from a JSON file: [{"id", "coordinates": [[lng, lat], ...]}, ...],
+    plain ids, or a GeoJSON FeatureCollection of LineStrings with an "id" property"""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [dict(feature.get('properties') or {}, id=feature.get('id', (feature.get('properties') or {}).get('id')),
+                     coordinates=(feature.get('geometry') or {}).get('coordinates'))
+                for feature in data.get('features', [])]
+    segments = []
+    for item in data:
+        segment = {'id': item} if isinstance(item, str) else item
+        if segment.get('id') is not None:
+            segments.append({'id': str(segment['id']), 'coordinates': segment.get('coordinates')})
+    return segments
+
 class TrafficAgent(BaseAgent):
-    def __init__(self, agent_id="traffic_001"):
+    # The history ring (HISTORY_SIZE observations per route) is left out: every tick
+    # rewrites a slot of every row, so it would be logged whole every interval
+    STATE_FIELDS = ('route_ids', 'prediction_model', 'observation_count', 'pattern_memory')
+    
+    def __init__(self, agent_id="traffic_001", segments=None):
         super().__init__(
             agent_id=agent_id,
             role="Intelligent Traffic Analyst",
             goal="Predict traffic patterns and proactively optimize routes",
             backstory="AI-powered traffic analyst with predictive capabilities and learning"
         )
-        self.traffic_data = {}
         self.monitoring = False
         
         # INTELLIGENCE ADDITIONS
-        self.traffic_history = {}  # Store historical patterns
-        self.prediction_model = {}  # Simple prediction model
+        # Routes are interned to row indices; every array below has one row per route
+        self.route_ids = []
+        self.route_index = {}
+        # EMA of the traffic level per (route, hour, weekday); NaN until first observed
+        self.prediction_model = np.full((0, 24, 7), np.nan, dtype=np.float32)
+        self.traffic_history = np.zeros((0, HISTORY_SIZE), dtype=HISTORY_DTYPE)
+        # Observations recorded per route since start; count % HISTORY_SIZE is the next slot
+        self.history_count = np.zeros(0, dtype=np.int64)
+        # Observations ever learned per route (survives restarts), for confidence
+        self.observation_count = np.zeros(0, dtype=np.int64)
         self.learning_rate = 0.1
         self.pattern_memory = deque(maxlen=100)
+        
+        # Latest tick per route; NaN/UNKNOWN until a route has been observed
+        self.current_levels = np.zeros(0, dtype=np.float32)
+        self.predicted_levels = np.zeros(0, dtype=np.float32)
+        self.status_codes = np.zeros(0, dtype=np.int8)
+        self.previous_status = np.zeros(0, dtype=np.int8)
+        self.updated_at = np.zeros(0, dtype=np.float64)
+        self.predictive_alerts = []
+        # Last alert per route, for the cooldown
+        self.last_alert_at = np.zeros(0, dtype=np.float64)
+        self.last_alert_status = np.zeros(0, dtype=np.int8)
+        self.alert_cooldown = TRAFFIC_ALERT_COOLDOWN
+        # Bumped on every model change; the cached forecast is valid for one version
+        self.model_version = 0
+        self._forecast = None
+        # Reported observations, applied on the next tick (route id -> level)
+        self._pending_observations = {}
+        # Reports for segments outside the configured set, which are not modelled
+        self.ignored_observations = 0
+        self._lock = Lock()
+        
+        if segments is None:
+            segments = load_segments(TRAFFIC_SEGMENTS_FILE) if TRAFFIC_SEGMENTS_FILE else DEFAULT_SEGMENTS
+        segments = [{'id': segment} if isinstance(segment, str) else segment for segment in segments]
+        # Segment geometry ([lng, lat] points) where the file provides it
+        self.segment_paths = {segment['id']: segment['coordinates'] for segment in segments if segment.get('coordinates')}
+        self._route_indices([segment['id'] for segment in segments])
+        # Alerts go to the drivers whose planned path crosses the segment
+        self.segment_index = SegmentDriverIndex(self.segment_paths)
+        unplaced = len(segments) - len(self.segment_paths)
+        if unplaced:
+            print(f"⚠️ {unplaced} traffic segments have no coordinates - their alerts reach staff dashboards only")
     
     def start_monitoring(self):
         """Start continuous traffic monitoring"""
@@ -37,32 +137,35 @@ class TrafficAgent(BaseAgent):
             time.sleep(10)  # Update every 10 seconds for more visibility
     
     def update_traffic_data(self):
-        """INTELLIGENT: Enhanced with learning and prediction"""
-        import random
-        
-        major_routes = ["route_1", "route_2", "route_3", "highway_a", "highway_b"]
+        """INTELLIGENT: Enhanced with learning and prediction (one array step for all segments)"""
         current_time = datetime.now()
         hour = current_time.hour
         day_of_week = current_time.weekday()
         
-        for route in major_routes:
-            # INTELLIGENT: Use historical patterns
-            base_traffic = self._predict_traffic(route, hour, day_of_week)
+        with self._lock:
+            pending, self._pending_observations = self._pending_observations, {}
+            observed_idx = self._route_indices(list(pending))
+            n = len(self.route_ids)
+            idx = np.arange(n)
             
-            # Add some randomness
-            traffic_level = max(0, min(100, base_traffic + random.randint(-15, 15)))
+            # INTELLIGENT: Use historical patterns, plus some randomness
+            base_traffic = self._predict_levels(idx, hour, day_of_week)
+            traffic_levels = np.clip(base_traffic + np.random.randint(-15, 16, n), 0, 100)
+            # Reported observations replace the simulated values
+            traffic_levels[observed_idx] = np.clip(np.fromiter(pending.values(), dtype=np.float64, count=len(pending)), 0, 100)
             
             # LEARNING: Store for future predictions
-            self._learn_from_observation(route, hour, day_of_week, traffic_level)
+            self._learn_from_observations(idx, hour, day_of_week, traffic_levels, current_time.timestamp())
             
-            self.traffic_data[route] = {
-                "traffic_level": traffic_level,
-                "predicted_level": base_traffic,
-                "confidence": self._calculate_confidence(route),
-                "estimated_delay": traffic_level * 0.5,
-                "last_updated": time.time(),
-                "status": self._get_traffic_status(traffic_level)
-            }
+            self.previous_status[:n] = self.status_codes[:n]
+            self.current_levels[:n] = traffic_levels
+            self.predicted_levels[:n] = base_traffic
+            self.status_codes[:n] = self._status_codes(traffic_levels)
+            self.updated_at[:n] = time.time()
+    
+    def _status_codes(self, levels):
+        """Status index (into STATUS_NAMES) for each level"""
+        return np.searchsorted(STATUS_THRESHOLDS, levels, side='right').astype(np.int8)
     
     def _get_traffic_status(self, level):
         """Convert traffic level to status"""
@@ -76,31 +179,37 @@ class TrafficAgent(BaseAgent):
             return "severe"
     
     def check_for_alerts(self):
-        """INTELLIGENT: Check for alerts with predictions"""
-        alerts_sent = False
-        predictions_made = False
+        """INTELLIGENT: Alert segments that turned heavy or severe this tick, flag predicted ones"""
+        n = len(self.route_ids)
+        status = self.status_codes[:n]
+        escalated = np.flatnonzero((status >= HEAVY) & (status > self.previous_status[:n]))
+        # Within the cooldown a segment only alerts again if it got worse
+        now = time.time()
+        escalated = escalated[(now - self.last_alert_at[escalated] >= self.alert_cooldown) |
+                              (status[escalated] > self.last_alert_status[escalated])]
+        self.last_alert_at[escalated] = now
+        self.last_alert_status[escalated] = status[escalated]
         
-        for route, data in self.traffic_data.items():
-            # Current alerts
-            if data["status"] in ["heavy", "severe"]:
-                self.broadcast_traffic_alert(route, data)
-                alerts_sent = True
-            
-            # INTELLIGENT: Predictive alerts
-            future_prediction = self.predict_future_traffic(route, 1)
-            if future_prediction['predicted_level'] > 70 and data["traffic_level"] < 50:
-                print(f"\n🔮 Predictive Alert: {route} will have heavy traffic in 1 hour")
-                print(f"   Current: {data['traffic_level']}% → Predicted: {future_prediction['predicted_level']}%")
-                print(f"   Confidence: {future_prediction['confidence']:.0%}")
-                predictions_made = True
+        # INTELLIGENT: Predictive alerts - heavy within the hour while light now
+        future_time = datetime.now() + timedelta(hours=1)
+        future_levels = self._predict_levels(np.arange(n), future_time.hour, future_time.weekday())
+        predicted = np.flatnonzero((future_levels > 70) & (self.current_levels[:n] < 50))
+        self.predictive_alerts = [self.route_ids[i] for i in predicted]
         
-        if not alerts_sent and not predictions_made:
-            clear_routes = [r for r, d in self.traffic_data.items() if d["status"] == "clear"]
-            if clear_routes:
-                print(f"\n✅ Traffic Status: All routes clear ({len(clear_routes)} routes monitored)")
+        notified = 0
+        if len(escalated):
+            from api.extensions import active_agents
+            self.segment_index.sync([agent for agent in list(active_agents.values()) if isinstance(agent, BaseAgent)])
+        for i, conditions in zip(escalated, self._conditions(escalated)):
+            notified += len(self.broadcast_traffic_alert(self.route_ids[i], conditions))
+        
+        if len(escalated):
+            print(f"🚦 Traffic: {len(escalated)} segments turned heavy/severe ({notified} driver notifications), "
+                  f"{len(predicted)} predicted heavy within the hour ({n} monitored)")
+        return {'alerts': len(escalated), 'notified': notified, 'predicted': len(predicted), 'monitored': n}
     
     def broadcast_traffic_alert(self, route, traffic_data):
-        """Send traffic alert to all delivery agents"""
+        """Send traffic alert to the delivery agents whose planned path crosses the route"""
         alert_data = {
             "route": route,
             "traffic_level": traffic_data["traffic_level"],
@@ -108,26 +217,29 @@ class TrafficAgent(BaseAgent):
             "status": traffic_data["status"],
             "recommendation": self._get_recommendation(traffic_data["status"])
         }
+        drivers = sorted(self.segment_index.drivers_for(route))
         
-        print(f"\n🚦 Traffic Alert: {traffic_data['status'].upper()} traffic on {route}")
-        print(f"   Level: {traffic_data['traffic_level']}/100")
-        print(f"   Estimated delay: {traffic_data['estimated_delay']:.1f} minutes")
-        print(f"   Recommendation: {alert_data['recommendation']}")
+        # Push to the affected drivers' followers and managers' dashboards (works from this monitor thread)
+        from api.realtime import STAFF_ROOMS, driver_room, emit_event
+        emit_event('traffic_alert', dict(alert_data, drivers=drivers),
+                   [driver_room(agent_id) for agent_id in drivers] + STAFF_ROOMS)
+        if not drivers:
+            return drivers
         
-        # Notify delivery agents directly
-        from api.app import active_agents
-        delivery_agents = [aid for aid in active_agents.keys() if 'delivery' in aid]
+        print(f"   {traffic_data['status'].upper()} on {route}: level {traffic_data['traffic_level']}/100, "
+              f"+{traffic_data['estimated_delay']:.1f} min -> {', '.join(drivers)}")
         
-        for agent_id in delivery_agents:
-            if agent_id in active_agents:
-                agent = active_agents[agent_id]
-                if hasattr(agent, 'process_message'):
-                    agent.process_message({
-                        'sender_id': self.agent_id,
-                        'message_type': 'traffic_alert',
-                        'data': alert_data
-                    })
-            self.send_message(agent_id, "traffic_alert", alert_data)
+        # Notify the affected delivery agents directly (they all run in this process)
+        from api.extensions import active_agents
+        for agent_id in drivers:
+            agent = active_agents.get(agent_id)
+            if hasattr(agent, 'process_message'):
+                agent.process_message({
+                    'sender_id': self.agent_id,
+                    'message_type': 'traffic_alert',
+                    'data': alert_data
+                })
+        return drivers
     
     def _get_recommendation(self, status):
         """Get recommendation based on traffic status"""
@@ -139,11 +251,35 @@ class TrafficAgent(BaseAgent):
     
     def get_route_conditions(self, route_id):
         """Get current conditions for specific route"""
-        return self.traffic_data.get(route_id, {
-            "traffic_level": 0,
-            "estimated_delay": 0,
-            "status": "unknown"
-        })
+        i = self.route_index.get(route_id)
+        if i is None or self.status_codes[i] == UNKNOWN:
+            return {
+                "traffic_level": 0,
+                "estimated_delay": 0,
+                "status": "unknown"
+            }
+        return self._conditions(np.array([i]))[0]
+    
+    def _conditions(self, rows):
+        """Condition dicts for many route rows, gathered with one array read per field"""
+        levels = np.round(self.current_levels[rows].astype(np.float64), 1)
+        return [
+            {
+                "traffic_level": level,
+                "predicted_level": predicted,
+                "confidence": confidence,
+                "estimated_delay": round(level * 0.5, 1),
+                "last_updated": updated,
+                "status": STATUS_NAMES[status]
+            }
+            for level, predicted, confidence, updated, status in zip(
+                levels.tolist(),
+                np.round(self.predicted_levels[rows].astype(np.float64), 1).tolist(),
+                self._confidence_levels(rows).tolist(),
+                self.updated_at[rows].tolist(),
+                self.status_codes[rows].tolist()
+            )
+        ]
     
     def process_message(self, message):
         """Handle incoming messages"""
@@ -157,77 +293,128 @@ class TrafficAgent(BaseAgent):
                 "conditions": conditions
             })
         
+        elif message["message_type"] == "traffic_update":
+            # Observed level for a segment, learned on the next tick
+            data = message["data"]
+            route = data.get("segment_id") or data.get("route")
+            level = data.get("traffic_level", data.get("level"))
+            if route is None or level is None:
+                return
+            # Only configured segments get model rows; anyone can post a report
+            if str(route) not in self.route_index:
+                with self._lock:
+                    self.ignored_observations += 1
+                    ignored = self.ignored_observations
+                if ignored == 1 or ignored % 1000 == 0:
+                    print(f"⚠️ Ignored traffic report for unknown segment {str(route)[:64]!r} ({ignored} so far)")
+                return
+            try:
+                level = float(level)
+            except (TypeError, ValueError):
+                return
+            if math.isfinite(level):
+                with self._lock:
+                    self._pending_observations[str(route)] = level
+        
         elif message["message_type"] == "incident_report":
             # Update traffic data based on reported incident
             incident_data = message["data"]
-            affected_route = incident_data["route"]
+            i = self.route_index.get(incident_data["route"])
             
-            if affected_route in self.traffic_data:
+            if i is not None and self.status_codes[i] != UNKNOWN:
                 # Increase traffic level due to incident
-                self.traffic_data[affected_route]["traffic_level"] = min(100, 
-                    self.traffic_data[affected_route]["traffic_level"] + 30)
-                self.traffic_data[affected_route]["status"] = self._get_traffic_status(
-                    self.traffic_data[affected_route]["traffic_level"])
+                with self._lock:
+                    self.current_levels[i] = min(100, self.current_levels[i] + 30)
+                    self.status_codes[i] = self._status_codes(self.current_levels[i:i + 1])[0]
+    
+    def _route_indices(self, routes):
+        """Intern route ids to row indices, adding rows for routes not seen before"""
+        new_routes = [route for route in dict.fromkeys(routes) if route not in self.route_index]
+        if new_routes:
+            self._ensure_capacity(len(self.route_ids) + len(new_routes))
+            for route in new_routes:
+                self.route_index[route] = len(self.route_ids)
+                self.route_ids.append(route)
+        return np.fromiter((self.route_index[route] for route in routes), dtype=np.intp, count=len(routes))
+    
+    def _ensure_capacity(self, size):
+        """Grow the per-route arrays (doubling) so they hold at least size routes"""
+        capacity = len(self.history_count)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 8)
+        n = len(self.route_ids)
+        
+        model = np.full((capacity, 24, 7), np.nan, dtype=np.float32)
+        model[:n] = self.prediction_model[:n]
+        history = np.zeros((capacity, HISTORY_SIZE), dtype=HISTORY_DTYPE)
+        history[:n] = self.traffic_history[:n]
+        count = np.zeros(capacity, dtype=np.int64)
+        count[:n] = self.history_count[:n]
+        self.prediction_model, self.traffic_history, self.history_count = model, history, count
+        self.observation_count = _grow_rows(self.observation_count, n, capacity, 0)
+        
+        self.current_levels = _grow_rows(self.current_levels, n, capacity, np.nan)
+        self.predicted_levels = _grow_rows(self.predicted_levels, n, capacity, np.nan)
+        self.status_codes = _grow_rows(self.status_codes, n, capacity, UNKNOWN)
+        self.previous_status = _grow_rows(self.previous_status, n, capacity, UNKNOWN)
+        self.updated_at = _grow_rows(self.updated_at, n, capacity, 0)
+        self.last_alert_at = _grow_rows(self.last_alert_at, n, capacity, -np.inf)
+        self.last_alert_status = _grow_rows(self.last_alert_status, n, capacity, UNKNOWN)
+    
+    def _predict_levels(self, idx, hour, day_of_week):
+        """INTELLIGENT: Predicted level for each route row, defaults where nothing is learned"""
+        learned = self.prediction_model[idx, hour, day_of_week]
+        return np.where(np.isnan(learned), DEFAULT_LEVELS[hour], learned).astype(np.float64)
     
     def _predict_traffic(self, route, hour, day_of_week):
         """INTELLIGENT: Predict traffic based on patterns"""
-        key = f"{route}_{hour}_{day_of_week}"
-        
-        if key not in self.prediction_model:
-            # Initialize with reasonable defaults
-            if 7 <= hour <= 9 or 17 <= hour <= 19:  # Rush hours
-                return 70
-            elif 22 <= hour or hour <= 6:  # Night
-                return 20
-            else:
-                return 40
+        if route not in self.route_index:
+            return float(DEFAULT_LEVELS[hour])
+        return float(self._predict_levels(np.array([self.route_index[route]]), hour, day_of_week)[0])
+    
+    def _learn_from_observations(self, idx, hour, day_of_week, levels, timestamp):
+        """LEARNING: EMA update and history append for many routes at once (idx must be unique)"""
+        old_prediction = self.prediction_model[idx, hour, day_of_week]
+        # Exponential moving average (simple learning); first observation seeds it
+        self.prediction_model[idx, hour, day_of_week] = np.where(
+            np.isnan(old_prediction), levels,
+            (1 - self.learning_rate) * old_prediction + self.learning_rate * levels
+        )
         
-        return self.prediction_model[key]
+        # Store in history, overwriting the oldest observation once a buffer is full
+        slots = self.history_count[idx] % HISTORY_SIZE
+        self.traffic_history['timestamp'][idx, slots] = timestamp
+        self.traffic_history['level'][idx, slots] = levels
+        self.history_count[idx] += 1
+        self.observation_count[idx] += 1
+        self.model_version += 1
     
     def _learn_from_observation(self, route, hour, day_of_week, observed_traffic):
         """LEARNING: Update predictions based on observations"""
-        key = f"{route}_{hour}_{day_of_week}"
-        
-        if key not in self.prediction_model:
-            self.prediction_model[key] = observed_traffic
-        else:
-            # Exponential moving average (simple learning)
-            old_prediction = self.prediction_model[key]
-            self.prediction_model[key] = (
-                (1 - self.learning_rate) * old_prediction + 
-                self.learning_rate * observed_traffic
-            )
-        
-        # Store in history
-        if route not in self.traffic_history:
-            self.traffic_history[route] = []
-        
-        self.traffic_history[route].append({
-            'timestamp': datetime.now(),
-            'hour': hour,
-            'day': day_of_week,
-            'level': observed_traffic
-        })
-        
-        # Keep only last 500 observations per route
-        if len(self.traffic_history[route]) > 500:
-            self.traffic_history[route] = self.traffic_history[route][-500:]
+        self._learn_from_observations(self._route_indices([route]), hour, day_of_week,
+                                      np.array([observed_traffic], dtype=np.float64), time.time())
+    
+    def get_route_history(self, route):
+        """A route's observations, oldest first (structured array of timestamp, level)"""
+        if route not in self.route_index:
+            return np.zeros(0, dtype=HISTORY_DTYPE)
+        i = self.route_index[route]
+        count = int(self.history_count[i])
+        if count <= HISTORY_SIZE:
+            return self.traffic_history[i, :count].copy()
+        start = count % HISTORY_SIZE
+        return np.concatenate([self.traffic_history[i, start:], self.traffic_history[i, :start]])
+    
+    def _confidence_levels(self, idx):
+        """INTELLIGENT: Prediction confidence per route row, from how much it has observed"""
+        return CONFIDENCE_LEVELS[np.searchsorted(CONFIDENCE_STEPS, self.observation_count[idx], side='right')]
     
     def _calculate_confidence(self, route):
         """INTELLIGENT: Calculate prediction confidence"""
-        if route not in self.traffic_history:
+        if route not in self.route_index:
             return 0.3  # Low confidence without history
-        
-        history_length = len(self.traffic_history[route])
-        
-        if history_length < 10:
-            return 0.4
-        elif history_length < 50:
-            return 0.6
-        elif history_length < 100:
-            return 0.8
-        else:
-            return 0.95
+        return float(self._confidence_levels(np.array([self.route_index[route]]))[0])
     
     def predict_future_traffic(self, route, hours_ahead=1):
         """INTELLIGENT: Predict traffic N hours in the future"""
@@ -259,22 +446,189 @@ class TrafficAgent(BaseAgent):
     
     def suggest_optimal_departure_time(self, route):
         """INTELLIGENT: Suggest best departure time"""
-        best_time = None
-        lowest_traffic = 100
+        window = self.departure_windows([route])[route]
+        return {
+            'recommended_departure': window['departure'],
+            'expected_traffic': window['expected_traffic'],
+            'reason': f"Optimal window with {window['expected_traffic']}% traffic level"
+        }
+    
+    def forecast(self):
+        """Predicted level of every route for the next 24 h in 15-minute steps
+        
+        One array pass over the model, cached until the model changes or the
+        next quarter hour starts. Returns {'start', 'levels'}: levels has a row
+        per route index plus a last row of default levels for unknown routes.
+        """
+        now = datetime.now()
+        start = now.replace(minute=now.minute - now.minute % FORECAST_STEP_MINUTES, second=0, microsecond=0)
+        key = (self.model_version, start)
+        cached = self._forecast
+        if cached is not None and cached['key'] == key:
+            return cached
+        
+        with self._lock:
+            n = len(self.route_ids)
+            # (route, hour, day) -> (route, hour of week)
+            week = self.prediction_model[:n].transpose(0, 2, 1).reshape(n, 168)
+        default_week = np.tile(DEFAULT_LEVELS, 7)
+        week = np.vstack([np.where(np.isnan(week), default_week, week), default_week])
+        
+        # Each hourly value describes the middle of its hour; interpolate between neighbours
+        hours = start.weekday() * 24 + start.hour + start.minute / 60 + np.arange(FORECAST_STEPS) * FORECAST_STEP_MINUTES / 60
+        position = (hours - 0.5) % 168
+        lower = np.floor(position).astype(np.intp)
+        weight = (position - lower).astype(np.float32)
+        levels = week[:, lower] * (1 - weight) + week[:, (lower + 1) % 168] * weight
+        
+        self._forecast = {'key': key, 'start': start, 'routes': n, 'levels': levels}
+        return self._forecast
+    
+    def _forecast_rows(self, forecast, routes):
+        """Forecast row per route; unknown routes get the default row"""
+        return np.fromiter((min(self.route_index.get(route, forecast['routes']), forecast['routes']) for route in routes),
+                           dtype=np.intp, count=len(routes))
+    
+    def get_forecast(self, routes, hours=24):
+        """Forecast curves for the given routes, as JSON-ready dicts"""
+        forecast = self.forecast()
+        rows = self._forecast_rows(forecast, routes)
+        steps = min(FORECAST_STEPS, max(1, int(hours * 60 / FORECAST_STEP_MINUTES)))
+        levels = np.round(forecast['levels'][rows, :steps].astype(np.float64), 1).tolist()
+        confidence = self._route_confidence(rows, forecast['routes'])
+        return {
+            'start': forecast['start'].isoformat(),
+            'step_minutes': FORECAST_STEP_MINUTES,
+            'segments': {
+                route: {'levels': route_levels, 'confidence': route_confidence}
+                for route, route_levels, route_confidence in zip(routes, levels, confidence)
+            }
+        }
+    
+    def departure_windows(self, routes, duration_minutes=FORECAST_STEP_MINUTES, within_hours=6):
+        """INTELLIGENT: Best departure per route - lowest mean forecast level over the trip
+        
+        Departures are the 15-minute steps of the next within_hours hours; all
+        routes are scored together with one cumulative sum over their curves.
+        """
+        forecast = self.forecast()
+        rows = self._forecast_rows(forecast, routes)
+        width = min(FORECAST_STEPS, max(1, math.ceil(duration_minutes / FORECAST_STEP_MINUTES)))
+        candidates = max(1, min(int(within_hours * 60 / FORECAST_STEP_MINUTES) + 1, FORECAST_STEPS - width + 1))
         
-        # Check next 6 hours
-        for hours_ahead in range(0, 7):
-            prediction = self.predict_future_traffic(route, hours_ahead)
-            if prediction['predicted_level'] < lowest_traffic:
-                lowest_traffic = prediction['predicted_level']
-                best_time = prediction['predicted_time']
+        curves = forecast['levels'][rows].astype(np.float64)
+        cumulative = np.concatenate([np.zeros((len(rows), 1)), np.cumsum(curves, axis=1)], axis=1)
+        mean_levels = (cumulative[:, width:width + candidates] - cumulative[:, :candidates]) / width
+        best = np.argmin(mean_levels, axis=1)
+        best_levels = mean_levels[np.arange(len(rows)), best]
+        confidence = self._route_confidence(rows, forecast['routes'])
         
+        windows = {}
+        for route, step, level, route_confidence in zip(routes, best.tolist(), best_levels.tolist(), confidence):
+            departure = forecast['start'] + timedelta(minutes=step * FORECAST_STEP_MINUTES)
+            windows[route] = {
+                'departure': departure.isoformat(),
+                'arrival': (departure + timedelta(minutes=duration_minutes)).isoformat(),
+                'expected_traffic': round(level, 1),
+                'confidence': route_confidence,
+                'recommendation': self._get_recommendation_for_level(level)
+            }
+        return windows
+    
+    def _route_confidence(self, rows, default_row):
+        """Confidence per forecast row (the default row has no history)"""
+        known = rows < default_row
+        confidence = np.full(len(rows), CONFIDENCE_LEVELS[0])
+        confidence[known] = self._confidence_levels(rows[known])
+        return confidence.tolist()
+    
+    def export_state(self):
+        """Learned state trimmed to the interned routes (the arrays keep spare rows)
+        
+        The model goes out as one column per (hour, weekday): a tick only updates
+        the current one, so the change log gets that column and not the whole model.
+        """
+        n = len(self.route_ids)
         return {
-            'recommended_departure': best_time,
-            'expected_traffic': lowest_traffic,
-            'reason': f"Optimal window with {lowest_traffic}% traffic level"
+            'route_ids': list(self.route_ids[:n]),
+            'prediction_model': {(hour, day): self.prediction_model[:n, hour, day].copy()
+                                 for hour in range(24) for day in range(7)},
+            'observation_count': self.observation_count[:n],
+            'pattern_memory': self.pattern_memory
         }
     
+    def load_state(self, state):
+        """Restore export_state output, or a snapshot of an older layout"""
+        model = state.get('prediction_model')
+        if isinstance(model, dict) and any(isinstance(key, str) for key in model):
+            state = _convert_legacy_state(state)
+        if 'pattern_memory' in state:
+            self.pattern_memory = state['pattern_memory']
+        route_ids = list(state.get('route_ids') or [])
+        if not route_ids:
+            return
+        
+        # Saved routes keep their learning; configured segments new since then start fresh
+        idx = self._route_indices(route_ids)
+        model = state['prediction_model']
+        if isinstance(model, dict):
+            for (hour, day), column in model.items():
+                self.prediction_model[idx, hour, day] = column
+        else:
+            self.prediction_model[idx] = model
+        if 'traffic_history' in state:
+            # Snapshots from before the history ring was left out of the state
+            self.traffic_history[idx], self.history_count[idx] = _resize_history(
+                state['traffic_history'], np.asarray(state['history_count'], dtype=np.int64))
+            self.observation_count[idx] = state['history_count']
+        else:
+            self.observation_count[idx] = state['observation_count']
+        self.model_version += 1
+    
     def stop_monitoring(self):
         """Stop traffic monitoring"""
-        self.monitoring = False
\ No newline at end of file
+        self.monitoring = False
+
+def _grow_rows(array, n, capacity, fill):
+    """Copy of the first n rows of array, padded with fill to capacity rows"""
+    grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:n] = array[:n]
+    return grown
+
+def _resize_history(history, count):
+    """Ring buffers saved with another HISTORY_SIZE, as (buffers, counts) for this one"""
+    width = history.shape[1]
+    if width == HISTORY_SIZE:
+        return history, count
+    kept = np.minimum(count, min(width, HISTORY_SIZE))
+    # Last `kept` observations of each route, oldest first, at slots 0..kept-1
+    positions = (count[:, None] - kept[:, None] + np.arange(HISTORY_SIZE)) % width
+    resized = np.take_along_axis(history, positions, axis=1)
+    resized[np.arange(HISTORY_SIZE) >= kept[:, None]] = np.zeros((), dtype=HISTORY_DTYPE)
+    return resized, kept
+
+def _convert_legacy_state(state):
+    """State saved when the model was keyed by f"{route}_{hour}_{day}" and history held dicts"""
+    legacy_model = state.get('prediction_model') or {}
+    legacy_history = state.get('traffic_history') or {}
+    entries = {}
+    for key, level in legacy_model.items():
+        route, hour, day = key.rsplit('_', 2)
+        entries[(route, int(hour), int(day))] = level
+    route_ids = list(dict.fromkeys([route for route, _, _ in entries] + list(legacy_history)))
+    index = {route: i for i, route in enumerate(route_ids)}
+    
+    model = np.full((len(route_ids), 24, 7), np.nan, dtype=np.float32)
+    for (route, hour, day), level in entries.items():
+        model[index[route], hour, day] = level
+    history = np.zeros((len(route_ids), HISTORY_SIZE), dtype=HISTORY_DTYPE)
+    count = np.zeros(len(route_ids), dtype=np.int64)
+    for route, observations in legacy_history.items():
+        observations = observations[-HISTORY_SIZE:]
+        i = index[route]
+        for slot, observation in enumerate(observations):
+            history[i, slot] = (observation['timestamp'].timestamp(), observation['level'])
+        count[i] = len(observations)
+    
+    return {'route_ids': route_ids, 'prediction_model': model, 'traffic_history': history,
+            'history_count': count, 'pattern_memory': state.get('pattern_memory', deque(maxlen=100))}
@@ -2,6 +2,8 @@ from .base_agent import BaseAgent
 from datetime import datetime
 
 class WarehouseAgent(BaseAgent):
+    STATE_FIELDS = ('agent_performance', 'assignment_history', 'optimization_weights')
+    
     def __init__(self, agent_id="warehouse_001"):
         super().__init__(
             agent_id=agent_id,
@@ -29,8 +31,11 @@ class WarehouseAgent(BaseAgent):
         print(f"   From: {order_data['pickup_location']['address']}")
         print(f"   To: {order_data['delivery_location']['address']}")
         
-        from api.app import active_agents
+        from api.extensions import active_agents
         delivery_agents = [aid for aid in active_agents.keys() if 'delivery' in aid]
+        # Only agents whose plan can still meet the order's time window
+        delivery_agents = [aid for aid in delivery_agents
+                           if not hasattr(active_agents[aid], 'can_accept') or active_agents[aid].can_accept(order_data)]
         
         if delivery_agents:
             # INTELLIGENT: Score each agent
@@ -40,40 +45,93 @@ class WarehouseAgent(BaseAgent):
                 score = self._calculate_agent_score(agent, order_data)
                 agent_scores[agent_id] = score
             
-            # Select best agent
-            best_agent = max(agent_scores, key=agent_scores.get)
-            
             print(f"   🧠 Agent scores: {agent_scores}")
-            print(f"   ✅ Selected {best_agent} (score: {agent_scores[best_agent]:.2f})")
-            
-            self.assign_order(order_data["order_id"], best_agent)
             
-            # LEARNING: Record assignment
-            self._record_assignment(order_data["order_id"], best_agent, agent_scores[best_agent])
-            
-            return {"delivery_agent_id": best_agent, "status": "assigned", "score": agent_scores[best_agent]}
+            # Best agent first; the next one gets the order if it turns it down
+            for agent_id in sorted(agent_scores, key=agent_scores.get, reverse=True):
+                print(f"   ✅ Selected {agent_id} (score: {agent_scores[agent_id]:.2f})")
+                if self.assign_order(order_data["order_id"], agent_id):
+                    # LEARNING: Record assignment
+                    self._record_assignment(order_data["order_id"], agent_id, agent_scores[agent_id])
+                    return {"delivery_agent_id": agent_id, "status": "assigned", "score": agent_scores[agent_id]}
         
         return {"status": "pending", "message": "No agents available"}
     
+    def receive_batch(self, orders):
+        """Assign a pooled batch (nearby pickups, same direction) to one agent that can carry
+        all of it; falls back to order-by-order assignment when nobody has the capacity"""
+        self.pending_orders.extend(orders)
+        weight = sum(order.get("weight", 1) for order in orders)
+        print(f"📦 Warehouse received batch of {len(orders)} orders ({weight} kg)")
+        
+        from api.extensions import active_agents
+        # Score against the first order: the batch shares its pickup area and direction
+        agent_scores = {}
+        for agent_id, agent in list(active_agents.items()):
+            if 'delivery' not in agent_id:
+                continue
+            if hasattr(agent, 'capacity') and agent.current_load + weight > agent.capacity:
+                continue
+            if hasattr(agent, 'can_accept') and not all(agent.can_accept(order) for order in orders):
+                continue
+            agent_scores[agent_id] = self._calculate_agent_score(agent, orders[0])
+        
+        if not agent_scores:
+            for order in orders:
+                self.pending_orders.remove(order)
+            return [self.receive_order(order) for order in orders]
+        
+        best_agent = max(agent_scores, key=agent_scores.get)
+        print(f"   ✅ Selected {best_agent} for the batch (score: {agent_scores[best_agent]:.2f})")
+        results = []
+        for order in orders:
+            if self.assign_order(order["order_id"], best_agent):
+                self._record_assignment(order["order_id"], best_agent, agent_scores[best_agent])
+                results.append({"delivery_agent_id": best_agent, "status": "assigned",
+                                "score": agent_scores[best_agent]})
+            else:
+                # Earlier orders of the batch used the room this one needed: offer it to everyone
+                self.pending_orders.remove(order)
+                results.append(self.receive_order(order))
+        return results
+    
     def assign_order(self, order_id, delivery_agent_id):
-        """Assign order to specific delivery agent"""
+        """Assign order to specific delivery agent; False if the agent turns it down (the
+        order stays pending)"""
         order = next((o for o in self.pending_orders if o["order_id"] == order_id), None)
-        if order:
-            self.assigned_orders[order_id] = delivery_agent_id
-            self.pending_orders.remove(order)
-            print(f"   ✅ Assigned to {delivery_agent_id}")
-            
-            # Notify delivery agent directly
-            from api.app import active_agents
-            if delivery_agent_id in active_agents:
-                agent = active_agents[delivery_agent_id]
-                if hasattr(agent, 'accept_order'):
-                    agent.accept_order(order)
-            
+        if not order:
+            return False
+        
+        # Agents in this process answer directly; others are notified by message
+        from api.extensions import active_agents
+        agent = active_agents.get(delivery_agent_id)
+        if hasattr(agent, 'accept_order'):
+            if not agent.accept_order(order):
+                print(f"   ↩️ {delivery_agent_id} turned down order {order_id}")
+                return False
+        else:
             self.send_message(delivery_agent_id, "order_assignment", {
                 "order": order,
                 "assignment_time": self.last_update.isoformat()
             })
+        
+        self.assigned_orders[order_id] = delivery_agent_id
+        self.pending_orders.remove(order)
+        print(f"   ✅ Assigned to {delivery_agent_id}")
+        
+        from services.repository import get_repository
+        try:
+            repository = get_repository()
+            repository.save_assignment({
+                "order_id": order_id,
+                "agent_id": delivery_agent_id,
+                "assigned_at": datetime.now(),
+                "source": self.agent_id
+            })
+            repository.update_order_status(order_id, "assigned")
+        except Exception as e:
+            print(f"   ⚠️ Could not persist assignment: {e}")
+        return True
     
     def _calculate_agent_score(self, agent, order_data):
         """INTELLIGENT: Multi-factor scoring system"""
@@ -0,0 +1,71 @@
+"""
+Async Mode - Worker model for the Socket.IO server (eventlet, gevent or threading)
+Kept free of heavy imports: wsgi.py consults it before monkey patching.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Packet-level Socket.IO/Engine.IO logging is for debugging only
+SOCKETIO_LOG = os.getenv('SOCKETIO_LOG', '').lower() in ('1', 'true', 'yes')
+
+def socketio_async_mode():
+    """SOCKETIO_ASYNC_MODE if set; None lets Flask-SocketIO pick (development runs)"""
+    return os.getenv('SOCKETIO_ASYNC_MODE') or None
+
+def resolve_async_mode():
+    """Configured mode, or the first cooperative library installed (eventlet, gevent), else threading"""
+    mode = socketio_async_mode()
+    if mode:
+        return mode
+    for candidate in ('eventlet', 'gevent'):
+        try:
+            __import__(candidate)
+            return candidate
+        except ImportError:
+            continue
+    return 'threading'
+
+def monkey_patch(mode):
+    """Make blocking stdlib I/O (sockets, ssl, time, threading) cooperative
+
+    Must run before requests, pymongo, groq/openai or the app are imported;
+    the thread pools used by the LLM scheduler and batch quotes then run as
+    green threads, and their blocking HTTP calls yield instead of stalling.
+    A yielding call still holds its request until it returns, so every
+    outbound HTTP call (route, weather, agent-to-API) passes a timeout: a
+    stalled upstream must not pin a worker's connections.
+    """
+    if mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+def green_runtime():
+    """'eventlet' or 'gevent' if that library has patched threading in this process, else None"""
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return 'eventlet'
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return 'gevent'
+    return None
+
+def run_in_os_thread(fn, *args):
+    """fn(*args) on a real OS thread when a green runtime is active (eventlet tpool,
+    gevent threadpool), so long CPU-bound work does not hold the event loop"""
+    mode = green_runtime()
+    if mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args)
+    if mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
@@ -6,31 +6,49 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import timedelta
+import threading
 
 auth_api_bp = Blueprint('auth_api', __name__)
 
 # In-memory user store (in production, use database)
-users_db = {
+# Demo accounts are hashed on first use rather than at import: each
+# generate_password_hash call is a deliberately slow key derivation.
+DEMO_USERS = {
     'client1': {
-        'password': generate_password_hash('password'),
+        'password': 'password',
         'role': 'client',
         'name': 'John Doe',
         'email': 'client1@example.com'
     },
     'delivery1': {
-        'password': generate_password_hash('password'),
+        'password': 'password',
         'role': 'delivery',
         'name': 'Mike Driver',
         'email': 'delivery1@example.com'
     },
     'manager1': {
-        'password': generate_password_hash('password'),
+        'password': 'password',
         'role': 'manager',
         'name': 'Sarah Manager',
         'email': 'manager1@example.com'
     }
 }
 
+users_db = {}
+_users_seeded = False
+_users_lock = threading.Lock()
+
+def get_users_db():
+    """Return the user store, hashing the demo accounts on first access"""
+    global _users_seeded
+    if not _users_seeded:
+        with _users_lock:
+            if not _users_seeded:
+                for username, user in DEMO_USERS.items():
+                    users_db.setdefault(username, dict(user, password=generate_password_hash(user['password'])))
+                _users_seeded = True
+    return users_db
+
 @auth_api_bp.route('/api/auth/login', methods=['POST'])
 def login():
     """User login endpoint"""
@@ -41,7 +59,7 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    user = users_db.get(username)
+    user = get_users_db().get(username)
     if not user or not check_password_hash(user['password'], password):
         return jsonify({'error': 'Invalid credentials'}), 401
     
@@ -78,11 +96,12 @@ def register():
     if not all([username, password, name, email]):
         return jsonify({'error': 'All fields required'}), 400
     
-    if username in users_db:
+    users = get_users_db()
+    if username in users:
         return jsonify({'error': 'Username already exists'}), 409
     
     # Create new user
-    users_db[username] = {
+    users[username] = {
         'password': generate_password_hash(password),
         'role': role,
         'name': name,
@@ -96,7 +115,7 @@ def register():
 def get_profile():
     """Get user profile"""
     username = get_jwt_identity()
-    user = users_db.get(username)
+    user = get_users_db().get(username)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -119,7 +138,7 @@ def logout():
 def verify_token():
     """Verify JWT token validity"""
     username = get_jwt_identity()
-    user = users_db.get(username)
+    user = get_users_db().get(username)
     
     if not user:
         return jsonify({'error': 'Invalid token'}), 401
@@ -2,7 +2,11 @@
 Chat API - Natural language order processing
 """
 
+from datetime import datetime
 from flask import Blueprint, request, jsonify
+from services.order_parser import parse_order_text
+from services.id_generator import new_order_id
+from services.pricing import BASE_COST, COST_PER_KM, COST_PER_KG, MINUTES_PER_KM
 
 try:
     from services.geocoding_service import geocoding_service
@@ -24,31 +28,17 @@ def parse_order_from_text(text):
         return llm_service.extract_order_details(text)
     else:
         # Fallback regex parsing
-        import re
-        pattern = r'from\s+(.+?)\s+to\s+(.+?)(?:\s*\d+\s*kg|\s*,|\.|$)'
-        match = re.search(pattern, text, re.IGNORECASE)
-        
-        if match:
-            return {
-                'pickup_address': match.group(1).strip(),
-                'delivery_address': match.group(2).strip(),
-                'weight': 1.0,
-                'success': True
-            }
-        return {'success': False, 'message': 'Could not parse order'}
+        return parse_order_text(text)
 
 def calculate_cost_and_time(distance_km, weight):
     """Calculate delivery cost and estimated time"""
-    # Base cost: $5
-    # Distance cost: $2 per km
-    # Weight cost: $1 per kg
-    base_cost = 5.0
-    distance_cost = distance_km * 2.0
-    weight_cost = weight * 1.0
+    # Same model as services.pricing.price_orders, for a single order
+    base_cost = BASE_COST
+    distance_cost = distance_km * COST_PER_KM
+    weight_cost = weight * COST_PER_KG
     total_cost = base_cost + distance_cost + weight_cost
     
-    # Estimated time: 3 minutes per km (20 km/h average)
-    estimated_minutes = distance_km * 3
+    estimated_minutes = distance_km * MINUTES_PER_KM
     
     return {
         'cost': round(total_cost, 2),
@@ -155,6 +145,13 @@ def process_chat_message():
             'message': 'Sorry, I had trouble processing that. Please try again.'
         }), 500
 
+@chat_bp.route('/api/chat/stats', methods=['GET'])
+def chat_parser_stats():
+    """Hit counters for each order-parsing tier (regex fast path, cache, LLM)"""
+    if not llm_service:
+        return jsonify({'provider': 'regex'})
+    return jsonify(llm_service.get_stats())
+
 @chat_bp.route('/api/chat/confirm', methods=['POST'])
 def confirm_order():
     """Confirm and create order from preview"""
@@ -166,9 +163,8 @@ def confirm_order():
             return jsonify({'success': False, 'message': 'No order to confirm'})
         
         # Create order
-        import time
         order_data = {
-            'order_id': f"ORD_{int(time.time())}",
+            'order_id': new_order_id(),
             'pickup_location': order_preview['pickup_location'],
             'delivery_location': order_preview['delivery_location'],
             'weight': order_preview['weight'],
@@ -177,16 +173,20 @@ def confirm_order():
             'status': 'pending'
         }
         
-        # Send to warehouse agent
-        from api.app import active_agents, socketio
-        if 'warehouse_001' in active_agents:
-            try:
-                active_agents['warehouse_001'].receive_order(order_data)
-            except Exception as e:
-                print(f"Warehouse agent error: {e}")
+        from api.realtime import emit_order_update, subscribe_sid
+        from api.extensions import app_repository, current_identity
+        # The creator (from the JWT, if any) may follow the order over Socket.IO
+        order_data['customer_id'] = current_identity()
+        from services.order_pool import order_pool
+        order_data['created_at'] = datetime.now().isoformat()
+        app_repository().save_order(order_data)
+        
+        # Send to warehouse agent, pooled with nearby orders going the same way
+        order_pool.submit(order_data)
         
-        # Emit WebSocket update
-        socketio.emit('order_update', {
+        # Emit WebSocket update to the order's room (the creator's socket joins it)
+        subscribe_sid(data.get('socket_id'), order_data['order_id'])
+        emit_order_update({
             'order_id': order_data['order_id'],
             'status': 'pending',
             'message': 'Order created successfully'
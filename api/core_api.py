@@ -0,0 +1,324 @@
+"""
+Core API - Orders, agents, driver positions and traffic
+"""
+
+import math
+import os
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+
+from api.extensions import app_agents, app_repository, current_identity
+from api.position_stream import position_stream
+from api.realtime import emit_order_update, subscribe_sid
+from agents.traffic_agent import FORECAST_STEP_MINUTES, FORECAST_STEPS
+from optimization.route_optimizer import ROUTE_SOLVER_TIME, optimize_delivery_route, plan_fleet
+from services.fleet_optimizer import fleet_optimizer
+from services.id_generator import new_order_id
+from services.order_pool import order_pool
+
+core_bp = Blueprint('core', __name__)
+
+TRAFFIC_FORECAST_MAX_SEGMENTS = int(os.getenv('TRAFFIC_FORECAST_MAX_SEGMENTS', '1000'))
+
+@core_bp.route('/', methods=['GET'])
+def root():
+    return jsonify({
+        'service': 'Multi-Agent Delivery System',
+        'status': 'online',
+        'timestamp': datetime.now().isoformat(),
+        'version': '1.0.0'
+    })
+
+@core_bp.route('/api/test', methods=['GET'])
+def test_endpoint():
+    return jsonify({'status': 'Backend is working', 'endpoints': ['chat', 'route', 'auth']})
+
+@core_bp.route('/api/orders/create', methods=['POST'])
+def create_order_simple():
+    try:
+        order_data = request.get_json()
+        order_data['created_at'] = datetime.now().isoformat()
+        order_data['status'] = 'pending'
+        # IDs are always server-assigned; a client-chosen one is kept for reference only
+        socket_id = order_data.pop('socket_id', None)
+        client_order_id = order_data.pop('order_id', None)
+        if client_order_id:
+            order_data['client_order_id'] = client_order_id
+        order_id = new_order_id()
+        order_data['order_id'] = order_id
+        # The creator (from the JWT, if any) may follow the order over Socket.IO
+        order_data['customer_id'] = current_identity()
+        
+        app_repository().save_order(order_data)
+        
+        # Dispatched to the warehouse agent with nearby orders going the same way
+        order_pool.submit(order_data)
+        
+        # Emit real-time update to the order's room (the creator's socket joins it)
+        subscribe_sid(socket_id, order_id)
+        emit_order_update({
+            'order_id': order_id,
+            'status': 'pending',
+            'message': 'Order created successfully'
+        })
+        
+        return jsonify({'order_id': order_id, 'status': 'created'})
+    except Exception as e:
+        print(f'Order creation error: {e}')
+        return jsonify({'error': str(e)}), 500
+
+@core_bp.route('/api/order-pool/stats', methods=['GET'])
+def order_pool_stats():
+    """Pooling counters: batches dispatched, average batch size, orders still waiting"""
+    return jsonify(order_pool.get_stats())
+
+@core_bp.route('/api/orders/<order_id>', methods=['GET'])
+@jwt_required()
+def get_order(order_id):
+    try:
+        order = app_repository().get_order(order_id)
+        if order:
+            return jsonify(order)
+    except Exception as e:
+        print(f'Order lookup error: {e}')
+    return jsonify({'error': 'Order not found'}), 404
+
+@core_bp.route('/api/orders/<order_id>/eta', methods=['GET'])
+@jwt_required()
+def get_order_eta(order_id):
+    """Pickup/delivery ETAs from the assigned driver's route: two dict lookups, no routing"""
+    agents = app_agents()
+    warehouse = agents.get('warehouse_001')
+    agent_id = getattr(warehouse, 'assigned_orders', {}).get(order_id)
+    agent = agents.get(agent_id)
+    eta = agent.get_eta(order_id) if hasattr(agent, 'get_eta') else None
+    if eta is None:
+        return jsonify({'error': 'No ETA for this order'}), 404
+    eta['driver_id'] = agent_id
+    return jsonify(eta)
+
+@core_bp.route('/api/agent/<agent_id>/message', methods=['POST'])
+def send_agent_message(agent_id):
+    try:
+        message_data = request.get_json()
+        
+        agents = app_agents()
+        if agent_id in agents:
+            try:
+                agents[agent_id].process_message(message_data)
+                return jsonify({'status': 'delivered'})
+            except Exception as e:
+                print(f'Agent message error: {e}')
+                return jsonify({'status': 'error', 'message': str(e)})
+        
+        return jsonify({'error': 'Agent not found'}), 404
+    except Exception as e:
+        print(f'Send agent message error: {e}')
+        return jsonify({'error': str(e)}), 500
+
+@core_bp.route('/api/agents/register', methods=['POST'])
+def register_agent():
+    agent_data = request.get_json()
+    agent_id = agent_data['agent_id']
+    
+    # Store agent reference (in real implementation, this would be more sophisticated)
+    app_agents()[agent_id] = agent_data
+    
+    return jsonify({'status': 'registered'})
+
+@core_bp.route('/api/agents/delivery', methods=['GET'])
+def get_delivery_agents():
+    try:
+        delivery_agents = [aid for aid in app_agents().keys() 
+                          if 'delivery' in aid]
+        return jsonify({'agents': delivery_agents})
+    except Exception as e:
+        print(f'Get delivery agents error: {e}')
+        return jsonify({'agents': []})
+
+@core_bp.route('/api/optimize-assignment', methods=['POST'])
+def optimize_assignment():
+    try:
+        data = request.get_json()
+        order_data = data.get('order', {})
+        
+        # Simple assignment logic
+        delivery_agents = [aid for aid in app_agents().keys() 
+                          if 'delivery' in aid]
+        
+        if delivery_agents:
+            # For now, assign to first available agent
+            assigned_agent = delivery_agents[0]
+            if order_data.get('order_id'):
+                app_repository().save_assignment({
+                    'order_id': order_data['order_id'],
+                    'agent_id': assigned_agent,
+                    'assigned_at': datetime.now(),
+                    'source': 'optimize-assignment'
+                })
+            return jsonify({'delivery_agent_id': assigned_agent})
+        
+        return jsonify({'error': 'No available agents'}), 404
+    except Exception as e:
+        print(f'Optimize assignment error: {e}')
+        return jsonify({'error': str(e)}), 500
+
+@core_bp.route('/api/optimize-route', methods=['POST'])
+def optimize_route():
+    """Time-window-feasible route for one vehicle; OR-Tools for up to time_limit_ms if given"""
+    route_data = request.get_json() or {}
+    time_limit = route_data.get('time_limit_ms')
+    try:
+        plan = optimize_delivery_route(
+            route_data.get('current_location'),
+            route_data.get('orders', []),
+            capacity=route_data.get('capacity'),
+            time_limit=float(time_limit) / 1000 if time_limit else None
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'invalid orders: {e}'}), 400
+    
+    return jsonify(plan)
+
+@core_bp.route('/api/optimize-fleet', methods=['POST'])
+def optimize_fleet():
+    """Routes for several vehicles within time_limit_ms (default ROUTE_SOLVER_TIME_MS);
+    vehicles default to the running delivery agents and their spare capacity"""
+    data = request.get_json() or {}
+    vehicles = data.get('vehicles')
+    if vehicles is None:
+        vehicles = [{'id': agent_id, 'location': agent.current_location, 'capacity': agent.capacity,
+                     'load': agent.current_load}
+                    for agent_id, agent in list(app_agents().items()) if hasattr(agent, 'route_plan')]
+    if not vehicles:
+        return jsonify({'error': 'No available vehicles'}), 404
+    time_limit = data.get('time_limit_ms')
+    try:
+        plan = plan_fleet(
+            vehicles,
+            data.get('orders', []),
+            time_limit=float(time_limit) / 1000 if time_limit else ROUTE_SOLVER_TIME
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f'invalid vehicles or orders: {e}'}), 400
+    
+    return jsonify(plan)
+
+@core_bp.route('/api/fleet/sweep', methods=['GET'])
+def fleet_sweep_report():
+    """Last fleet re-optimization sweep (per-region costs, transfers, timings) and open proposals"""
+    return jsonify({
+        'last_sweep': fleet_optimizer.last_sweep,
+        'proposals': [p for p in fleet_optimizer.proposals.values() if p['status'] == 'proposed'],
+        'stats': fleet_optimizer.get_stats()
+    })
+
+@core_bp.route('/api/fleet/sweep', methods=['POST'])
+def run_fleet_sweep():
+    """Start a sweep now (in the background)"""
+    if not fleet_optimizer.sweep_async():
+        return jsonify({'status': 'running', 'message': 'A sweep is already in progress'}), 409
+    return jsonify({'status': 'started'}), 202
+
+@core_bp.route('/api/fleet/proposals/<proposal_id>/apply', methods=['POST'])
+def apply_fleet_proposal(proposal_id):
+    """Move a proposal's orders to their new drivers"""
+    proposal = fleet_optimizer.apply(proposal_id)
+    if proposal is None:
+        return jsonify({'error': 'No open proposal with that id'}), 404
+    return jsonify(proposal)
+
+@core_bp.route('/api/drivers/<driver_id>/position', methods=['POST'])
+def update_driver_position(driver_id):
+    data = request.get_json() or {}
+    try:
+        position_stream.update(driver_id, data['lat'], data['lng'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'lat and lng required'}), 400
+    agent = app_agents().get(driver_id)
+    if hasattr(agent, 'update_position'):
+        agent.update_position(float(data['lat']), float(data['lng']))
+    return jsonify({'status': 'accepted'}), 202
+
+@core_bp.route('/api/drivers/positions/stats', methods=['GET'])
+def get_position_stats():
+    return jsonify(position_stream.get_stats())
+
+@core_bp.route('/api/traffic/update', methods=['POST'])
+def update_traffic():
+    traffic_data = request.get_json()
+    traffic_data['timestamp'] = datetime.now()
+    
+    app_repository().save_traffic(traffic_data)
+    
+    agents = app_agents()
+    if 'traffic_001' in agents:
+        agents['traffic_001'].process_message({
+            'message_type': 'traffic_update',
+            'data': traffic_data
+        })
+    
+    return jsonify({'status': 'updated'})
+
+@core_bp.route('/api/traffic/status', methods=['GET'])
+def get_traffic_status():
+    try:
+        traffic_data = app_repository().recent_traffic(limit=10)
+        for item in traffic_data:
+            if 'timestamp' in item and hasattr(item['timestamp'], 'isoformat'):
+                item['timestamp'] = item['timestamp'].isoformat()
+        return jsonify({'traffic_data': traffic_data})
+    except Exception as e:
+        print(f'Traffic DB error: {e}')
+    return jsonify({'traffic_data': []})
+
+# The traffic agent forecasts one day ahead
+FORECAST_HORIZON_HOURS = FORECAST_STEPS * FORECAST_STEP_MINUTES / 60
+
+def _number_in_range(value, low, high):
+    """float(value) if it is a finite number in [low, high], else None"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) and low <= number <= high else None
+
+def _traffic_agent():
+    agent = app_agents().get('traffic_001')
+    return agent if hasattr(agent, 'forecast') else None
+
+@core_bp.route('/api/traffic/forecast', methods=['GET'])
+def get_traffic_forecast():
+    """15-minute forecast curves: ?segments=a,b&hours=24"""
+    agent = _traffic_agent()
+    if agent is None:
+        return jsonify({'error': 'Traffic agent not running'}), 503
+    segments = [segment for segment in request.args.get('segments', '').split(',') if segment]
+    if not segments or len(segments) > TRAFFIC_FORECAST_MAX_SEGMENTS:
+        return jsonify({'error': f'segments required (1-{TRAFFIC_FORECAST_MAX_SEGMENTS}, comma-separated)'}), 400
+    hours = _number_in_range(request.args.get('hours', FORECAST_HORIZON_HOURS), 0, FORECAST_HORIZON_HOURS)
+    if hours is None:
+        return jsonify({'error': f'hours must be a number from 0 to {FORECAST_HORIZON_HOURS:g}'}), 400
+    return jsonify(agent.get_forecast(segments, hours))
+
+@core_bp.route('/api/traffic/departure-windows', methods=['POST'])
+def get_departure_windows():
+    """Best departure per segment: {"segments": [...], "duration_minutes": 30, "within_hours": 6}"""
+    agent = _traffic_agent()
+    if agent is None:
+        return jsonify({'error': 'Traffic agent not running'}), 503
+    data = request.get_json() or {}
+    segments = [str(segment) for segment in data.get('segments') or []]
+    if not segments or len(segments) > TRAFFIC_FORECAST_MAX_SEGMENTS:
+        return jsonify({'error': f'segments required (1-{TRAFFIC_FORECAST_MAX_SEGMENTS})'}), 400
+    duration = _number_in_range(data.get('duration_minutes', FORECAST_STEP_MINUTES), 0, FORECAST_HORIZON_HOURS * 60)
+    within_hours = _number_in_range(data.get('within_hours', 6), 0, FORECAST_HORIZON_HOURS)
+    if duration is None or within_hours is None:
+        return jsonify({'error': f'duration_minutes (0-{FORECAST_HORIZON_HOURS * 60:g}) and '
+                                 f'within_hours (0-{FORECAST_HORIZON_HOURS:g}) must be numbers'}), 400
+    return jsonify({'windows': agent.departure_windows(segments, duration, within_hours)})
+
+@core_bp.app_errorhandler(404)
+def not_found(error):
+    return jsonify({'error': 'Endpoint not found'}), 404
@@ -0,0 +1,77 @@
+"""
+Demo API - Canned responses for the frontend demo server
+create_app({'DEMO_MODE': True}) builds the full backend and swaps these views
+in for the chat, login and fleet endpoints, so the demo runs without an LLM,
+geocoder or agent fleet. Routes, live conditions and monitoring stay on the
+shared services.
+"""
+
+import re
+from datetime import timedelta
+from flask import request, jsonify
+from flask_jwt_extended import create_access_token
+
+from services.id_generator import new_order_id
+
+DEMO_AGENTS = ['delivery_001', 'delivery_002', 'delivery_003']
+DEMO_USER = {'username': 'demo', 'role': 'client', 'name': 'Demo User'}
+
+def demo_chat():
+    """Canned order preview for 'from <pickup> to <delivery>'"""
+    data = request.get_json(silent=True) or {}
+    msg = data.get('message', '')
+
+    match = re.search(r'from\s+(.+?)\s+to\s+(.+)', msg, re.IGNORECASE)
+    if not match:
+        return jsonify({'success': False, 'message': 'Use: from [pickup] to [delivery]'})
+
+    pickup = match.group(1).strip()
+    delivery = match.group(2).strip()
+    return jsonify({
+        'success': True,
+        'message': f'Order from {pickup} to {delivery}\\n\\nCost: $15.50\\nTime: 25 min\\n\\nConfirm?',
+        'order_preview': {
+            'pickup_location': {'lat': 40.7128, 'lng': -74.0060, 'address': pickup},
+            'delivery_location': {'lat': 40.7589, 'lng': -73.9851, 'address': delivery},
+            'weight': 1.0,
+            'cost': 15.50,
+            'estimated_time': 25
+        }
+    })
+
+def demo_confirm():
+    """Issue an order id and announce it; nothing is stored or dispatched"""
+    from api.realtime import emit_order_update, subscribe_sid
+    order_id = new_order_id()
+    subscribe_sid((request.get_json(silent=True) or {}).get('socket_id'), order_id)
+    emit_order_update({'order_id': order_id, 'status': 'pending'})
+    return jsonify({'success': True, 'order_id': order_id, 'message': f'Order {order_id} created!'})
+
+def demo_login():
+    """Log anyone in as the demo client"""
+    access_token = create_access_token(
+        identity=DEMO_USER['username'],
+        expires_delta=timedelta(hours=24),
+        additional_claims={'role': DEMO_USER['role'], 'name': DEMO_USER['name']}
+    )
+    return jsonify({'access_token': access_token, 'user': dict(DEMO_USER)})
+
+def demo_agents():
+    return jsonify({'agents': list(DEMO_AGENTS)})
+
+def demo_traffic():
+    return jsonify({'traffic_data': []})
+
+# Endpoint -> demo view; the URL rules stay the blueprints' own
+DEMO_VIEWS = {
+    'chat.process_chat_message': demo_chat,
+    'chat.confirm_order': demo_confirm,
+    'auth_api.login': demo_login,
+    'core.get_delivery_agents': demo_agents,
+    'core.get_traffic_status': demo_traffic,
+}
+
+def register_demo_routes(app):
+    """Serve the demo views in place of the registered endpoints"""
+    for endpoint, view in DEMO_VIEWS.items():
+        app.view_functions[endpoint] = view
@@ -0,0 +1,33 @@
+"""
+Extensions - Per-app state for apps built with api.factory.create_app
+Each app gets its own SocketIO server, storage repository and agent registry
+(app.extensions['socketio'|'repository'|'agents']); request handlers reach
+them through the helpers below.
+"""
+
+from flask import current_app
+from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
+
+# JWTManager keeps its settings on each app it is initialised with
+jwt = JWTManager()
+
+# The process's agent fleet (agent_id -> agent). Agents run threads and persist
+# state under fixed ids, so one app per process owns it (ENABLE_AGENTS); agents
+# and background services look each other up here. Other apps get an empty registry.
+active_agents = {}
+
+def app_agents():
+    """Agent registry of the app handling the request"""
+    return current_app.extensions['agents']
+
+def app_repository():
+    """Storage repository of the app handling the request"""
+    return current_app.extensions['repository']
+
+def current_identity():
+    """JWT identity of the request, or None without a valid token"""
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        return None
+    return get_jwt_identity()
@@ -0,0 +1,139 @@
+"""
+App Factory - One configurable OptiroRoute backend
+create_app(config) builds a Flask app with every blueprint and its own
+Socket.IO server, repository and agent registry. ENABLE_AGENTS, ENABLE_ML and
+ENABLE_MONGO switch the optional subsystems, so API-only workers skip them and
+start fast.
+"""
+
+import multiprocessing
+import os
+import threading
+from datetime import timedelta
+from flask import Flask
+from flask_cors import CORS
+from flask_socketio import SocketIO
+from dotenv import load_dotenv
+
+from api.async_mode import SOCKETIO_LOG, socketio_async_mode
+from api.extensions import active_agents, jwt
+from api.socket_queue import socketio_options
+
+load_dotenv()
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+def default_config():
+    """Settings from the environment; create_app(config) overrides any of them"""
+    return {
+        'JWT_SECRET_KEY': os.getenv('JWT_SECRET_KEY', 'dev-secret-key-change-in-production'),
+        'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=24),
+        # Warehouse, traffic and delivery agents (traffic monitor thread, learned state)
+        'ENABLE_AGENTS': _env_flag('ENABLE_AGENTS', '0'),
+        'DELIVERY_AGENT_COUNT': int(os.getenv('DELIVERY_AGENT_COUNT', '3')),
+        # Load the scikit-learn models at startup instead of on first use
+        'ENABLE_ML': _env_flag('ENABLE_ML', '0'),
+        # Off: embedded SQLite store, no MongoDB connection probe
+        'ENABLE_MONGO': _env_flag('ENABLE_MONGO', '1'),
+        # Canned chat, login and fleet responses for the frontend demo (final_backend.py)
+        'DEMO_MODE': _env_flag('DEMO_MODE', '0'),
+        'SOCKETIO_CONNECT_MESSAGE': 'Connected to OptiroRoute system',
+    }
+
+_agents_lock = threading.Lock()
+_agents_claimed = False
+
+def claim_agents():
+    """True for the first caller in the process: it owns (and starts) the agent fleet"""
+    global _agents_claimed
+    with _agents_lock:
+        if _agents_claimed:
+            return False
+        _agents_claimed = True
+        return True
+
+def start_agents(delivery_count=3):
+    """Create the agent fleet in active_agents, restore its learned state and start monitoring"""
+    from agents import DeliveryAgent, TrafficAgent, WarehouseAgent
+    from agents.negotiation_engine import negotiation_engine
+    from services.agent_state import track_agent
+
+    fleet = [WarehouseAgent(), TrafficAgent()]
+    fleet += [DeliveryAgent(f'delivery_{i:03d}') for i in range(1, delivery_count + 1)]
+    for agent in fleet:
+        active_agents[agent.agent_id] = track_agent(agent)
+        if isinstance(agent, DeliveryAgent):
+            negotiation_engine.register_agent(agent.agent_id, agent)
+    active_agents['traffic_001'].start_monitoring()
+    from services.fleet_optimizer import fleet_optimizer
+    fleet_optimizer.start()
+    print(f'Agents started: {", ".join(agent.agent_id for agent in fleet)}')
+
+def create_app(config=None):
+    """Build the backend; config is a dict of overrides for default_config()"""
+    app = Flask(__name__)
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+
+    CORS(app)  # Enable CORS for React frontend
+    jwt.init_app(app)
+    # With SOCKETIO_MESSAGE_QUEUE set, workers share rooms and emits through the queue.
+    # Production runs go through wsgi.py, which picks and patches in the async mode.
+    # SocketIO registers itself as app.extensions['socketio'].
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=socketio_async_mode(),
+                        logger=SOCKETIO_LOG, engineio_logger=SOCKETIO_LOG, **socketio_options())
+
+    # Process-pool workers (fleet sweeps) re-import the entry module; background
+    # subsystems belong to the main process only
+    main_process = multiprocessing.parent_process() is None
+    owns_agents = main_process and app.config['ENABLE_AGENTS'] and claim_agents()
+    if main_process and app.config['ENABLE_AGENTS'] and not owns_agents:
+        print('⚠️ Agent fleet already runs under another app in this process - this app gets none')
+    app.extensions['agents'] = active_agents if owns_agents else {}
+
+    # Events go to per-order, per-driver and per-role rooms instead of every connection;
+    # the agents' events go out through the server of the app that runs them
+    from api.realtime import init_realtime
+    init_realtime(socketio, connect_message=app.config['SOCKETIO_CONNECT_MESSAGE'], background=owns_agents)
+
+    from api.chat_api import chat_bp
+    from api.route_api import route_api_bp
+    from api.auth_api import auth_api_bp
+    from api.negotiation_api import negotiation_bp
+    from api.quote_api import quote_bp
+    from api.core_api import core_bp
+    app.register_blueprint(chat_bp)
+    app.register_blueprint(route_api_bp)
+    app.register_blueprint(auth_api_bp)
+    app.register_blueprint(negotiation_bp)
+    app.register_blueprint(quote_bp)
+    app.register_blueprint(core_bp)
+    if app.config['DEMO_MODE']:
+        from api.demo_api import register_demo_routes
+        register_demo_routes(app)
+
+    # Orders, assignments and traffic go through the configured repository
+    # (Mongo with write-behind buffers, or the embedded SQLite store)
+    from services.repository import get_repository, set_default_backend
+    repository = get_repository(None if app.config['ENABLE_MONGO'] else 'sqlite')
+    app.extensions['repository'] = repository
+
+    # MongoDB connection - probed in the background so startup never waits on it
+    if main_process and repository.name == 'mongo':
+        from services.mongo_service import mongo_service
+        from services.storage import ensure_indexes
+        mongo_service.on_connect(ensure_indexes)
+        mongo_service.start_probe()
+
+    if main_process and app.config['ENABLE_ML']:
+        from services.ml_service import ml_service
+        threading.Thread(target=ml_service._get_instance, name='ml-warmup', daemon=True).start()
+
+    if owns_agents:
+        # Agents and background services store through the same backend as this app
+        set_default_backend(repository.name)
+        start_agents(app.config['DELIVERY_AGENT_COUNT'])
+
+    return app
@@ -3,40 +3,81 @@ API endpoints for agent negotiation
 """
 
 from flask import Blueprint, request, jsonify
+from agents.bundle_auction import BUNDLE_SOLVER_TIME
 from agents.negotiation_engine import negotiation_engine
+import os
 import uuid
 
 negotiation_bp = Blueprint('negotiation', __name__)
 
+BUNDLE_MAX_ORDERS = int(os.getenv('BUNDLE_MAX_ORDERS', '200'))
+
 @negotiation_bp.route('/api/negotiate-assignment', methods=['POST'])
 def negotiate_assignment():
     """Handle assignment negotiation between agents"""
-    data = request.get_json()
+    data = request.get_json() or {}
+    order = data.get('order')
+    if not order:
+        return jsonify({'status': 'failed', 'message': 'order required'}), 400
     
     # Create negotiation ID
     negotiation_id = str(uuid.uuid4())
+    order.setdefault('order_id', negotiation_id)
     
-    # Get all available delivery agents (mock for now)
-    available_agents = ['delivery_001', 'delivery_002', 'delivery_003']
-    
-    # Start negotiation
-    negotiation_engine.start_negotiation(
-        negotiation_id, 
-        available_agents, 
-        data['order']
-    )
-    
-    # Resolve immediately (in real system, this would be async)
-    result = negotiation_engine.resolve_negotiation(negotiation_id)
+    # Sealed-bid auction among registered delivery agents near the pickup;
+    # returns within the auction deadline however slow a bidder is
+    result = negotiation_engine.run_auction(negotiation_id, order)
     
     if result:
         return jsonify({
             'status': 'success',
+            'negotiation_id': negotiation_id,
             'assigned_agent': result['winner'],
-            'cost': result['winning_bid']
+            'cost': result['winning_bid'],
+            'bids': len(result['all_bids']),
+            'excluded': result['excluded'],
+            'elapsed_ms': result['elapsed_ms']
         })
     else:
         return jsonify({
             'status': 'failed',
             'message': 'No agents available'
-        }), 404
\ No newline at end of file
+        }), 404
+
+@negotiation_bp.route('/api/negotiate-bundle', methods=['POST'])
+def negotiate_bundle():
+    """Assign a batch of orders through one combinatorial auction over bundles of nearby orders"""
+    data = request.get_json() or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify({'status': 'failed', 'message': 'orders required'}), 400
+    if len(orders) > BUNDLE_MAX_ORDERS:
+        return jsonify({'status': 'failed', 'message': f'at most {BUNDLE_MAX_ORDERS} orders per batch'}), 400
+    for order in orders:
+        if not isinstance(order, dict) or not all(
+                isinstance(order.get(key), dict) and 'lat' in order[key] and 'lng' in order[key]
+                for key in ('pickup_location', 'delivery_location')):
+            return jsonify({'status': 'failed', 'message': 'each order needs pickup_location and delivery_location'}), 400
+    
+    negotiation_id = str(uuid.uuid4())
+    for index, order in enumerate(orders):
+        order.setdefault('order_id', f'{negotiation_id}-{index}')
+    
+    time_limit = data.get('time_limit_ms')
+    result = negotiation_engine.run_bundle_auction(
+        negotiation_id, orders,
+        time_limit=float(time_limit) / 1000 if time_limit else BUNDLE_SOLVER_TIME
+    )
+    
+    if result:
+        return jsonify({'status': 'success', 'negotiation_id': negotiation_id, **result})
+    else:
+        return jsonify({
+            'status': 'failed',
+            'message': 'No agents available'
+        }), 404
+
+@negotiation_bp.route('/api/negotiations/stats', methods=['GET'])
+def negotiation_stats():
+    """Auction counters: bids, late bids, unsold orders, history size"""
+    return jsonify(negotiation_engine.get_stats())
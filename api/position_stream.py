@@ -0,0 +1,202 @@
+"""
+Position Stream - Coalesced live driver positions for Socket.IO subscribers
+Driver samples only overwrite the latest position; once per frame interval
+each room with changes gets one compact frame, so outbound traffic depends on
+the frame rate and the number of followers, not on GPS sample frequency.
+
+Frame ('positions' event, the client acks it):
+  {"room": "driver:delivery_1", "seq": 42, "key": false,
+   "ids": ["delivery_1", ...], "xy": [dlat, dlng, ...]}
+Coordinates are integers in 1e-5 degrees (~1 m). In a delta frame (key false)
+xy holds the change since the room's previous frame for the listed drivers;
+in a keyframe (key true) it holds absolute values for the listed drivers
+(every driver in the room, except in shared mode below).
+A client still waiting to ack its previous frame is skipped, and gets a
+keyframe once it catches up, so slow consumers never build a queue.
+
+With a Socket.IO message queue (several workers) a driver's samples may land
+on any worker, so each worker sends keyframes of just the drivers it saw
+move, as one room emit through the queue; coalescing still applies.
+"""
+
+import os
+import threading
+import time
+from functools import partial
+
+from api.realtime import STAFF_ROOMS, driver_room
+from api.socket_queue import is_enabled as queue_enabled
+
+POSITION_FRAME_INTERVAL = int(os.getenv('POSITION_FRAME_MS', '250')) / 1000
+POSITION_ACK_TIMEOUT = int(os.getenv('POSITION_ACK_TIMEOUT_MS', '5000')) / 1000
+POSITION_STALE_SECONDS = int(os.getenv('POSITION_STALE_SECONDS', '300'))
+
+SCALE = 100000
+
+class RoomFrames:
+    """Last values sent to a room; deltas are computed against these"""
+
+    def __init__(self):
+        self.seq = 0
+        self.sent = {}  # driver_id -> (lat, lng) as scaled ints
+
+    def delta_frame(self, room, positions):
+        ids, xy = [], []
+        for driver_id, (lat, lng) in positions.items():
+            last_lat, last_lng = self.sent.get(driver_id, (0, 0))
+            ids.append(driver_id)
+            xy += (lat - last_lat, lng - last_lng)
+            self.sent[driver_id] = (lat, lng)
+        self.seq += 1
+        return {'room': room, 'seq': self.seq, 'key': False, 'ids': ids, 'xy': xy}
+
+    def keyframe(self, room):
+        xy = []
+        for lat, lng in self.sent.values():
+            xy += (lat, lng)
+        return {'room': room, 'seq': self.seq, 'key': True, 'ids': list(self.sent), 'xy': xy}
+
+class PositionStream:
+    def __init__(self, frame_interval=POSITION_FRAME_INTERVAL, ack_timeout=POSITION_ACK_TIMEOUT,
+                 stale_after=POSITION_STALE_SECONDS):
+        self.frame_interval = frame_interval
+        self.ack_timeout = ack_timeout
+        self.stale_after = stale_after
+        self._socketio = None
+        self._latest = {}      # driver_id -> (lat, lng, updated_at)
+        self._dirty = set()
+        self._rooms = {}       # room -> RoomFrames
+        self._client_seq = {}  # (sid, room) -> seq of the last frame sent
+        self._inflight = {}    # (sid, room) -> (seq, sent_at) awaiting ack
+        self._lock = threading.Lock()
+        self._started = False
+        self.shared = queue_enabled()
+        self.stats = {'samples': 0, 'frames': 0, 'deltas': 0, 'keyframes': 0, 'dropped': 0}
+
+    def init(self, socketio):
+        self._socketio = socketio
+
+    def update(self, driver_id, lat, lng):
+        """Record a driver sample; it is sent with the next frame (earlier samples are superseded)"""
+        sample = (round(float(lat) * SCALE), round(float(lng) * SCALE), time.monotonic())
+        with self._lock:
+            self._latest[driver_id] = sample
+            self._dirty.add(driver_id)
+            self.stats['samples'] += 1
+        self._ensure_started()
+
+    def forget_sid(self, sid):
+        """Drop per-connection state when a client disconnects"""
+        with self._lock:
+            for key in [key for key in list(self._client_seq) if key[0] == sid]:
+                self._client_seq.pop(key, None)
+                self._inflight.pop(key, None)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['drivers'] = len(self._latest)
+        stats['rooms'] = len(self._rooms)
+        return stats
+
+    def _ensure_started(self):
+        if self._started or self._socketio is None:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._socketio.start_background_task(self._run)
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            self._socketio.sleep(self.frame_interval)
+            try:
+                self.flush()
+                if time.monotonic() - last_prune >= self.stale_after:
+                    self._prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f'Position stream error: {e}')
+
+    def flush(self):
+        """Send one frame to every room whose drivers moved since the last frame"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            changes = {}
+            for driver_id in dirty:
+                lat, lng, _ = self._latest[driver_id]
+                for room in (driver_room(driver_id), *STAFF_ROOMS):
+                    changes.setdefault(room, {})[driver_id] = (lat, lng)
+
+        for room, positions in changes.items():
+            self._send_room(room, positions)
+
+    def _send_room(self, room, positions):
+        if self.shared:
+            self._send_shared(room, positions)
+            return
+
+        participants = [sid for sid, _ in self._socketio.server.manager.get_participants('/', room)]
+        if not participants:
+            # Nobody listening: forget the room so the next follower starts from a keyframe
+            self._rooms.pop(room, None)
+            return
+
+        frames = self._rooms.get(room)
+        if frames is None:
+            frames = self._rooms[room] = RoomFrames()
+            # Seed with everything known so a new room's first keyframe is complete
+            if room in STAFF_ROOMS:
+                frames.sent.update({d: (lat, lng) for d, (lat, lng, _) in self._latest.items()})
+        delta = frames.delta_frame(room, positions)
+        keyframe = None
+        now = time.monotonic()
+        self.stats['frames'] += 1
+
+        for sid in participants:
+            key = (sid, room)
+            inflight = self._inflight.get(key)
+            if inflight and now - inflight[1] < self.ack_timeout:
+                self.stats['dropped'] += 1
+                continue
+
+            if inflight is None and self._client_seq.get(key) == delta['seq'] - 1:
+                frame = delta
+                self.stats['deltas'] += 1
+            else:
+                if keyframe is None:
+                    keyframe = frames.keyframe(room)
+                frame = keyframe
+                self.stats['keyframes'] += 1
+
+            self._client_seq[key] = frame['seq']
+            self._inflight[key] = (frame['seq'], now)
+            self._socketio.emit('positions', frame, to=sid, callback=partial(self._acked, key, frame['seq']))
+
+    def _send_shared(self, room, positions):
+        """Absolute positions of the drivers this worker saw move, relayed to every worker"""
+        xy = []
+        for lat, lng in positions.values():
+            xy += (lat, lng)
+        self.stats['frames'] += 1
+        self.stats['keyframes'] += 1
+        self._socketio.emit('positions', {'room': room, 'seq': None, 'key': True, 'ids': list(positions), 'xy': xy}, to=room)
+
+    def _acked(self, key, seq, *args):
+        inflight = self._inflight.get(key)
+        if inflight and inflight[0] == seq:
+            self._inflight.pop(key, None)
+
+    def _prune(self):
+        """Forget drivers that stopped reporting"""
+        cutoff = time.monotonic() - self.stale_after
+        with self._lock:
+            stale = [d for d, (_, _, updated_at) in self._latest.items() if updated_at < cutoff]
+            for driver_id in stale:
+                del self._latest[driver_id]
+        for frames in list(self._rooms.values()):
+            for driver_id in stale:
+                frames.sent.pop(driver_id, None)
+
+position_stream = PositionStream()
@@ -0,0 +1,247 @@
+"""
+Quote API - Price many orders in one call
+Addresses are deduplicated and geocoded concurrently; distances and prices
+are computed as array operations and streamed back as rows become ready.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from api.chat_api import parse_order_from_text
+from services.geocoding_service import geocoding_service, normalize_address
+from services.pricing import haversine_km, price_orders
+
+quote_bp = Blueprint('quote_api', __name__)
+
+MAX_BATCH_ROWS = int(os.getenv('QUOTE_BATCH_MAX_ROWS', '1000'))
+GEOCODE_WORKERS = int(os.getenv('QUOTE_GEOCODE_WORKERS', '8'))
+# Ready rows are priced together once this many accumulate, or after the interval
+STREAM_CHUNK_SIZE = int(os.getenv('QUOTE_STREAM_CHUNK', '100'))
+STREAM_FLUSH_INTERVAL = float(os.getenv('QUOTE_STREAM_FLUSH_MS', '250')) / 1000
+
+class QuoteBatch:
+    """One manifest: rows, the distinct addresses they reference, and resolved coordinates"""
+
+    def __init__(self, rows):
+        self.rows = []            # {'row', 'reference', 'pickup', 'delivery', 'weight', 'error'}
+        self.addresses = {}       # address key -> text to geocode
+        self.locations = {}       # address key -> geocode result
+        self.waiting = {}         # address key -> row indices still waiting on it
+        self.pending = []         # row index -> number of unresolved addresses
+        self.started = time.perf_counter()
+        self.priced = 0
+        self.failed = 0
+        self.total_cost = 0.0
+
+        parsed_text = self._parse_text_rows(rows)
+        for index, row in enumerate(rows):
+            self._add_row(index, row, parsed_text.get(index))
+
+    def _parse_text_rows(self, rows):
+        """Parse free-text rows concurrently (LLM calls are bounded by its own scheduler)"""
+        texts = {i: (row if isinstance(row, str) else row.get('text'))
+                 for i, row in enumerate(rows)
+                 if isinstance(row, str) or (isinstance(row, dict) and row.get('text'))}
+        if not texts:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(GEOCODE_WORKERS, len(texts)))) as pool:
+            return dict(zip(texts.keys(), pool.map(parse_order_from_text, texts.values())))
+
+    def _add_row(self, index, row, parsed):
+        entry = {'row': index, 'reference': None, 'pickup': None, 'delivery': None, 'weight': 1.0, 'error': None}
+        self.rows.append(entry)
+        self.pending.append(0)
+
+        if parsed is not None:
+            if not parsed.get('success'):
+                entry['error'] = parsed.get('message', 'Could not parse order')
+                return
+            pickup, delivery = parsed['pickup_address'], parsed['delivery_address']
+            weight = parsed.get('weight', 1.0)
+            if isinstance(row, dict):
+                entry['reference'] = row.get('reference')
+        elif isinstance(row, dict):
+            entry['reference'] = row.get('reference')
+            pickup = row.get('pickup_location') or row.get('pickup_address')
+            delivery = row.get('delivery_location') or row.get('delivery_address')
+            weight = row.get('weight', 1.0)
+        else:
+            entry['error'] = 'Row must be an object or a text line'
+            return
+
+        if not pickup or not delivery:
+            entry['error'] = 'Row needs both pickup and delivery'
+            return
+        try:
+            entry['weight'] = float(weight)
+        except (TypeError, ValueError):
+            entry['error'] = f'Invalid weight: {weight}'
+            return
+
+        entry['pickup'] = self._register_address(index, pickup)
+        entry['delivery'] = self._register_address(index, delivery)
+        if entry['pickup'] is None or entry['delivery'] is None:
+            entry['error'] = 'Invalid location'
+
+    def _register_address(self, index, address):
+        """Return the key for an address, queueing it for geocoding once per batch"""
+        if isinstance(address, dict):
+            # Already geocoded by the client
+            try:
+                key = f"@{float(address['lat'])},{float(address['lng'])}"
+            except (KeyError, TypeError, ValueError):
+                return None
+            self.locations.setdefault(key, {
+                'lat': float(address['lat']),
+                'lng': float(address['lng']),
+                'address': address.get('address', key[1:]),
+                'success': True
+            })
+            return key
+
+        key = normalize_address(str(address))
+        if not key:
+            return None
+        if key not in self.locations:
+            self.addresses.setdefault(key, str(address).strip())
+            self.waiting.setdefault(key, []).append(index)
+            self.pending[index] += 1
+        return key
+
+    def stream(self):
+        """Yield priced rows (and errors) as their addresses resolve, then a summary"""
+        ready = [e['row'] for e in self.rows if e['error'] is None and self.pending[e['row']] == 0]
+        for entry in self.rows:
+            if entry['error'] is not None:
+                self.failed += 1
+                yield {'row': entry['row'], 'reference': entry['reference'], 'success': False, 'message': entry['error']}
+
+        last_flush = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=max(1, min(GEOCODE_WORKERS, len(self.addresses))))
+        try:
+            futures = {pool.submit(geocoding_service.geocode_address, text): key
+                       for key, text in self.addresses.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                self.locations[key] = future.result()
+                for index in self.waiting.get(key, ()):
+                    self.pending[index] -= 1
+                    if self.pending[index] == 0 and self.rows[index]['error'] is None:
+                        ready.append(index)
+
+                if len(ready) >= STREAM_CHUNK_SIZE or time.perf_counter() - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield from self._price_rows(ready)
+                    ready = []
+                    last_flush = time.perf_counter()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        yield from self._price_rows(ready)
+        yield {'summary': self.summary()}
+
+    def _price_rows(self, indices):
+        """Price a chunk of rows with one vectorized distance/cost computation"""
+        priceable = []
+        for index in indices:
+            entry = self.rows[index]
+            pickup, delivery = self.locations[entry['pickup']], self.locations[entry['delivery']]
+            if not pickup.get('success') or not delivery.get('success'):
+                self.failed += 1
+                yield {
+                    'row': index,
+                    'reference': entry['reference'],
+                    'success': False,
+                    'message': 'Could not find one or both addresses. Please be more specific.'
+                }
+            else:
+                priceable.append(index)
+
+        if not priceable:
+            return
+
+        entries = [self.rows[i] for i in priceable]
+        pickups = [self.locations[e['pickup']] for e in entries]
+        deliveries = [self.locations[e['delivery']] for e in entries]
+        distance = haversine_km(
+            [p['lat'] for p in pickups], [p['lng'] for p in pickups],
+            [d['lat'] for d in deliveries], [d['lng'] for d in deliveries]
+        )
+        pricing = price_orders(distance, [e['weight'] for e in entries])
+        distance = np.round(distance, 2)
+
+        self.priced += len(entries)
+        self.total_cost += float(pricing['cost'].sum())
+
+        columns = {name: values.tolist() for name, values in pricing.items()}
+        distance = distance.tolist()
+        for i, entry in enumerate(entries):
+            yield {
+                'row': entry['row'],
+                'reference': entry['reference'],
+                'success': True,
+                'pickup_location': pickups[i],
+                'delivery_location': deliveries[i],
+                'weight': entry['weight'],
+                'distance_km': distance[i],
+                'cost': columns['cost'][i],
+                'estimated_time': columns['estimated_time'][i],
+                'cost_breakdown': {
+                    'base': columns['base'][i],
+                    'distance': columns['distance'][i],
+                    'weight': columns['weight'][i]
+                }
+            }
+
+    def summary(self):
+        return {
+            'rows': len(self.rows),
+            'priced': self.priced,
+            'failed': self.failed,
+            'distinct_addresses': len(self.addresses),
+            'total_cost': round(self.total_cost, 2),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1)
+        }
+
+@quote_bp.route('/api/quotes/batch', methods=['POST'])
+def batch_quote():
+    """Price a manifest of orders
+
+    Body: {"orders": [{"pickup_address", "delivery_address", "weight", "reference"}
+                      | {"text": "..."} | "free text", ...],
+           "text": "one order per line" (alternative to orders),
+           "stream": true}
+    Streams NDJSON (one quote per line, then a summary line) unless stream is false.
+    """
+    data = request.get_json(silent=True) or {}
+    rows = data.get('orders')
+    if rows is None and data.get('text'):
+        rows = [line.strip() for line in data['text'].splitlines() if line.strip()]
+
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error': 'Provide "orders" (list) or "text" (one order per line)'}), 400
+    if len(rows) > MAX_BATCH_ROWS:
+        return jsonify({'error': f'At most {MAX_BATCH_ROWS} orders per batch'}), 413
+
+    batch = QuoteBatch(rows)
+
+    if not data.get('stream', True):
+        quotes = []
+        summary = None
+        for item in batch.stream():
+            if 'summary' in item:
+                summary = item['summary']
+            else:
+                quotes.append(item)
+        quotes.sort(key=lambda q: q['row'])
+        return jsonify({'quotes': quotes, 'summary': summary})
+
+    def generate():
+        for item in batch.stream():
+            yield json.dumps(item) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,190 @@
+"""
+Realtime - Socket.IO rooms so each event reaches only the clients that follow it
+Rooms: order:<order_id>, driver:<agent_id> and role:<role> (joined from the JWT at connect).
+Clients send `subscribe` / `unsubscribe` with {"orders": [...], "drivers": [...]}: staff
+may follow anything, everyone else only their own orders and the drivers carrying them.
+Driver apps send `driver_position` samples, streamed by api.position_stream.
+"""
+
+import os
+from flask import current_app, has_app_context, request
+from flask_socketio import emit, join_room, leave_room, rooms
+
+# Roles that see every order and agent event (dispatch dashboards)
+STAFF_ROLES = ('manager',)
+MAX_SUBSCRIPTIONS = int(os.getenv('SOCKET_MAX_SUBSCRIPTIONS', '200'))
+
+# sid -> (JWT identity, role) the socket connected with; (None, None) if anonymous
+_socket_users = {}
+
+# Server for emits outside a request (agents, monitors, position frames): the
+# app that runs the agent fleet, else the first app initialised
+_socketio = None
+
+def order_room(order_id):
+    return f'order:{order_id}'
+
+def driver_room(agent_id):
+    return f'driver:{agent_id}'
+
+def role_room(role):
+    return f'role:{role}'
+
+STAFF_ROOMS = [role_room(role) for role in STAFF_ROLES]
+
+def emit_event(event, payload, to):
+    """Emit to rooms from anywhere: request handlers, background threads
+    (RouteMonitor, TrafficAgent) or a process without a Socket.IO server,
+    which reaches the workers' clients through the message queue"""
+    emitter = _current_socketio()
+    if emitter is None:
+        from api.socket_queue import get_write_only_emitter
+        emitter = get_write_only_emitter()
+    if emitter is None:
+        return
+    try:
+        emitter.emit(event, payload, to=to)
+    except Exception as e:
+        print(f'Socket emit error ({event}): {e}')
+
+def emit_order_update(payload):
+    """Send an order_update to the order's followers and staff dashboards"""
+    emit_event('order_update', payload, [order_room(payload['order_id'])] + STAFF_ROOMS)
+
+def emit_agent_status(payload):
+    """Send an agent_status to the agent's followers and staff dashboards"""
+    targets = list(STAFF_ROOMS)
+    if payload.get('agent_id'):
+        targets.append(driver_room(payload['agent_id']))
+    emit_event('agent_status', payload, targets)
+
+def _current_socketio():
+    """The requesting app's SocketIO in a request, the background server otherwise"""
+    if has_app_context():
+        return current_app.extensions.get('socketio', _socketio)
+    return _socketio
+
+def subscribe_sid(sid, order_id):
+    """Join the caller's own socket (body field socket_id) to an order's room from an HTTP
+    request: only a socket that connected with the request's JWT identity is subscribed"""
+    from api.extensions import current_identity
+
+    socketio = _current_socketio()
+    if socketio is None or not sid:
+        return
+    identity = current_identity()
+    if identity is None or _socket_users.get(sid, (None, None))[0] != identity:
+        return
+    try:
+        socketio.server.enter_room(sid, order_room(order_id), namespace='/')
+    except Exception as e:
+        print(f'Socket subscribe error: {e}')
+
+def _user_from_auth(auth):
+    """(identity, role) of the JWT passed as Socket.IO auth {"token": ...}, or (None, None)"""
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    if not token:
+        return None, None
+    try:
+        from flask_jwt_extended import decode_token
+        claims = decode_token(token)
+    except Exception:
+        return None, None
+    return claims.get('sub'), claims.get('role')
+
+def _may_follow(room, identity, role, joined):
+    """Staff follow anything; others an order they created, or the driver of one
+    of the orders they already follow"""
+    if role in STAFF_ROLES:
+        return True
+    if identity is None:
+        return False
+    from api.extensions import app_agents, app_repository
+    kind, _, key = room.partition(':')
+    if kind == 'order':
+        try:
+            order = app_repository().get_order(key)
+        except Exception as e:
+            print(f'Socket subscribe lookup error: {e}')
+            return False
+        return order is not None and order.get('customer_id') == identity
+    assigned = getattr(app_agents().get('warehouse_001'), 'assigned_orders', {})
+    return any(assigned.get(room_key) == key
+               for room_kind, _, room_key in (r.partition(':') for r in joined) if room_kind == 'order')
+
+def _requested_rooms(data):
+    data = data if isinstance(data, dict) else {}
+    requested = [order_room(order_id) for order_id in data.get('orders') or [] if order_id]
+    requested += [driver_room(agent_id) for agent_id in data.get('drivers') or [] if agent_id]
+    return requested
+
+def init_realtime(socketio, connect_message='Connected to OptiroRoute system', background=False):
+    """Register the connection and subscription handlers on a SocketIO instance;
+    background makes it the server for emits outside a request"""
+    from api.position_stream import position_stream
+
+    global _socketio
+    if background or _socketio is None:
+        _socketio = socketio
+        position_stream.init(socketio)
+
+    @socketio.on('connect')
+    def handle_connect(auth=None):
+        print('Client connected')
+        identity, role = _user_from_auth(auth)
+        _socket_users[request.sid] = (identity, role)
+        if role:
+            join_room(role_room(role))
+        emit('status', {'msg': connect_message, 'role': role})
+
+    @socketio.on('disconnect')
+    def handle_disconnect(*args):
+        print('Client disconnected')
+        _socket_users.pop(request.sid, None)
+        position_stream.forget_sid(request.sid)
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data):
+        identity, role = _socket_users.get(request.sid, (None, None))
+        joined = set(rooms())
+        added, denied = [], []
+        # Order rooms come first, so their drivers can be followed in the same request
+        for room in _requested_rooms(data):
+            if room in joined:
+                continue
+            if len(joined) >= MAX_SUBSCRIPTIONS:
+                return {'subscribed': added, 'denied': denied, 'error': 'Subscription limit reached'}
+            if not _may_follow(room, identity, role, joined):
+                denied.append(room)
+                continue
+            join_room(room)
+            joined.add(room)
+            added.append(room)
+        return {'subscribed': added, 'denied': denied}
+
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(data):
+        joined = set(rooms())
+        removed = [room for room in _requested_rooms(data) if room in joined]
+        for room in removed:
+            leave_room(room)
+        return {'unsubscribed': removed}
+
+    @socketio.on('driver_position')
+    def handle_driver_position(data):
+        # Coalesced into the next positions frame for the driver's followers
+        try:
+            position_stream.update(data['driver_id'], data['lat'], data['lng'])
+        except (KeyError, TypeError, ValueError):
+            return {'error': 'driver_id, lat and lng required'}
+        # The driver's agent shifts its ETAs
+        from api.extensions import app_agents
+        agent = app_agents().get(data['driver_id'])
+        if hasattr(agent, 'update_position'):
+            agent.update_position(float(data['lat']), float(data['lng']))
+
+    @socketio.on('agent_update')
+    def handle_agent_update(data):
+        # Relay to the agent's followers and staff, not to every connection
+        if isinstance(data, dict):
+            emit_agent_status(data)
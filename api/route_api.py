@@ -6,12 +6,17 @@ from flask import Blueprint, request, jsonify
 from services.openroute_service import openroute_service
 from services.openweather_service import openweather_service
 from services.route_monitor import route_monitor
+from api.realtime import STAFF_ROOMS, emit_event, order_room
 import random
 
 route_api_bp = Blueprint('route_api', __name__)
 
 active_deliveries = {}
 
+def _weather_view(weather):
+    """Service weather plus the temp/condition keys the dashboard reads"""
+    return dict(weather, temp=weather.get('temperature'), condition=weather.get('description'))
+
 @route_api_bp.route('/api/route/get', methods=['POST'])
 def get_route():
     """Get real route with traffic and weather"""
@@ -25,8 +30,8 @@ def get_route():
         return jsonify({'error': 'Missing start or end location'}), 400
     
     route_data = openroute_service.get_route(start, end)
-    start_weather = openweather_service.get_current_weather(start['lat'], start['lng'])
-    end_weather = openweather_service.get_current_weather(end['lat'], end['lng'])
+    start_weather = _weather_view(openweather_service.get_current_weather(start['lat'], start['lng']))
+    end_weather = _weather_view(openweather_service.get_current_weather(end['lat'], end['lng']))
     weather_impact = openweather_service.get_weather_impact_score(start['lat'], start['lng'])
     traffic_level = random.randint(20, 80)
     
@@ -65,7 +70,7 @@ def get_live_conditions():
     if not lat or not lng:
         return jsonify({'error': 'Missing coordinates'}), 400
     
-    weather = openweather_service.get_current_weather(lat, lng)
+    weather = _weather_view(openweather_service.get_current_weather(lat, lng))
     weather_impact = openweather_service.get_weather_impact_score(lat, lng)
     traffic_level = random.randint(0, 100)
     
@@ -92,6 +97,8 @@ def start_route_monitoring():
     def reroute_callback(reroute_data):
         if order_id in active_deliveries:
             active_deliveries[order_id]['reroutes'].append(reroute_data)
+        # Pushed to the order's followers on whichever worker they are connected to
+        emit_event('reroute', reroute_data, [order_room(order_id)] + STAFF_ROOMS)
     
     route_monitor.start_monitoring(order_id, start, end, reroute_callback)
     return jsonify({'status': 'monitoring_started', 'order_id': order_id})
@@ -0,0 +1,78 @@
+"""
+Socket Queue - Message-queue backend so several Socket.IO workers share rooms and emits
+SOCKETIO_MESSAGE_QUEUE selects the backend: redis://, amqp:// (kombu), kafka://
+or zmq+tcp:// use python-socketio's managers; local:// is an in-process stand-in
+with the same pub/sub code path (single process, tests). Unset: no queue.
+"""
+
+import os
+import queue
+import threading
+
+import socketio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'optiroute')
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """In-process pub/sub: every manager on a channel receives every published message
+
+    Stands in for Redis/AMQP when there is one process, so the multi-worker
+    code path (emits and room changes relayed through the queue) is the one
+    that runs everywhere.
+    """
+
+    name = 'local'
+    _subscribers = {}  # channel -> [Queue]
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url='local://', channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        for subscriber in list(self._subscribers.get(self.channel, ())):
+            subscriber.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+def is_enabled():
+    return bool(SOCKETIO_MESSAGE_QUEUE)
+
+def socketio_options():
+    """Keyword arguments for SocketIO(app, ...) that attach the configured queue"""
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(channel=SOCKETIO_CHANNEL)}
+    return {'message_queue': SOCKETIO_MESSAGE_QUEUE, 'channel': SOCKETIO_CHANNEL}
+
+_emitter = None
+_emitter_lock = threading.Lock()
+
+def get_write_only_emitter():
+    """Emit-only client of the queue, for processes without a Socket.IO server
+
+    Returns an object with emit(event, data, to=...), or None when no queue is
+    configured (then only the web process itself can reach its clients).
+    """
+    global _emitter
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return None
+    if _emitter is None:
+        with _emitter_lock:
+            if _emitter is None:
+                if SOCKETIO_MESSAGE_QUEUE.startswith('local://'):
+                    _emitter = LocalPubSubManager(channel=SOCKETIO_CHANNEL, write_only=True)
+                else:
+                    from flask_socketio import SocketIO
+                    _emitter = SocketIO(message_queue=SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL)
+    return _emitter
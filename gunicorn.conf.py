@@ -0,0 +1,61 @@
+"""
+Gunicorn settings for the OptiroRoute API - `gunicorn -c gunicorn.conf.py wsgi:app`
+"""
+
+import itertools
+import os
+
+from api.async_mode import resolve_async_mode
+
+ASYNC_MODE = resolve_async_mode()
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+# Socket.IO long-polling needs sticky sessions, which gunicorn's own balancing
+# does not provide: run one worker per port behind an ip_hash proxy, or use
+# more workers only with websocket-only clients and SOCKETIO_MESSAGE_QUEUE set
+workers = int(os.getenv('WEB_WORKERS', '1'))
+if workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+    print('WEB_WORKERS > 1 without SOCKETIO_MESSAGE_QUEUE: clients only see events from their own worker')
+
+# Order IDs embed a per-process node id (services/id_generator.py). With several
+# workers OPTIROUTE_NODE_ID is this host's first id and worker slot k uses
+# OPTIROUTE_NODE_ID + k; hosts need ranges that do not overlap.
+NODE_ID_BASE = os.getenv('OPTIROUTE_NODE_ID')
+if workers > 1 and NODE_ID_BASE is None:
+    raise SystemExit('WEB_WORKERS > 1 needs OPTIROUTE_NODE_ID (unique per host, '
+                     'workers take OPTIROUTE_NODE_ID .. OPTIROUTE_NODE_ID + WEB_WORKERS - 1)')
+if NODE_ID_BASE is not None and int(NODE_ID_BASE) + workers - 1 > 1023:
+    raise SystemExit('OPTIROUTE_NODE_ID + WEB_WORKERS - 1 must be at most 1023')
+
+def pre_fork(server, worker):
+    # Lowest slot no live worker holds; a restarted worker takes over its predecessor's
+    taken = {getattr(live, 'node_slot', None) for live in server.WORKERS.values()}
+    worker.node_slot = next(slot for slot in itertools.count() if slot not in taken)
+
+def post_fork(server, worker):
+    if NODE_ID_BASE is not None:
+        from services.id_generator import order_id_generator
+        order_id_generator.set_node_id(int(NODE_ID_BASE) + worker.node_slot)
+
+if ASYNC_MODE == 'eventlet':
+    worker_class = 'eventlet'
+elif ASYNC_MODE == 'gevent':
+    try:
+        import geventwebsocket
+        worker_class = 'geventwebsocket.gunicorn.workers.GeventWebSocketWorker'
+    except ImportError:
+        worker_class = 'gevent'
+else:
+    worker_class = 'gthread'
+    threads = int(os.getenv('WEB_THREADS', '16'))
+
+# Concurrent connections per cooperative worker
+worker_connections = int(os.getenv('WEB_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+
+loglevel = os.getenv('LOG_LEVEL', 'warning')
+accesslog = os.getenv('ACCESS_LOG') or None
+errorlog = '-'
@@ -0,0 +1,4 @@
+"""
+OptiroRoute Optimization Package
+Route planning for delivery agents
+"""
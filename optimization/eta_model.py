@@ -0,0 +1,246 @@
+"""
+ETA Model - Planned arrival at every stop of a driver's route, kept current in place
+Each leg is timed once, when the stop it leads to joins the route: distance,
+load on board, forecast traffic at departure and hour go through
+MLService.predict_delivery_times. ETAs are cumulative over legs and service
+times (waiting for windows to open). When the driver moves, finishes a stop or
+takes a new one, only the legs that changed are timed again and the new times
+are carried forward until a stop's ETA comes out unchanged, so an order's ETA
+is always a lookup.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from services.pricing import MINUTES_PER_KM, haversine_km
+
+# Used for legs when no traffic agent is running (same as the ML default)
+DEFAULT_TRAFFIC_LEVEL = 50
+
+_network_curve = {}
+
+def _located(location):
+    return isinstance(location, dict) and location.get('lat') is not None and location.get('lng') is not None \
+        and bool(location['lat'] or location['lng'])
+
+def predict_leg_minutes(distances, loads, traffic_levels, hours):
+    """Driving minutes for each leg from the delivery time model"""
+    from services.ml_service import ml_service
+    return ml_service.predict_delivery_times(distances, loads, traffic_levels, 0, hours)
+
+def network_traffic_curve():
+    """(start, step minutes, mean forecast level per step) over the traffic agent's
+    segments, or None when no traffic agent is running"""
+    from api.extensions import active_agents
+    from agents.traffic_agent import FORECAST_STEP_MINUTES
+
+    agent = active_agents.get('traffic_001')
+    if not hasattr(agent, 'forecast'):
+        return None
+    forecast = agent.forecast()
+    # The forecast is cached until the next quarter hour; so is its mean
+    if _network_curve.get('forecast') is not forecast:
+        levels = forecast['levels'][:forecast['routes']] if forecast['routes'] else forecast['levels'][-1:]
+        _network_curve['curve'] = (forecast['start'], FORECAST_STEP_MINUTES, levels.mean(axis=0).astype(np.float64))
+        _network_curve['forecast'] = forecast
+    return _network_curve['curve']
+
+class RouteEta:
+    """Cumulative ETAs for one driver's stops
+
+    Times are minutes after origin. Every stop holds the timed leg that leads
+    to it (from the previous stop, or from the driver for the first one) and
+    its ETA, the service start:
+        eta[k] = max(eta[k-1] + service[k-1] + leg[k], earliest[k])
+    with the driver's position and clock in place of stop -1.
+    """
+
+    def __init__(self, location=None, origin=None, load=0, traffic_curve=None, predictor=predict_leg_minutes):
+        self.origin = origin or datetime.now()
+        self.load = load
+        self.traffic_curve = traffic_curve
+        self._predict = predictor
+        self._position = location if _located(location) else None
+        self._clock = 0.0
+        self._stops = []
+        self._orders = {}  # order id -> {'pickup': stop, 'delivery': stop}
+        self._lock = threading.Lock()
+        self.legs_timed = 0
+        self.updated_at = datetime.now()
+
+    @classmethod
+    def from_plan(cls, plan, location=None, traffic_curve=None, predictor=predict_leg_minutes):
+        """ETAs for a RoutePlan's stops, all legs timed in one model call"""
+        eta = cls(location, plan.start_time, plan.load, traffic_curve, predictor)
+        departures, t = [], 0.0
+        for stop, begin in zip(plan.stops, plan._begin):
+            departures.append(t)
+            eta._add(len(eta._stops), stop)
+            t = begin + stop['service']
+        with eta._lock:
+            eta._time_legs(range(len(eta._stops)), departures)
+            eta._propagate(0)
+        return eta
+
+    def eta(self, order_id):
+        """ETAs of the order's remaining stops as timestamps; None for an order not on the route"""
+        stops = self._orders.get(order_id)
+        if stops is None:
+            return None
+        pickup, delivery = stops.get('pickup'), stops.get('delivery')
+        return {
+            'order_id': order_id,
+            'pickup_eta': self._timestamp(pickup['eta']) if pickup else None,
+            'delivery_eta': self._timestamp(delivery['eta']) if delivery else None,
+            'late': bool(delivery and delivery['eta'] > delivery['latest']),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+    def etas(self):
+        """The route's remaining stops in order, with their ETAs"""
+        return [{'order_id': stop['order_id'], 'type': stop['type'], 'eta': self._timestamp(stop['eta'])}
+                for stop in list(self._stops)]
+
+    def move(self, location, now=None):
+        """Driver position sample: the first leg keeps its timed pace over the distance left"""
+        with self._lock:
+            self._position = location if _located(location) else None
+            self._clock = self._minutes(now)
+            if self._stops:
+                first = self._stops[0]
+                km = self._km(self._position, first['location'])
+                if first['leg_km'] > 0:
+                    first['leg'] = first['leg'] / first['leg_km'] * km
+                    first['leg_km'] = km
+                else:
+                    self._time_legs([0], [self._clock])
+                self._propagate(0)
+            self.updated_at = datetime.now()
+
+    def complete(self, order_id, stop_type, now=None):
+        """The driver served a stop (now): it leaves the route and the driver is at its location;
+        False if the stop is not on the route"""
+        with self._lock:
+            stop = self._orders.get(order_id, {}).pop(stop_type, None)
+            if stop is None:
+                return False
+            if not self._orders[order_id]:
+                del self._orders[order_id]
+            k = self._index(stop)
+            del self._stops[k]
+            self._position = stop['location']
+            self._clock = self._minutes(now)
+            # Served out of order: the way into the next stop and the gap it left change
+            changed = [0] if k else []
+            if 0 < k < len(self._stops):
+                changed.append(k)
+            if changed:
+                self._time_legs(changed, [self._clock] + [self._departure(k)] * (len(changed) - 1))
+            self._propagate(0, changed[-1] if changed else 0)
+            self.updated_at = datetime.now()
+            return True
+
+    def insert(self, stop, before=None, start_time=None):
+        """Add a RoutePlan stop ahead of the stop before = (order id, stop type), or at the
+        end; False if that stop is not on the route. start_time is the plan's, when its
+        times count from another origin"""
+        with self._lock:
+            if before is None:
+                k = len(self._stops)
+            else:
+                following = self._orders.get(before[0], {}).get(before[1])
+                if following is None:
+                    return False
+                k = self._index(following)
+            self._add(k, stop, (start_time - self.origin).total_seconds() / 60 if start_time else 0.0)
+            departure = self._departure(k)
+            legs, departures = [k], [departure]
+            if k + 1 < len(self._stops):
+                # Estimated departure from the new stop: haversine travel plus its service time
+                legs.append(k + 1)
+                departures.append(departure + self._km(self._from(k), stop['location']) * MINUTES_PER_KM
+                                  + stop['service'])
+            self._time_legs(legs, departures)
+            self._propagate(k, legs[-1])
+            self.updated_at = datetime.now()
+            return True
+
+    def _add(self, k, stop, shift=0.0):
+        entry = {
+            'order_id': stop['order_id'],
+            'type': stop['type'],
+            'location': stop['location'],
+            'earliest': stop['earliest'] + shift,
+            'latest': stop['latest'] + shift,
+            'service': stop['service'],
+            'demand': stop['demand'],
+            'leg': 0.0,
+            'leg_km': 0.0
+        }
+        self._stops.insert(k, entry)
+        self._orders.setdefault(stop['order_id'], {})[stop['type']] = entry
+
+    def _time_legs(self, indexes, departures):
+        """Time the legs into the given stops in one model call (departures in minutes after origin)"""
+        indexes = list(indexes)
+        kms = [self._km(self._from(k), self._stops[k]['location']) for k in indexes]
+        timed = [(k, km, departure) for k, km, departure in zip(indexes, kms, departures) if km > 0]
+        for k, km in zip(indexes, kms):
+            self._stops[k]['leg'], self._stops[k]['leg_km'] = 0.0, km
+        if not timed:
+            return
+        loads = np.cumsum([self.load] + [stop['demand'] for stop in self._stops])
+        minutes = self._predict(
+            np.array([km for _, km, _ in timed]),
+            np.array([loads[k] for k, _, _ in timed]),
+            np.array([self._traffic_level(departure) for _, _, departure in timed]),
+            np.array([(self.origin + timedelta(minutes=departure)).hour for _, _, departure in timed]))
+        for (k, _, _), leg in zip(timed, np.atleast_1d(minutes)):
+            self._stops[k]['leg'] = float(leg)
+        self.legs_timed += len(timed)
+
+    def _propagate(self, k, through=None):
+        """Carry ETAs forward from stop k; legs up to stop through (default k) changed, so
+        from there on the first stop whose ETA does not change ends it"""
+        through = k if through is None else through
+        t = self._departure(k)
+        for i in range(k, len(self._stops)):
+            stop = self._stops[i]
+            eta = max(t + stop['leg'], stop['earliest'])
+            if i >= through and stop.get('eta') == eta:
+                break
+            stop['eta'] = eta
+            t = eta + stop['service']
+
+    def _traffic_level(self, departure):
+        if self.traffic_curve is None:
+            return DEFAULT_TRAFFIC_LEVEL
+        start, step, levels = self.traffic_curve
+        minutes = (self.origin - start).total_seconds() / 60 + departure
+        return float(levels[min(len(levels) - 1, max(0, int(minutes // step)))])
+
+    def _departure(self, k):
+        """When the driver sets off towards stop k"""
+        if k == 0:
+            return self._clock
+        previous = self._stops[k - 1]
+        return previous['eta'] + previous['service']
+
+    def _from(self, k):
+        return self._stops[k - 1]['location'] if k else self._position
+
+    def _index(self, stop):
+        return next(k for k, entry in enumerate(self._stops) if entry is stop)
+
+    def _km(self, a, b):
+        if not (_located(a) and _located(b)):
+            return 0.0  # unknown position: no distance to time
+        return float(haversine_km(a['lat'], a['lng'], b['lat'], b['lng']))
+
+    def _minutes(self, now):
+        return ((now or datetime.now()) - self.origin).total_seconds() / 60
+
+    def _timestamp(self, minutes):
+        return (self.origin + timedelta(minutes=minutes)).isoformat()
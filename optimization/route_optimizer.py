@@ -0,0 +1,535 @@
+"""
+Route Optimizer - Pickup and delivery routing with time windows (VRPTW)
+Every order becomes a pickup and a delivery stop, each with a time window and
+a service time. A window is taken from the order when it carries one, else
+derived from the client's preferred_time slot narrowed by urgency. Routes are
+built by cheapest feasible insertion: each stop keeps its latest feasible
+start, so a position that would break a later window is rejected in O(1).
+Fleets can instead be solved by OR-Tools within a time limit.
+"""
+
+import math
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from dotenv import load_dotenv
+
+from services.pricing import MINUTES_PER_KM, haversine_km
+
+load_dotenv()
+
+PICKUP_SERVICE_MINUTES = float(os.getenv('ROUTE_PICKUP_SERVICE_MIN', '5'))
+DELIVERY_SERVICE_MINUTES = float(os.getenv('ROUTE_DELIVERY_SERVICE_MIN', '5'))
+# Orders without a window may be delivered any time within the horizon
+ROUTE_HORIZON_MINUTES = float(os.getenv('ROUTE_HORIZON_HOURS', '24')) * 60
+ROUTE_SOLVER_TIME = int(os.getenv('ROUTE_SOLVER_TIME_MS', '1000')) / 1000
+
+# Client preferred_time slots (local hours)
+TIME_SLOTS = {'morning': (8, 12), 'afternoon': (12, 17), 'evening': (17, 21)}
+# Deliver within this many minutes, whatever the slot
+URGENCY_DEADLINES = {'urgent': 60, 'high': 60, 'medium': 180}
+
+def _routing():
+    """OR-Tools routing modules, imported on first fleet solve; None if not installed"""
+    try:
+        from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+    except ImportError:
+        return None
+    return pywrapcp, routing_enums_pb2
+
+def _located(location):
+    return isinstance(location, dict) and location.get('lat') is not None and location.get('lng') is not None \
+        and bool(location['lat'] or location['lng'])
+
+def _minutes_after(value, start_time):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - start_time).total_seconds() / 60
+
+def delivery_window(order, start_time):
+    """(earliest, latest) delivery in minutes after start_time
+
+    An explicit delivery_window {'earliest', 'latest'} (datetimes or ISO
+    strings) wins; otherwise the preferred_time slot (the next one if today's
+    has passed), cut short by the urgency deadline. Urgency beats a slot that
+    opens after its deadline.
+    """
+    window = order.get('delivery_window')
+    if window:
+        earliest = _minutes_after(window['earliest'], start_time) if window.get('earliest') else 0.0
+        latest = _minutes_after(window['latest'], start_time) if window.get('latest') else ROUTE_HORIZON_MINUTES
+        return max(0.0, earliest), latest
+
+    preferences = order.get('preferences') or {}
+    earliest, latest = 0.0, ROUTE_HORIZON_MINUTES
+    slot = TIME_SLOTS.get(order.get('preferred_time') or preferences.get('preferred_time'))
+    if slot:
+        day = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        opens, closes = day + timedelta(hours=slot[0]), day + timedelta(hours=slot[1])
+        if closes <= start_time:
+            opens, closes = opens + timedelta(days=1), closes + timedelta(days=1)
+        earliest, latest = max(0.0, _minutes_after(opens, start_time)), _minutes_after(closes, start_time)
+
+    deadline = URGENCY_DEADLINES.get(order.get('urgency') or preferences.get('urgency'))
+    if deadline is not None:
+        if deadline < earliest:
+            earliest, latest = 0.0, deadline
+        else:
+            latest = min(latest, deadline)
+    return earliest, latest
+
+def order_stops(order, start_time):
+    """Pickup and delivery stop dicts for an order (times in minutes after start_time)"""
+    weight = order.get('weight', 1)
+    earliest, latest = delivery_window(order, start_time)
+    pickup_window = order.get('pickup_window') or {}
+    pickup = {
+        'order_id': order['order_id'],
+        'type': 'pickup',
+        'location': order['pickup_location'],
+        'earliest': max(0.0, _minutes_after(pickup_window['earliest'], start_time)) if pickup_window.get('earliest') else 0.0,
+        'latest': min(latest, _minutes_after(pickup_window['latest'], start_time)) if pickup_window.get('latest') else latest,
+        'service': order.get('pickup_service_minutes', PICKUP_SERVICE_MINUTES),
+        'demand': weight
+    }
+    delivery = {
+        'order_id': order['order_id'],
+        'type': 'delivery',
+        'location': order['delivery_location'],
+        'earliest': earliest,
+        'latest': latest,
+        'service': order.get('service_minutes', DELIVERY_SERVICE_MINUTES),
+        'demand': -weight
+    }
+    return pickup, delivery
+
+def on_board(order):
+    """Picked up already: only the delivery is left to plan"""
+    return order.get('status') == 'picked_up'
+
+def _rejection(order, capacity):
+    if not (_located(order.get('pickup_location')) and _located(order.get('delivery_location'))):
+        return 'missing_location'
+    if capacity is not None and order.get('weight', 1) > capacity:
+        return 'over_capacity'
+    return 'infeasible'
+
+class RoutePlan:
+    """One vehicle's stops in visiting order, with service start times
+
+    Node 0 of the travel matrix is the vehicle's start; when its position is
+    unknown the route starts at the first stop. Routes are open (no return leg).
+    """
+
+    def __init__(self, start_location=None, capacity=None, start_time=None, load=0):
+        self.start_time = start_time or datetime.now()
+        self.capacity = capacity
+        self.load = load
+        self.stops = []
+        self._known_start = _located(start_location)
+        start = (start_location['lat'], start_location['lng']) if self._known_start else (np.nan, np.nan)
+        self._coords = np.array([start], dtype=np.float64)
+        self._travel = np.zeros((1, 1))
+        self._refresh()
+
+    def insertion(self, order):
+        """Cheapest feasible (added_minutes, pickup_index, delivery_index), or None"""
+        pickup, delivery = order_stops(order, self.start_time)
+        weight = pickup['demand']
+        if self.capacity is not None and self.load + weight > self.capacity:
+            return None
+        to_p = self._travel_to(pickup['location'])
+        to_d = self._travel_to(delivery['location'])
+        p_d = self._minutes(pickup['location'], delivery['location'])
+
+        # Straight from the start is the earliest either stop can be served
+        begin_p = max(to_p[0], pickup['earliest'])
+        if begin_p > pickup['latest'] or \
+                max(begin_p + pickup['service'] + p_d, delivery['earliest']) > delivery['latest']:
+            return None
+
+        stops, travel, n = self.stops, self._travel, len(self.stops)
+        nodes = [0] + [stop['node'] for stop in stops]
+        best = None
+        for i in range(n + 1):
+            # Pickup goes before stop i
+            prev_node = nodes[i]
+            prev_end = self._begin[i - 1] + stops[i - 1]['service'] if i else 0.0
+            if self.capacity is not None and (self._load_after[i - 1] if i else self.load) + weight > self.capacity:
+                continue
+            begin_p = max(prev_end + to_p[prev_node], pickup['earliest'])
+            if begin_p > pickup['latest']:
+                continue
+            removed = travel[prev_node, nodes[i + 1]] if i < n else 0.0
+            added_p = to_p[prev_node]
+
+            t, at_pickup = begin_p + pickup['service'], True
+            for j in range(i, n + 1):
+                # Delivery goes before stop j, after the pickup and stops i..j-1
+                cur_node = nodes[j]
+                to_delivery = p_d if at_pickup else to_d[cur_node]
+                begin_d = max(t + to_delivery, delivery['earliest'])
+                if begin_d <= delivery['latest'] and (
+                        j == n or begin_d + delivery['service'] + to_d[nodes[j + 1]] <= self._latest_start[j]):
+                    if j == i:
+                        added = added_p + p_d + (to_d[nodes[i + 1]] if i < n else 0.0) - removed
+                    else:
+                        replaced = travel[cur_node, nodes[j + 1]] if j < n else 0.0
+                        added = (added_p + to_p[nodes[i + 1]] - removed
+                                 + to_delivery + (to_d[nodes[j + 1]] if j < n else 0.0) - replaced)
+                    if best is None or added < best[0]:
+                        best = (added, i, j)
+                if j == n or t > delivery['latest']:
+                    break
+                # Carry the order past stop j
+                stop = stops[j]
+                if self.capacity is not None and self._load_after[j] + weight > self.capacity:
+                    break
+                arrive = t + (to_p[stop['node']] if at_pickup else travel[cur_node, stop['node']])
+                t = max(arrive, stop['earliest'])
+                if t > stop['latest']:
+                    break
+                t += stop['service']
+                at_pickup = False
+        return best
+
+    def try_insert(self, order):
+        """Insert the order at its cheapest feasible position; False if there is none"""
+        best = self.insertion(order)
+        if best is None:
+            return False
+        self.insert_at(order, best[1], best[2])
+        return True
+
+    def insert_at(self, order, i, j):
+        """Insert the pickup before stop i and the delivery before stop j (indexes from
+        insertion); returns the two new stops"""
+        pickup, delivery = order_stops(order, self.start_time)
+        pickup['node'], delivery['node'] = self._add_nodes([pickup['location'], delivery['location']])
+        self.stops.insert(i, pickup)
+        self.stops.insert(j + 1, delivery)
+        self._refresh()
+        return pickup, delivery
+
+    def stop_insertion(self, stop):
+        """Cheapest feasible (added_minutes, index) for a single stop that only unloads
+        (the delivery of an order on board), or None"""
+        to_s = self._travel_to(stop['location'])
+        stops, travel, n = self.stops, self._travel, len(self.stops)
+        nodes = [0] + [s['node'] for s in stops]
+        best = None
+        for k in range(n + 1):
+            prev_end = self._begin[k - 1] + stops[k - 1]['service'] if k else 0.0
+            if prev_end > stop['latest']:
+                break  # later positions only start later
+            begin = max(prev_end + to_s[nodes[k]], stop['earliest'])
+            if begin > stop['latest']:
+                continue
+            if k < n and begin + stop['service'] + to_s[nodes[k + 1]] > self._latest_start[k]:
+                continue
+            added = to_s[nodes[k]] + (to_s[nodes[k + 1]] - travel[nodes[k], nodes[k + 1]] if k < n else 0.0)
+            if best is None or added < best[0]:
+                best = (added, k)
+        return best
+
+    def try_insert_delivery(self, order):
+        """Insert the delivery of an order on board at its cheapest feasible position;
+        its weight is already in the starting load"""
+        delivery = order_stops(order, self.start_time)[1]
+        best = self.stop_insertion(delivery)
+        if best is None:
+            return False
+        delivery['node'], = self._add_nodes([delivery['location']])
+        self.stops.insert(best[1], delivery)
+        self._refresh()
+        return True
+
+    def serve(self, order_id, stop_type, now=None):
+        """The driver served a stop: it leaves the plan (a delivery takes its pending pickup
+        with it), the plan restarts from the stop's location at now and the load follows"""
+        served = next((stop for stop in self.stops if stop['order_id'] == order_id and stop['type'] == stop_type),
+                      None)
+        if served is None:
+            return False
+        if stop_type == 'pickup':
+            self.load += served['demand']
+        elif not any(stop['order_id'] == order_id and stop['type'] == 'pickup' for stop in self.stops):
+            self.load += served['demand']
+        self.stops = [stop for stop in self.stops
+                      if not (stop['order_id'] == order_id and (stop is served or stop_type == 'delivery'))]
+
+        # Windows are minutes after start_time: shift them to the new start
+        now = now or datetime.now()
+        shift = (now - self.start_time).total_seconds() / 60
+        for stop in self.stops:
+            stop['earliest'] = max(0.0, stop['earliest'] - shift)
+            stop['latest'] -= shift
+        self.start_time = now
+        self._known_start = True
+        self._coords[0] = (served['location']['lat'], served['location']['lng'])
+        self._add_nodes([])  # recomputes travel from the new start
+        self._refresh()
+        return True
+
+    def append(self, order, late=False):
+        """Add the order's pickup and delivery (just the delivery once it is on board) at the
+        end of the route without any check; late orders (windows already missed) no longer
+        constrain the stops before them"""
+        stops = order_stops(order, self.start_time)
+        for stop in stops[1:] if on_board(order) else stops:
+            if late:
+                stop['latest'] = math.inf
+                stop['late'] = True
+            self.append_stop(stop)
+
+    def append_stop(self, stop):
+        stop['node'], = self._add_nodes([stop['location']])
+        self.stops.append(stop)
+        self._refresh()
+
+    @property
+    def total_minutes(self):
+        return self._begin[-1] + self.stops[-1]['service'] if self.stops else 0.0
+
+    def route(self):
+        """Stops with their planned arrival (service start) and window as timestamps"""
+        route = []
+        for stop, begin in zip(self.stops, self._begin):
+            entry = {
+                'location': stop['location'],
+                'type': stop['type'],
+                'order_id': stop['order_id'],
+                'eta': (self.start_time + timedelta(minutes=begin)).isoformat(),
+                'arrival_minutes': round(begin, 1),
+                'service_minutes': stop['service'],
+                'window': {
+                    'earliest': (self.start_time + timedelta(minutes=stop['earliest'])).isoformat(),
+                    'latest': (self.start_time + timedelta(minutes=stop['latest'])).isoformat()
+                              if math.isfinite(stop['latest']) else None
+                }
+            }
+            if stop.get('late'):
+                entry['late'] = True
+            route.append(entry)
+        return route
+
+    def _refresh(self):
+        """Service start times (forward), latest feasible starts (backward) and loads"""
+        n = len(self.stops)
+        self._begin, self._latest_start, self._load_after = [0.0] * n, [0.0] * n, [0.0] * n
+        t, node, load = 0.0, 0, self.load
+        for k, stop in enumerate(self.stops):
+            t = max(t + float(self._travel[node, stop['node']]), stop['earliest'])
+            self._begin[k] = t
+            t += stop['service']
+            node = stop['node']
+            load += stop['demand']
+            self._load_after[k] = load
+        for k in range(n - 1, -1, -1):
+            stop = self.stops[k]
+            self._latest_start[k] = stop['latest'] if k == n - 1 else min(
+                stop['latest'],
+                self._latest_start[k + 1] - float(self._travel[stop['node'], self.stops[k + 1]['node']]) - stop['service'])
+
+    def _minutes(self, a, b):
+        return float(haversine_km(a['lat'], a['lng'], b['lat'], b['lng'])) * MINUTES_PER_KM
+
+    def _travel_to(self, location):
+        """Minutes from every node to location (0 from an unknown start)"""
+        minutes = haversine_km(self._coords[:, 0], self._coords[:, 1], location['lat'], location['lng']) * MINUTES_PER_KM
+        if not self._known_start:
+            minutes[0] = 0.0
+        return minutes
+
+    def _add_nodes(self, locations):
+        points = np.array([(loc['lat'], loc['lng']) for loc in locations], dtype=np.float64).reshape(-1, 2)
+        coords = np.vstack([self._coords, points])
+        travel = haversine_km(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1]) \
+            * MINUTES_PER_KM
+        # An unknown start (NaN) is no distance from anywhere
+        travel[np.isnan(travel)] = 0.0
+        first = len(self._coords)
+        self._coords, self._travel = coords, travel
+        return list(range(first, first + len(locations)))
+
+def _by_deadline(orders, start_time):
+    """Tightest delivery windows first"""
+    return sorted(orders, key=lambda order: delivery_window(order, start_time)[1])
+
+def _unplannable(order):
+    if on_board(order):
+        return not _located(order.get('delivery_location'))
+    return _rejection(order, None) == 'missing_location'
+
+def build_route_plan(current_location, orders, capacity=None, start_time=None, load=0):
+    """Insert orders by deadline into one vehicle's route; returns (plan, rejected)
+
+    Orders already picked up only get their delivery, and their weight is on
+    board from the start.
+    """
+    load += sum(order.get('weight', 1) for order in orders if on_board(order))
+    plan = RoutePlan(current_location, capacity, start_time, load)
+    rejected = []
+    for order in _by_deadline([o for o in orders if not _unplannable(o)], plan.start_time):
+        if on_board(order):
+            if not plan.try_insert_delivery(order):
+                rejected.append({'order_id': order['order_id'], 'reason': 'infeasible'})
+        elif not plan.try_insert(order):
+            rejected.append({'order_id': order['order_id'], 'reason': _rejection(order, capacity)})
+    rejected.extend({'order_id': o.get('order_id'), 'reason': 'missing_location'}
+                    for o in orders if _unplannable(o))
+    return plan, rejected
+
+def optimize_delivery_route(current_location, orders, capacity=None, start_time=None, time_limit=None):
+    """Time-window-feasible route for one vehicle: cheapest insertion, or OR-Tools
+    searching for up to time_limit seconds when one is given"""
+    if time_limit:
+        fleet = plan_fleet([{'id': 'vehicle', 'location': current_location, 'capacity': capacity}],
+                           orders, start_time, time_limit)
+        return {
+            'route': fleet['routes'].get('vehicle', []),
+            'rejected': fleet['rejected'],
+            'total_minutes': fleet['total_minutes'],
+            'solver': fleet['solver'],
+            'solve_ms': fleet['solve_ms']
+        }
+
+    started = time.perf_counter()
+    plan, rejected = build_route_plan(current_location, orders, capacity, start_time)
+    return {
+        'route': plan.route(),
+        'rejected': rejected,
+        'total_minutes': round(plan.total_minutes, 1),
+        'solver': 'insertion',
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def plan_fleet(vehicles, orders, start_time=None, time_limit=ROUTE_SOLVER_TIME):
+    """Routes for several vehicles ({'id', 'location', 'capacity', 'load'}) serving orders
+
+    Each order first goes to the vehicle with its cheapest feasible insertion;
+    OR-Tools then improves on that for up to time_limit seconds when installed.
+    """
+    started = time.perf_counter()
+    start_time = start_time or datetime.now()
+    routable = [o for o in orders if _rejection(o, None) != 'missing_location']
+    rejected = [{'order_id': o.get('order_id'), 'reason': 'missing_location'}
+                for o in orders if _rejection(o, None) == 'missing_location']
+
+    # Cheapest insertion: the answer without OR-Tools, and its starting solution
+    plans = {v['id']: RoutePlan(v.get('location'), v.get('capacity'), start_time, v.get('load', 0))
+             for v in vehicles}
+    for order in _by_deadline(routable, start_time):
+        options = [(best, vehicle_id) for vehicle_id, plan in plans.items()
+                   for best in [plan.insertion(order)] if best is not None]
+        if options:
+            _, vehicle_id = min(options, key=lambda option: option[0][0])
+            plans[vehicle_id].try_insert(order)
+
+    solver = 'insertion'
+    if vehicles and routable and time_limit and _routing() is not None:
+        improved = _solve_or_tools(vehicles, routable, start_time, time_limit, plans)
+        if improved is not None and _served(improved) >= _served(plans):
+            plans, solver = improved, 'or-tools'
+
+    served = {stop['order_id'] for plan in plans.values() for stop in plan.stops}
+    capacities = [v.get('capacity') for v in vehicles if v.get('capacity') is not None]
+    rejected.extend({'order_id': o['order_id'], 'reason': _rejection(o, max(capacities) if capacities else None)}
+                    for o in routable if o['order_id'] not in served)
+    return {
+        'routes': {vehicle_id: plan.route() for vehicle_id, plan in plans.items() if plan.stops},
+        'rejected': rejected,
+        'total_minutes': round(sum(plan.total_minutes for plan in plans.values()), 1),
+        'solver': solver,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def _served(plans):
+    return sum(len(plan.stops) for plan in plans.values())
+
+def _solve_or_tools(vehicles, orders, start_time, time_limit, initial):
+    """Pickup-and-delivery with time windows and capacities, starting from the initial
+    {vehicle id: RoutePlan}; returns improved plans or None"""
+    pywrapcp, routing_enums_pb2 = _routing()
+    # Orders whose window is already closed cannot be served and stay out of the model
+    stops = [stop for order in orders for pair in [order_stops(order, start_time)]
+             if all(stop['latest'] >= stop['earliest'] for stop in pair) for stop in pair]
+    if not stops:
+        return None
+    vehicle_count, stop_count = len(vehicles), len(stops)
+    end_node = vehicle_count + stop_count
+
+    # Nodes: vehicle starts, then each order's pickup and delivery, then a shared open end
+    starts = [(v['location']['lat'], v['location']['lng']) if _located(v.get('location')) else (np.nan, np.nan)
+              for v in vehicles]
+    coords = np.array(starts + [(s['location']['lat'], s['location']['lng']) for s in stops] + [(np.nan, np.nan)])
+    seconds = haversine_km(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1]) \
+        * MINUTES_PER_KM * 60
+    seconds[np.isnan(seconds)] = 0.0
+    service = [0] * vehicle_count + [int(round(s['service'] * 60)) for s in stops] + [0]
+    transit = (np.rint(seconds).astype(np.int64) + np.array(service)[:, None]).tolist()
+    for row in transit:
+        row[end_node] = 0
+
+    manager = pywrapcp.RoutingIndexManager(end_node + 1, vehicle_count, list(range(vehicle_count)),
+                                           [end_node] * vehicle_count)
+    routing = pywrapcp.RoutingModel(manager)
+    transit_index = routing.RegisterTransitCallback(
+        lambda i, j: transit[manager.IndexToNode(i)][manager.IndexToNode(j)])
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_index)
+
+    horizon = int(max(ROUTE_HORIZON_MINUTES, max(s['latest'] for s in stops)) * 60) + 1
+    routing.AddDimension(transit_index, horizon, horizon, False, 'Time')
+    time_dimension = routing.GetDimensionOrDie('Time')
+    for v in range(vehicle_count):
+        time_dimension.CumulVar(routing.Start(v)).SetRange(0, 0)
+
+    # Weights in hundredths of a kg; vehicles without a capacity are unlimited
+    demands = [0] * vehicle_count + [int(round(s['demand'] * 100)) for s in stops] + [0]
+    demand_index = routing.RegisterUnaryTransitCallback(lambda i: demands[manager.IndexToNode(i)])
+    total = sum(d for d in demands if d > 0)
+    routing.AddDimensionWithVehicleCapacity(
+        demand_index, 0,
+        [int((v['capacity'] - v.get('load', 0)) * 100) if v.get('capacity') is not None else total for v in vehicles],
+        True, 'Capacity')
+
+    penalty = horizon * 10
+    solver = routing.solver()
+    for k in range(0, stop_count, 2):
+        pickup, delivery = manager.NodeToIndex(vehicle_count + k), manager.NodeToIndex(vehicle_count + k + 1)
+        for node, stop in ((pickup, stops[k]), (delivery, stops[k + 1])):
+            earliest = int(math.ceil(stop['earliest'] * 60))
+            time_dimension.CumulVar(node).SetRange(earliest, max(earliest, int(stop['latest'] * 60)))
+        routing.AddPickupAndDelivery(pickup, delivery)
+        solver.Add(routing.VehicleVar(pickup) == routing.VehicleVar(delivery))
+        solver.Add(time_dimension.CumulVar(pickup) <= time_dimension.CumulVar(delivery))
+        routing.AddDisjunction([pickup, delivery], penalty, 2)
+
+    parameters = pywrapcp.DefaultRoutingSearchParameters()
+    parameters.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PARALLEL_CHEAPEST_INSERTION
+    parameters.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    parameters.time_limit.FromMilliseconds(max(1, int(time_limit * 1000)))
+    routing.CloseModelWithParameters(parameters)
+    nodes = {(stop['order_id'], stop['type']): vehicle_count + k for k, stop in enumerate(stops)}
+    routes = [[nodes[key] for key in ((stop['order_id'], stop['type']) for stop in initial[v['id']].stops)
+               if key in nodes] for v in vehicles]
+    # Rounding to whole seconds can make the initial routes unreadable; then search from scratch
+    assignment = routing.ReadAssignmentFromRoutes(routes, True)
+    if assignment is not None:
+        solution = routing.SolveFromAssignmentWithParameters(assignment, parameters)
+    else:
+        solution = routing.SolveWithParameters(parameters)
+    if solution is None:
+        return None
+
+    plans = {}
+    for v, vehicle in enumerate(vehicles):
+        plan = RoutePlan(vehicle.get('location'), vehicle.get('capacity'), start_time, vehicle.get('load', 0))
+        index = solution.Value(routing.NextVar(routing.Start(v)))
+        while not routing.IsEnd(index):
+            plan.append_stop(dict(stops[manager.IndexToNode(index) - vehicle_count]))
+            index = solution.Value(routing.NextVar(index))
+        plans[vehicle['id']] = plan
+    return plans
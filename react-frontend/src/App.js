@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import io from 'socket.io-client';
 import OrderForm from './components/OrderForm';
@@ -29,6 +29,7 @@ function App() {
   const [trackingOrder, setTrackingOrder] = useState(null);
   const [user, setUser] = useState(null);
   const [agents, setAgents] = useState([]);
+  const ordersRef = useRef([]);
 
   useEffect(() => {
     // Check for existing auth
@@ -42,11 +43,18 @@ function App() {
       localStorage.setItem('user', JSON.stringify({username: 'demo', role: 'client'}));
     }
 
-    const newSocket = io(API_URL);
+    // The token puts managers in their role room; everyone else follows
+    // the orders and drivers they subscribe to
+    const newSocket = io(API_URL, { auth: { token } });
     
     newSocket.on('connect', () => {
       console.log('Connected to server');
       setConnected(true);
+      // Rooms do not survive a reconnect
+      const orderIds = ordersRef.current.map(order => order.order_id);
+      if (orderIds.length) {
+        newSocket.emit('subscribe', { orders: orderIds });
+      }
     });
 
     newSocket.on('disconnect', () => {
@@ -70,6 +78,13 @@ function App() {
     return () => newSocket.close();
   }, []);
 
+  useEffect(() => {
+    ordersRef.current = orders;
+    if (socket && orders.length) {
+      socket.emit('subscribe', { orders: orders.map(order => order.order_id) });
+    }
+  }, [socket, orders]);
+
   const updateOrderStatus = (orderData) => {
     setOrders(prevOrders => 
       prevOrders.map(order => 
@@ -125,7 +140,10 @@ function App() {
 
   const handleCreateOrder = async (orderData) => {
     try {
-      const response = await axios.post('/api/orders/create', orderData);
+      const response = await axios.post('/api/orders/create', {
+        ...orderData,
+        socket_id: socket?.id
+      });
       
       if (response.data.order_id) {
         const newOrder = {
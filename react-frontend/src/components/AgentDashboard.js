@@ -13,6 +13,13 @@ function AgentDashboard({ agents, socket }) {
     return () => clearInterval(interval);
   }, []);
 
+  useEffect(() => {
+    // agent_status events are sent to each driver's room
+    if (socket && agents.length) {
+      socket.emit('subscribe', { drivers: agents });
+    }
+  }, [socket, agents]);
+
   const loadTrafficData = async () => {
     try {
       const response = await axios.get('/api/traffic/status');
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Order Parser Micro-benchmark
+Times services.order_parser.parse_order_text next to the previous
+per-call-compiled regex extraction over a corpus of realistic chat messages,
+after checking the parses that have regressed before. The parser reads more
+(units, counts, notes, confidence) at about the same cost; the bench is there
+to keep it that way.
+
+Usage: python scripts/bench_order_parser.py [--repeat N] [--check]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.order_parser import parse_order_text
+
+CORPUS = [
+    "Send 2kg from Empire State Building to Times Square",
+    "Deliver from Central Park to Brooklyn Bridge",
+    "I need 5kg package from JFK Airport to Manhattan",
+    "from Central Park to Brooklyn 5kg",
+    "Deliver from Central Park to Brooklyn, 5 kilos",
+    "send a package from 123 Main St to 456 Oak Ave.",
+    "Please pick up from Grand Central Terminal to Wall Street, fragile",
+    "urgent: from LaGuardia Airport to Columbia University 1.5 kg",
+    "ship 3 boxes, 10 lbs from St. Mark's Place to 5th Avenue",
+    "from Hoboken Terminal to Jersey City 750g documents",
+    "Can you take 12 lbs from the Whitney Museum to the High Line? handle with care",
+    "from Queens Center Mall to Flushing Meadows then to Citi Field",
+    "from Penn Station to Madison Square Garden",
+    "Pickup from 350 5th Ave to 1 World Trade Center, 2 parcels, 4kg",
+    "from Williamsburg to Greenpoint 0.5 kg perishable",
+    "move 20 kg from warehouse 7 to Red Hook Container Terminal asap",
+    "from Astoria Park to Long Island City via Queensboro Plaza",
+    "hi, what are your delivery hours?",
+    "send it to my mom please",
+    "from Battery Park to the Statue of Liberty ferry terminal 3kg, fragile, urgent",
+]
+
+# Messages once mis-parsed, with the fields they must produce
+REGRESSIONS = [
+    ("from Urgent Care Center to Brooklyn Hospital",
+     {'pickup_address': 'Urgent Care Center', 'delivery_address': 'Brooklyn Hospital', 'notes': '', 'success': True}),
+    ("from Penn Station to 221 G Street",
+     {'pickup_address': 'Penn Station', 'delivery_address': '221 G Street', 'weight': 1.0, 'success': True}),
+    ("from Penn Station to 5 Items Lane",
+     {'pickup_address': 'Penn Station', 'delivery_address': '5 Items Lane', 'quantity': 1, 'success': True}),
+    ("from JFK 5kg to Manhattan",
+     {'pickup_address': 'JFK', 'delivery_address': 'Manhattan', 'weight': 5.0, 'success': True}),
+    ("from Central Park to Brooklyn with 3 boxes",
+     {'delivery_address': 'Brooklyn', 'quantity': 3, 'success': True}),
+    # A second stop must keep the message off the regex fast path
+    ("from Penn Station to Times Square to Central Park 2kg",
+     {'weight': 2.0, 'confidence': 0.75, 'success': True}),
+]
+
+def legacy_extract(text, log=None):
+    """The previous _extract_with_regex: patterns looked up and text lowered on every call"""
+    pattern = r'from\s+(.+?)\s+to\s+(.+?)(?:\s*\d+\s*kg|\s*,|\.|$)'
+    match = re.search(pattern, text, re.IGNORECASE)
+
+    pickup = None
+    delivery = None
+
+    if match:
+        pickup = match.group(1).strip().strip(' ,')
+        delivery = match.group(2).strip().strip(' ,')
+        delivery = re.sub(r'\s*\d+\s*kg.*$', '', delivery, flags=re.IGNORECASE).strip()
+
+    weight = 1.0
+    weight_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:kg|kilo)', text, re.IGNORECASE)
+    if weight_match:
+        weight = float(weight_match.group(1))
+
+    notes = ""
+    if 'fragile' in text.lower():
+        notes = "Fragile"
+    elif 'urgent' in text.lower():
+        notes = "Urgent"
+
+    if log is not None:
+        # Diagnostics the old parser printed for every message
+        if pickup and delivery:
+            print(f"  Pickup: '{pickup}'", file=log)
+            print(f"  Delivery: '{delivery}'", file=log)
+            print(f"  Weight: {weight} kg", file=log)
+        else:
+            print(f"  Could not extract locations from: '{text}'", file=log)
+            print(f"  Try: 'from [pickup] to [delivery]'", file=log)
+
+    return {
+        "pickup_address": pickup,
+        "delivery_address": delivery,
+        "weight": weight,
+        "notes": notes,
+        "success": bool(pickup and delivery)
+    }
+
+def run_corpus(parse):
+    for message in CORPUS:
+        parse(message)
+
+def bench(repeat):
+    # re caches compiled patterns, so the legacy cost is the per-call cache
+    # lookup, repeated lowercasing and scanning, plus its diagnostics output
+    devnull = open(os.devnull, 'w')
+    variants = (
+        ('legacy+prints', lambda text: legacy_extract(text, devnull)),
+        ('legacy', legacy_extract),
+        ('order_parser', parse_order_text),
+    )
+    results = {}
+    for name, parse in variants:
+        timings = timeit.repeat(lambda: run_corpus(parse), number=repeat, repeat=5)
+        per_message_us = min(timings) / (repeat * len(CORPUS)) * 1e6
+        results[name] = per_message_us
+        print(f'{name:>14}: {per_message_us:7.2f} us/message  ({1e6 / per_message_us:,.0f} messages/s)')
+    devnull.close()
+
+    for name in ('legacy+prints', 'legacy'):
+        print(f'{"vs " + name:>14}: {results[name] / results["order_parser"]:.2f}x')
+
+def show_parses():
+    print(f'{"message":<62} {"pickup":<28} {"delivery":<28} {"kg":>6} {"qty":>3} conf')
+    for message in CORPUS:
+        r = parse_order_text(message)
+        print(f'{message[:60]:<62} {str(r["pickup_address"])[:26]:<28} {str(r["delivery_address"])[:26]:<28} '
+              f'{r["weight"]:>6} {r["quantity"]:>3} {r["confidence"]:.2f}')
+
+def check_parses():
+    """Print each regression that parses differently; True if all pass"""
+    failures = 0
+    for message, expected in REGRESSIONS:
+        result = parse_order_text(message)
+        wrong = {key: result[key] for key, value in expected.items() if result[key] != value}
+        if wrong:
+            failures += 1
+            print(f'FAIL {message!r}: got {wrong}, expected {({key: expected[key] for key in wrong})}')
+    print(f'{len(REGRESSIONS) - failures}/{len(REGRESSIONS)} regression parses ok')
+    return failures == 0
+
+if __name__ == '__main__':
+    repeat = 2000
+    if '--repeat' in sys.argv:
+        repeat = int(sys.argv[sys.argv.index('--repeat') + 1])
+    if not check_parses():
+        sys.exit(1)
+    if '--check' in sys.argv:
+        sys.exit(0)
+    print()
+    show_parses()
+    print()
+    bench(repeat)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Traffic Tick Benchmark
+Times one TrafficAgent monitoring tick (update_traffic_data + check_for_alerts)
+over a synthetic road network, with alert fan-out stubbed out.
+
+Usage: python scripts/bench_traffic_tick.py [--segments N] [--ticks N]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.traffic_agent import HISTORY_SIZE, TrafficAgent
+
+def bench(segments, ticks):
+    agent = TrafficAgent(segments=[f'segment_{i}' for i in range(segments)])
+    alerts = []
+    def broadcast(route, conditions):
+        alerts.append(route)
+        return []
+    agent.broadcast_traffic_alert = broadcast
+
+    timings = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        agent.update_traffic_data()
+        agent.check_for_alerts()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    memory = (agent.prediction_model.nbytes + agent.traffic_history.nbytes) / len(agent.history_count)
+    print(f'{segments} segments, {ticks} ticks, history {HISTORY_SIZE} per segment')
+    print(f'  tick: median {timings[len(timings) // 2]:.1f} ms, max {timings[-1]:.1f} ms')
+    print(f'  alerts raised: {len(alerts)}')
+    print(f'  model + history: {memory / 1024:.1f} KB per segment')
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    options = {'--segments': 50000, '--ticks': 20}
+    for flag in options:
+        if flag in args:
+            i = args.index(flag)
+            options[flag] = int(args[i + 1])
+    bench(options['--segments'], options['--ticks'])
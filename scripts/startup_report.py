@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup Timing Report - Import cost per module
+Runs each target in a fresh interpreter with `-X importtime` and reports
+wall time plus the most expensive modules it pulled in.
+
+Usage: python scripts/startup_report.py [module ...] [--top N]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_TARGETS = [
+    'api.factory',
+    'api.app',
+    'api.chat_api',
+    'api.route_api',
+    'api.auth_api',
+    'services.llm_service',
+    'services.ml_service',
+    'services.mongo_service',
+    'agents',
+    'optimization.route_optimizer',
+]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(module):
+    """Import module in a fresh interpreter, return (wall_ms, [(self_us, cumulative_us, name)])"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'unknown error'
+        raise RuntimeError(last_line)
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            entries.append((int(self_us), int(cumulative_us), name.rstrip()))
+        except ValueError:
+            continue
+    return wall_ms, entries
+
+def report(targets, top=10):
+    print('=' * 72)
+    print('Startup timing report (fresh interpreter per target)')
+    print('=' * 72)
+
+    for module in targets:
+        try:
+            wall_ms, entries = measure(module)
+        except RuntimeError as e:
+            print(f'\n{module}: import failed - {e}')
+            continue
+
+        own = next((e for e in entries if e[2].strip() == module), None)
+        cumulative_ms = own[1] / 1000 if own else 0.0
+        print(f'\n{module}: {cumulative_ms:.1f} ms import, {wall_ms:.1f} ms wall (incl. interpreter start)')
+
+        heaviest = sorted(entries, key=lambda e: e[0], reverse=True)[:top]
+        for self_us, cum_us, name in heaviest:
+            print(f'  {self_us / 1000:8.1f} ms self {cum_us / 1000:8.1f} ms cumulative  {name.strip()}')
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    top = 10
+    if '--top' in args:
+        i = args.index('--top')
+        top = int(args[i + 1])
+        del args[i:i + 2]
+    report(args or DEFAULT_TARGETS, top)
@@ -0,0 +1,245 @@
+"""
+Agent State - Snapshots and change log for agents' learned state (warm restarts)
+A background thread appends changed state to a per-agent log every few seconds
+and periodically rewrites a compact snapshot (zlib-compressed pickle), so a
+restart loses at most one log interval of learning.
+"""
+
+import atexit
+import hashlib
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AGENT_STATE_DIR = os.getenv('AGENT_STATE_DIR', os.path.join('data', 'agent_state'))
+AGENT_STATE_LOG_INTERVAL = float(os.getenv('AGENT_STATE_LOG_INTERVAL', '5'))
+AGENT_SNAPSHOT_INTERVAL = float(os.getenv('AGENT_SNAPSHOT_INTERVAL', '300'))
+
+_RECORD_HEADER = struct.Struct('>I')
+
+def _dumps(value):
+    """Pickle a live object, retrying if another thread resizes it mid-dump"""
+    for _ in range(5):
+        try:
+            return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except RuntimeError:
+            time.sleep(0)
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _digest(blob):
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+def _field_entries(field, value):
+    """{entry id: blob} for a state field; dicts are diffed key by key, other values whole"""
+    if isinstance(value, dict):
+        for _ in range(5):
+            try:
+                items = list(value.items())
+                break
+            except RuntimeError:
+                time.sleep(0)
+        return {('set', field, key): _dumps(item) for key, item in items}
+    return {('field', field, None): _dumps(value)}
+
+def _apply(state, op, field, key, blob):
+    """Apply one snapshot entry or log record to a state dict"""
+    if op == 'field':
+        state[field] = pickle.loads(blob)
+    elif op == 'set':
+        state.setdefault(field, {})[key] = pickle.loads(blob)
+    else:
+        state.get(field, {}).pop(key, None)
+
+class AgentStateStore:
+    """Keeps tracked agents' STATE_FIELDS on disk
+
+    Layout per agent: <agent_id>.snap holds the last full snapshot and
+    <agent_id>.log the changes since, as length-prefixed compressed records:
+      ('field', field, None, blob) - a non-dict field changed
+      ('set', field, key, blob)    - a dict entry was added or changed
+      ('del', field, key, None)    - a dict entry was removed
+    Only state whose digest changed is logged, so idle agents cost nothing.
+    """
+
+    def __init__(self, directory=AGENT_STATE_DIR, log_interval=AGENT_STATE_LOG_INTERVAL,
+                 snapshot_interval=AGENT_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.log_interval = log_interval
+        self.snapshot_interval = snapshot_interval
+        self._agents = {}
+        self._digests = {}        # agent_id -> {entry id: digest} as of the last log write
+        self._snapshot_digests = {}  # agent_id -> entry digests of the last snapshot
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {'restored': 0, 'log_records': 0, 'snapshots': 0, 'errors': 0}
+
+    def track(self, agent):
+        """Restore an agent's saved state and include it in future snapshots"""
+        if not self.directory or not agent.STATE_FIELDS:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+
+        restored = self._restore(agent)
+        with self._lock:
+            self._agents[agent.agent_id] = agent
+            self._digests[agent.agent_id] = self._current_digests(agent)[0]
+        return restored
+
+    def start(self):
+        """Start the background log/snapshot thread"""
+        if not self.directory or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='agent-state', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and write a final snapshot of every agent"""
+        self._stop.set()
+        self.snapshot_all()
+
+    def snapshot_all(self):
+        with self._lock:
+            for agent in list(self._agents.values()):
+                self._safely(self._snapshot, agent)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['agents'] = len(self._agents)
+        return stats
+
+    def _run(self):
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while not self._stop.wait(self.log_interval):
+            with self._lock:
+                snapshot_due = time.monotonic() >= next_snapshot
+                for agent in list(self._agents.values()):
+                    if snapshot_due:
+                        self._safely(self._snapshot, agent)
+                    else:
+                        self._safely(self._append_changes, agent)
+            if snapshot_due:
+                next_snapshot = time.monotonic() + self.snapshot_interval
+
+    def _safely(self, action, agent):
+        try:
+            action(agent)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Agent state error ({agent.agent_id}): {e}")
+
+    def _path(self, agent_id, suffix):
+        return os.path.join(self.directory, f'{agent_id}{suffix}')
+
+    def _current_digests(self, agent):
+        """Digest of every state entry plus the blobs, for diffing against the last write"""
+        digests, blobs = {}, {}
+        for field, value in agent.export_state().items():
+            for entry, blob in _field_entries(field, value).items():
+                digests[entry] = _digest(blob)
+                blobs[entry] = blob
+        return digests, blobs
+
+    def _append_changes(self, agent):
+        digests, blobs = self._current_digests(agent)
+        previous = self._digests.get(agent.agent_id, {})
+        records = [(op, field, key, blobs[(op, field, key)])
+                   for (op, field, key), digest in digests.items() if previous.get((op, field, key)) != digest]
+        records += [('del', field, key, None)
+                    for (op, field, key) in previous if op == 'set' and (op, field, key) not in digests]
+        if not records:
+            return
+
+        with open(self._path(agent.agent_id, '.log'), 'ab') as f:
+            for record in records:
+                payload = zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+                f.write(_RECORD_HEADER.pack(len(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._digests[agent.agent_id] = digests
+        self.stats['log_records'] += len(records)
+
+    def _snapshot(self, agent):
+        # The snapshot holds the same per-entry blobs the log diffs against, so
+        # the two always describe one consistent read of the agent
+        digests, blobs = self._current_digests(agent)
+        if digests != self._snapshot_digests.get(agent.agent_id):
+            path = self._path(agent.agent_id, '.snap')
+            with open(path + '.tmp', 'wb') as f:
+                f.write(zlib.compress(pickle.dumps(blobs, protocol=pickle.HIGHEST_PROTOCOL)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            self._snapshot_digests[agent.agent_id] = digests
+            self.stats['snapshots'] += 1
+
+        # Everything logged so far is in the snapshot now
+        log_path = self._path(agent.agent_id, '.log')
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        self._digests[agent.agent_id] = digests
+
+    def _restore(self, agent):
+        state = {}
+        snapshot_path = self._path(agent.agent_id, '.snap')
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                blobs = pickle.loads(zlib.decompress(f.read()))
+            for (op, field, key), blob in blobs.items():
+                _apply(state, op, field, key, blob)
+            self._snapshot_digests[agent.agent_id] = {entry: _digest(blob) for entry, blob in blobs.items()}
+
+        replayed = self._replay_log(agent.agent_id, state)
+        if not state:
+            return False
+
+        agent.load_state(state)
+        self.stats['restored'] += 1
+        print(f"Restored state for {agent.agent_id} ({replayed} logged changes)")
+        return True
+
+    def _replay_log(self, agent_id, state):
+        """Apply logged changes on top of the snapshot; a torn final record is ignored"""
+        log_path = self._path(agent_id, '.log')
+        if not os.path.exists(log_path):
+            return 0
+
+        with open(log_path, 'rb') as f:
+            data = f.read()
+
+        offset = replayed = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            (length,) = _RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + _RECORD_HEADER.size:offset + _RECORD_HEADER.size + length]
+            if len(payload) < length:
+                break
+            try:
+                op, field, key, blob = pickle.loads(zlib.decompress(payload))
+            except Exception:
+                break
+            offset += _RECORD_HEADER.size + length
+
+            _apply(state, op, field, key, blob)
+            replayed += 1
+
+        if offset < len(data):
+            # Drop the torn tail so new records are appended after the last good one
+            with open(log_path, 'r+b') as f:
+                f.truncate(offset)
+        return replayed
+
+agent_state_store = AgentStateStore()
+
+def track_agent(agent):
+    """Restore and start persisting an agent's learned state"""
+    agent_state_store.track(agent)
+    agent_state_store.start()
+    return agent
+
+atexit.register(agent_state_store.stop)
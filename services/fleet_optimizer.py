@@ -0,0 +1,316 @@
+"""
+Fleet Optimizer - Periodic fleet-wide re-optimization in a process pool
+Drivers are partitioned by region (geohash of their position). Each
+partition's drivers and their orders not yet picked up are re-solved as one
+VRPTW in a worker process under a time limit, so the sweep uses every core
+without blocking the web process. Under eventlet/gevent the pool's own
+threads are green, so each sweep gets a pool of its own, run and shut down
+on a real OS thread. Moving orders between drivers is proposed only when it
+serves more orders or saves enough minutes per moved order.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+from dotenv import load_dotenv
+
+from api.async_mode import green_runtime, run_in_os_thread
+from optimization.route_optimizer import build_route_plan, plan_fleet
+from services.order_pool import geohash
+
+load_dotenv()
+
+# Seconds between sweeps; 0 runs them only on request
+FLEET_SWEEP_INTERVAL = int(os.getenv('FLEET_SWEEP_INTERVAL', '300'))
+FLEET_SWEEP_WORKERS = int(os.getenv('FLEET_SWEEP_WORKERS', '0')) or os.cpu_count() or 1
+FLEET_SWEEP_TIME = int(os.getenv('FLEET_SWEEP_TIME_MS', '2000')) / 1000
+# Precision 4 regions are about 39 x 20 km
+FLEET_SWEEP_REGION_PRECISION = int(os.getenv('FLEET_SWEEP_REGION_PRECISION', '4'))
+FLEET_SWEEP_MIN_GAIN = float(os.getenv('FLEET_SWEEP_MIN_GAIN_MIN', '5'))
+FLEET_SWEEP_AUTO_APPLY = os.getenv('FLEET_SWEEP_AUTO_APPLY', '0').lower() in ('1', 'true', 'yes')
+FLEET_PROPOSALS_KEPT = 100
+
+def _has_coordinates(order):
+    return all(isinstance(order.get(key), dict) and 'lat' in order[key] and 'lng' in order[key]
+               for key in ('pickup_location', 'delivery_location'))
+
+def optimize_partition(region, vehicles, orders, assignment, start_time, time_limit):
+    """Runs in a worker process: the current plans' cost against a joint re-solve
+
+    vehicles are plan_fleet vehicle dicts, assignment maps order id -> the
+    vehicle holding it now. Returns totals for both and the orders that change
+    vehicle in the joint solution.
+    """
+    started = time.perf_counter()
+    baseline_minutes, baseline_served = 0.0, 0
+    for vehicle in vehicles:
+        held = [order for order in orders if assignment[order['order_id']] == vehicle['id']]
+        plan, rejected = build_route_plan(vehicle.get('location'), held, vehicle.get('capacity'),
+                                          start_time, vehicle.get('load', 0))
+        baseline_minutes += plan.total_minutes
+        baseline_served += len(held) - len(rejected)
+
+    fleet = plan_fleet(vehicles, orders, start_time, time_limit)
+    moved = {}
+    for vehicle_id, route in fleet['routes'].items():
+        for stop in route:
+            if assignment[stop['order_id']] != vehicle_id:
+                moved[stop['order_id']] = {'order_id': stop['order_id'],
+                                           'from': assignment[stop['order_id']], 'to': vehicle_id}
+    return {
+        'region': region,
+        'drivers': len(vehicles),
+        'orders': len(orders),
+        'baseline_minutes': round(baseline_minutes, 1),
+        'baseline_served': baseline_served,
+        'optimized_minutes': fleet['total_minutes'],
+        'optimized_served': len(orders) - len(fleet['rejected']),
+        'transfers': list(moved.values()),
+        'solver': fleet['solver'],
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+class FleetOptimizer:
+    def __init__(self, interval=FLEET_SWEEP_INTERVAL, max_workers=FLEET_SWEEP_WORKERS, time_limit=FLEET_SWEEP_TIME,
+                 precision=FLEET_SWEEP_REGION_PRECISION, min_gain=FLEET_SWEEP_MIN_GAIN,
+                 auto_apply=FLEET_SWEEP_AUTO_APPLY):
+        self.interval = interval
+        self.max_workers = max_workers
+        self.time_limit = time_limit
+        self.precision = precision
+        self.min_gain = min_gain
+        self.auto_apply = auto_apply
+        self.proposals = OrderedDict()  # proposal id -> proposal, oldest first
+        self.last_sweep = None
+        self._executor = None
+        self._sweep_lock = threading.Lock()
+        self._thread = None
+        self.stats = {'sweeps': 0, 'partitions': 0, 'timeouts': 0, 'proposals': 0, 'applied': 0}
+
+    def start(self):
+        """Sweep every interval seconds in a background thread"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._sweep_loop, name='fleet-sweep', daemon=True)
+        self._thread.start()
+
+    def sweep(self, agents=None):
+        """Re-solve every region with two or more drivers and record the proposals worth making;
+        returns the sweep report (None if a sweep is already running)"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._sweep(agents)
+        finally:
+            self._sweep_lock.release()
+
+    def sweep_async(self):
+        """Start a sweep in the background; False if one is already running"""
+        if self._sweep_lock.locked():
+            return False
+        threading.Thread(target=self.sweep, name='fleet-sweep-once', daemon=True).start()
+        return True
+
+    def apply(self, proposal_id, agents=None):
+        """Move the proposal's orders between drivers; orders that were picked up, completed or
+        reassigned since the sweep, or that the new driver cannot fit, stay where they are"""
+        proposal = self.proposals.get(proposal_id)
+        if proposal is None or proposal['status'] != 'proposed':
+            return None
+        agents = self._agents() if agents is None else agents
+        results = []
+        for transfer in proposal['transfers']:
+            giver, taker = agents.get(transfer['from']), agents.get(transfer['to'])
+            order = giver.release_order(transfer['order_id']) if giver is not None and taker is not None else None
+            if order is None:
+                results.append(dict(transfer, status='skipped'))
+                continue
+            if taker.accept_order(order):
+                results.append(dict(transfer, status='moved'))
+                self._record_transfer(order['order_id'], taker.agent_id)
+            else:
+                giver.restore_order(order)
+                results.append(dict(transfer, status='rejected'))
+        proposal['status'] = 'applied'
+        proposal['results'] = results
+        self.stats['applied'] += 1
+        return proposal
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['open_proposals'] = sum(1 for p in self.proposals.values() if p['status'] == 'proposed')
+        stats['workers'] = self.max_workers
+        return stats
+
+    def _sweep(self, agents):
+        started = time.perf_counter()
+        start_time = datetime.now()
+        partitions = self._partitions(self._agents() if agents is None else agents)
+        if green_runtime():
+            results, timed_out = run_in_os_thread(self._solve_in_sweep_pool, partitions, start_time)
+        else:
+            results, timed_out = self._solve_in_pool(partitions, start_time, self._get_executor())
+        self.stats['timeouts'] += len(timed_out)
+
+        proposals = []
+        for result in results:
+            proposal = self._proposal(result)
+            if proposal is not None:
+                proposals.append(proposal)
+
+        self.stats['sweeps'] += 1
+        self.stats['partitions'] += len(results)
+        self.last_sweep = {
+            'started_at': start_time.isoformat(),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            'partitions': sorted(results, key=lambda result: result['region']),
+            'timed_out': sorted(timed_out),
+            'proposals': [proposal['proposal_id'] for proposal in proposals]
+        }
+        if proposals:
+            print(f"🔀 Fleet sweep: {len(proposals)} transfer proposals across {len(results)} regions")
+        for proposal in proposals:
+            if self.auto_apply:
+                self.apply(proposal['proposal_id'], agents)
+        return self.last_sweep
+
+    def _solve_in_pool(self, partitions, start_time, executor):
+        """(results, regions timed out) with the partitions spread over the process pool"""
+        futures = {executor.submit(optimize_partition, region, vehicles, orders, assignment,
+                                               start_time, self.time_limit): region
+                   for region, (vehicles, orders, assignment) in partitions.items()}
+        # Partitions run max_workers at a time, each within its time limit plus model
+        # building; a new pool also waits for its workers to start
+        rounds = math.ceil(len(futures) / self.max_workers)
+        done, not_done = (wait(futures, timeout=rounds * (self.time_limit * 1.5 + 1) + 30)
+                          if futures else (set(), set()))
+        for future in not_done:
+            future.cancel()
+
+        results = []
+        for future in done:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Fleet sweep error in region {futures[future]}: {e}")
+        return results, [futures[future] for future in not_done]
+
+    def _solve_in_sweep_pool(self, partitions, start_time):
+        """_solve_in_pool with a pool that lives for this sweep only (green runtimes)
+
+        Monkey patching makes the pool's manager and queue threads green threads of
+        the OS thread that creates the pool; they only run while that thread waits
+        on them, so the pool must not outlive this call.
+        """
+        if not partitions:
+            return [], []
+        executor = self._new_executor(min(self.max_workers, len(partitions)))
+        try:
+            return self._solve_in_pool(partitions, start_time, executor)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _proposal(self, result):
+        """A proposal if the re-solve serves more orders, or saves min_gain minutes per moved order"""
+        transfers = result['transfers']
+        gain = result['baseline_minutes'] - result['optimized_minutes']
+        if not transfers or result['optimized_served'] < result['baseline_served']:
+            return None
+        if result['optimized_served'] == result['baseline_served'] and gain < self.min_gain * len(transfers):
+            return None
+
+        proposal = {
+            'proposal_id': uuid.uuid4().hex[:12],
+            'region': result['region'],
+            'transfers': transfers,
+            'gain_minutes': round(gain, 1),
+            'extra_orders_served': result['optimized_served'] - result['baseline_served'],
+            'created_at': datetime.now().isoformat(),
+            'status': 'proposed'
+        }
+        self.proposals[proposal['proposal_id']] = proposal
+        while len(self.proposals) > FLEET_PROPOSALS_KEPT:
+            self.proposals.popitem(last=False)
+        self.stats['proposals'] += 1
+
+        from api.realtime import STAFF_ROOMS, emit_event
+        emit_event('fleet_proposal', proposal, STAFF_ROOMS)
+        return proposal
+
+    def _partitions(self, agents):
+        """region -> (vehicles, movable orders, order id -> vehicle id) for regions with 2+ drivers"""
+        regions = {}
+        for agent in agents.values():
+            # Copied under the agent's lock: requests keep assigning orders meanwhile
+            snapshot = agent.fleet_snapshot()
+            location = snapshot['location']
+            if not (location.get('lat') or location.get('lng')):
+                continue  # position unknown: cannot be placed in a region
+            region = geohash(location['lat'], location['lng'], self.precision)
+            regions.setdefault(region, []).append(snapshot)
+
+        partitions = {}
+        for region, members in regions.items():
+            if len(members) < 2:
+                continue
+            vehicles, orders, assignment = [], [], {}
+            for snapshot in members:
+                held = snapshot['orders']
+                # Orders on board stay with their driver; their weight is the starting load
+                on_board = sum(o.get('weight', 1) for o in held if o.get('status') == 'picked_up')
+                vehicles.append({'id': snapshot['agent_id'], 'location': snapshot['location'],
+                                 'capacity': snapshot['capacity'], 'load': on_board})
+                for order in held:
+                    if order.get('status') != 'picked_up' and _has_coordinates(order):
+                        orders.append(order)
+                        assignment[order['order_id']] = snapshot['agent_id']
+            if orders:
+                partitions[region] = (vehicles, orders, assignment)
+        return partitions
+
+    def _agents(self):
+        from api.extensions import active_agents
+        return {agent_id: agent for agent_id, agent in list(active_agents.items())
+                if hasattr(agent, 'fleet_snapshot')}
+
+    def _record_transfer(self, order_id, agent_id):
+        from api.extensions import active_agents
+        warehouse = active_agents.get('warehouse_001')
+        if warehouse is not None and order_id in getattr(warehouse, 'assigned_orders', {}):
+            warehouse.assigned_orders[order_id] = agent_id
+        try:
+            from services.repository import get_repository
+            get_repository().save_assignment({
+                'order_id': order_id,
+                'agent_id': agent_id,
+                'assigned_at': datetime.now(),
+                'source': 'fleet_sweep'
+            })
+        except Exception as e:
+            print(f"   ⚠️ Could not persist transfer: {e}")
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = self._new_executor(self.max_workers)
+        return self._executor
+
+    def _new_executor(self, max_workers):
+        # spawn: forking a process that runs Socket.IO and agent threads is unsafe
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Fleet sweep error: {e}")
+
+# Global fleet optimizer
+fleet_optimizer = FleetOptimizer()
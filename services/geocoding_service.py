@@ -3,43 +3,68 @@ Geocoding Service - Convert addresses to coordinates
 Uses Nominatim (OpenStreetMap) - Free, no API key needed
 """
 
+import os
 import requests
+import threading
 import time
+from collections import OrderedDict
+from services.lazy import LazyService
+
+def normalize_address(address):
+    """Cache/dedupe key for an address: case and whitespace insensitive"""
+    return ' '.join(address.split()).casefold()
 
 class GeocodingService:
     def __init__(self):
-        self.base_url = 'https://nominatim.openstreetmap.org'
+        self.base_url = os.getenv('GEOCODING_URL', 'https://nominatim.openstreetmap.org')
         self.headers = {
             'User-Agent': 'OptiroRoute/1.0'
         }
-    
+        # Public Nominatim allows one request per second; a self-hosted
+        # instance can set GEOCODING_MIN_INTERVAL=0
+        self.min_interval = float(os.getenv('GEOCODING_MIN_INTERVAL', '1.0'))
+        self.timeout = float(os.getenv('GEOCODING_TIMEOUT', '10'))
+        self.cache_size = int(os.getenv('GEOCODING_CACHE_SIZE', '4096'))
+        self._session = requests.Session()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._next_request_at = 0.0
+
     def geocode_address(self, address):
         """Convert address to coordinates"""
+        key = normalize_address(address)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
         url = f'{self.base_url}/search'
-        
+
         params = {
             'q': address,
             'format': 'json',
             'limit': 1
         }
-        
+
         try:
-            time.sleep(1)  # Rate limiting - be nice to free service
-            response = requests.get(url, params=params, headers=self.headers)
-            
+            self._wait_for_rate_limit()  # Be nice to free service
+            response = self._session.get(url, params=params, headers=self.headers, timeout=self.timeout)
+
             if response.status_code == 200:
                 data = response.json()
                 if data:
                     result = data[0]
-                    return {
+                    geo = {
                         'address': result.get('display_name'),
                         'lat': float(result.get('lat')),
                         'lng': float(result.get('lon')),
                         'success': True
                     }
+                    self._cache_put(key, geo)
+                    return dict(geo)
         except Exception as e:
             print(f"Geocoding error: {e}")
-        
+
         return {
             'address': address,
             'lat': 40.7128,
@@ -48,4 +73,32 @@ class GeocodingService:
             'error': 'Could not geocode address'
         }
 
-geocoding_service = GeocodingService()
\ No newline at end of file
+    def _wait_for_rate_limit(self):
+        """Space requests min_interval apart across all threads, sleeping only as needed"""
+        if self.min_interval <= 0:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            geo = self._cache.get(key)
+            if geo is None:
+                return None
+            self._cache.move_to_end(key)
+            return dict(geo)
+
+    def _cache_put(self, key, geo):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = geo
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+geocoding_service = LazyService(GeocodingService)
@@ -0,0 +1,33 @@
+"""
+Lazy Singletons - Defer service construction until first use
+Keeps `from services.x import x_service` cheap at import time
+"""
+
+import threading
+
+class LazyService:
+    """Proxy that builds the wrapped service on first attribute access"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def _get_instance(self):
+        """Build the service once, thread-safe"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def _is_loaded(self):
+        """True once the wrapped service has been constructed"""
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        return getattr(self._get_instance(), name)
+
+    def __repr__(self):
+        state = 'loaded' if self._is_loaded() else 'deferred'
+        return f'<LazyService {getattr(self._factory, "__name__", self._factory)} ({state})>'
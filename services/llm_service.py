@@ -3,17 +3,164 @@ LLM Service - OpenAI integration for intelligent chat
 """
 
 import os
+import re
 import json
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dotenv import load_dotenv
+from services.lazy import LazyService
+from services.order_parser import parse_order_text
 
 load_dotenv()
 
+# Regex fast path: messages the regex parser handles with this confidence
+# (0-1) never reach the LLM
+REGEX_CONFIDENCE_THRESHOLD = float(os.getenv('LLM_REGEX_CONFIDENCE', '0.9'))
+EXTRACTION_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '1024'))
+
+# Scheduler: at most LLM_MAX_CONCURRENCY provider calls in flight, at most
+# LLM_MAX_PENDING queued; callers wait LLM_DEADLINE_MS before using regex
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_MAX_PENDING = int(os.getenv('LLM_MAX_PENDING', '64'))
+LLM_DEADLINE = int(os.getenv('LLM_DEADLINE_MS', '2000')) / 1000
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '10'))
+# Micro-batching: pack messages arriving within the window into one prompt
+LLM_BATCH_WINDOW = int(os.getenv('LLM_BATCH_WINDOW_MS', '0')) / 1000
+LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', '8'))
+
+PROVIDER_MODELS = {
+    'groq': 'llama-3.1-8b-instant',
+    'openai': 'gpt-3.5-turbo'
+}
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PUNCT_RE = re.compile(r'[\s.!?,;]+$')
+
+def normalize_message(message):
+    """Normalize a chat message for cache lookups (case, spacing, trailing punctuation)"""
+    text = _WHITESPACE_RE.sub(' ', message.strip().lower())
+    return _TRAILING_PUNCT_RE.sub('', text)
+
+class LLMScheduler:
+    """Runs LLM calls on a bounded pool, optionally packing queued messages into one prompt"""
+    
+    def __init__(self, call_one, call_batch=None, max_concurrency=4, max_pending=64,
+                 batch_window=0.0, batch_size=8):
+        self._call_one = call_one
+        self._call_batch = call_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.batching = bool(call_batch and batch_window > 0 and batch_size > 1)
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._batch_queue = queue.Queue()
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+    
+    def submit(self, message):
+        """Queue a message; returns a Future of the extraction (or None on failure),
+        or None right away when too many requests are already pending"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        
+        if self.batching:
+            self._ensure_batcher()
+            future = Future()
+            self._batch_queue.put((message, future))
+        else:
+            future = self._executor.submit(self._safe_call_one, message)
+        
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+    
+    def _safe_call_one(self, message):
+        try:
+            return self._call_one(message)
+        except Exception as e:
+            print(f"LLM call error: {e}")
+            return None
+    
+    def _ensure_batcher(self):
+        with self._batcher_lock:
+            if self._batcher is None:
+                self._batcher = threading.Thread(target=self._batch_loop, daemon=True)
+                self._batcher.start()
+    
+    def _batch_loop(self):
+        """Collect up to batch_size messages within batch_window, then dispatch"""
+        while True:
+            batch = [self._batch_queue.get()]
+            window_end = time.monotonic() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._batch_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run_batch, batch)
+    
+    def _run_batch(self, batch):
+        # Callers whose deadline already expired cancelled their future
+        live = [(message, future) for message, future in batch if future.set_running_or_notify_cancel()]
+        if not live:
+            return
+        
+        messages = [message for message, _ in live]
+        if len(messages) == 1:
+            results = [self._safe_call_one(messages[0])]
+        else:
+            try:
+                results = self._call_batch(messages)
+            except Exception as e:
+                print(f"LLM batch error: {e}")
+                results = [None] * len(messages)
+        
+        for (_, future), result in zip(live, results):
+            future.set_result(result)
+
 class LLMService:
     def __init__(self):
         self.provider = os.getenv('LLM_PROVIDER', 'regex').lower()
         self.use_llm = False
         self.client = None
         
+        # Tiered parsing: regex fast path -> LRU cache -> LLM
+        self.regex_confidence_threshold = REGEX_CONFIDENCE_THRESHOLD
+        self.cache_size = EXTRACTION_CACHE_SIZE
+        self._cache = OrderedDict()
+        # Guards the cache and the stats counters (request threads update both)
+        self._cache_lock = threading.Lock()
+        self.stats = {
+            'regex_fast_path': 0,
+            'cache_hits': 0,
+            'llm_calls': 0,
+            'llm_failures': 0,
+            'llm_timeouts': 0,
+            'llm_rejected': 0,
+            'regex_fallback': 0
+        }
+        
+        self.deadline = LLM_DEADLINE
+        self.request_timeout = LLM_REQUEST_TIMEOUT
+        self._init_client()
+        self.scheduler = None
+        if self.use_llm:
+            self.scheduler = LLMScheduler(
+                self._extract_with_llm,
+                self._extract_batch_with_llm,
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                max_pending=LLM_MAX_PENDING,
+                batch_window=LLM_BATCH_WINDOW,
+                batch_size=LLM_BATCH_SIZE
+            )
+    
+    def _init_client(self):
+        """Pick the LLM provider from the environment"""
         # Try Groq first (FREE and FAST)
         if self.provider == 'groq' or not self.use_llm:
             groq_key = os.getenv('GROQ_API_KEY', '')
@@ -46,18 +193,142 @@ class LLMService:
         print("Using regex parser (works well with 'from X to Y' format)")
     
     def extract_order_details(self, user_message):
-        """Extract order details from user message using LLM or fallback"""
+        """Extract order details: regex fast path, then cache, then LLM"""
         
-        if self.use_llm:
-            if self.provider == 'groq':
-                return self._extract_with_groq(user_message)
-            elif self.provider == 'openai':
-                return self._extract_with_openai(user_message)
+        if not self.use_llm:
+            self._count('regex_fallback')
+            return self._extract_with_regex(user_message)
+        
+        # Tier 1: messages the regex parses with certainty skip the LLM
+        parsed = self._extract_with_regex(user_message)
+        if parsed['confidence'] >= self.regex_confidence_threshold:
+            self._count('regex_fast_path')
+            return parsed
         
-        return self._extract_with_regex(user_message)
+        # Tier 2: identical or near-identical messages seen before
+        key = normalize_message(user_message)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self._count('cache_hits')
+            return cached
+        
+        # Tier 3: LLM round trip on the bounded pool, regex if it misses the deadline
+        future = self.scheduler.submit(user_message)
+        if future is None:
+            self._count('llm_rejected', 'regex_fallback')
+            return parsed
+        
+        self._count('llm_calls')
+        # Successful results are cached even when they arrive after the deadline
+        future.add_done_callback(lambda f: self._cache_llm_result(key, f))
+        try:
+            result = future.result(timeout=self.deadline)
+        except FutureTimeout:
+            future.cancel()
+            self._count('llm_timeouts', 'regex_fallback')
+            return parsed
+        
+        if result is None:
+            self._count('llm_failures', 'regex_fallback')
+            return parsed
+        
+        return dict(result)
+    
+    def _cache_llm_result(self, key, future):
+        if future.cancelled():
+            return
+        result = future.result()
+        if result and result.get('success'):
+            self._cache_put(key, result)
+    
+    def _extract_with_llm(self, user_message):
+        """Single-message extraction with the configured provider"""
+        if self.provider == 'groq':
+            return self._extract_with_groq(user_message)
+        elif self.provider == 'openai':
+            return self._extract_with_openai(user_message)
+        return None
+    
+    def _extract_batch_with_llm(self, messages):
+        """Extract several messages with one multi-message prompt; list of results (None per failure)"""
+        numbered = "\n".join(f"{i + 1}. {message}" for i, message in enumerate(messages))
+        response = self.client.chat.completions.create(
+            model=PROVIDER_MODELS[self.provider],
+            messages=[
+                {
+                    "role": "system",
+                    "content": """Extract delivery order details from each numbered user message. Return ONLY a valid JSON array with exactly one object per message, in the same order.
+
+Object format:
+{
+  "pickup_address": "location",
+  "delivery_address": "location",
+  "weight": number,
+  "notes": "text",
+  "success": true/false
+}"""
+                },
+                {
+                    "role": "user",
+                    "content": numbered
+                }
+            ],
+            temperature=0.1,
+            max_tokens=120 * len(messages),
+            timeout=self.request_timeout
+        )
+        
+        result = response.choices[0].message.content
+        json_start = result.find('[')
+        json_end = result.rfind(']') + 1
+        if json_start < 0 or json_end <= json_start:
+            return [None] * len(messages)
+        
+        items = json.loads(result[json_start:json_end])
+        if not isinstance(items, list) or len(items) != len(messages):
+            return [None] * len(messages)
+        
+        results = []
+        for item in items:
+            if isinstance(item, dict):
+                item['message'] = 'Order details extracted'
+                results.append(item)
+            else:
+                results.append(None)
+        return results
+    
+    def _cache_get(self, key):
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                return None
+            self._cache.move_to_end(key)
+            return dict(result)
+    
+    def _cache_put(self, key, result):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = dict(result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def _count(self, *counters):
+        with self._cache_lock:
+            for counter in counters:
+                self.stats[counter] += 1
+    
+    def get_stats(self):
+        """Hit counters per parsing tier"""
+        with self._cache_lock:
+            stats = dict(self.stats)
+            stats['cache_size'] = len(self._cache)
+        stats['provider'] = self.provider if self.use_llm else 'regex'
+        return stats
     
     def _extract_with_groq(self, user_message):
-        """Use Groq (FREE) to extract order details"""
+        """Use Groq (FREE) to extract order details (None on failure)"""
         try:
             response = self.client.chat.completions.create(
                 model="llama-3.1-8b-instant",  # Fast and free!
@@ -85,7 +356,8 @@ Examples:
                     }
                 ],
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=200,
+                timeout=self.request_timeout
             )
             
             result = response.choices[0].message.content
@@ -93,7 +365,6 @@ Examples:
             # Parse JSON
             try:
                 # Extract JSON from response
-                import json
                 json_start = result.find('{')
                 json_end = result.rfind('}') + 1
                 if json_start >= 0 and json_end > json_start:
@@ -107,10 +378,10 @@ Examples:
         except Exception as e:
             print(f"Groq error: {e}")
         
-        return self._extract_with_regex(user_message)
+        return None
     
     def _extract_with_openai(self, user_message):
-        """Use OpenAI to extract order details"""
+        """Use OpenAI to extract order details (None on failure)"""
         try:
             response = self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
@@ -143,7 +414,8 @@ Examples:
                     }
                 ],
                 temperature=0.1,
-                max_tokens=200
+                max_tokens=200,
+                timeout=self.request_timeout
             )
             
             result = response.choices[0].message.content
@@ -153,66 +425,15 @@ Examples:
                 data = json.loads(result)
                 return data
             except:
-                # If not valid JSON, try to extract from text
-                return self._extract_with_regex(user_message)
+                # If not valid JSON, caller falls back to regex
+                return None
                 
         except Exception as e:
             print(f"OpenAI error: {e}")
-            return self._extract_with_regex(user_message)
+            return None
     
     def _extract_with_regex(self, text):
-        """Fallback: Extract using regex patterns"""
-        import re
-        
-        # Flexible pattern: finds "from X to Y" anywhere in text
-        pattern = r'from\s+(.+?)\s+to\s+(.+?)(?:\s*\d+\s*kg|\s*,|\.|$)'
-        match = re.search(pattern, text, re.IGNORECASE)
-        
-        pickup = None
-        delivery = None
-        
-        if match:
-            pickup = match.group(1).strip()
-            delivery = match.group(2).strip()
-            
-            # Clean up pickup and delivery
-            pickup = pickup.strip(' ,')
-            delivery = delivery.strip(' ,')
-            
-            # Remove weight from delivery if captured
-            delivery = re.sub(r'\s*\d+\s*kg.*$', '', delivery, flags=re.IGNORECASE)
-            delivery = delivery.strip()
-        
-        # Extract weight - simple pattern
-        weight = 1.0
-        weight_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:kg|kilo)', text, re.IGNORECASE)
-        if weight_match:
-            weight = float(weight_match.group(1))
-        
-        # Extract notes
-        notes = ""
-        if 'fragile' in text.lower():
-            notes = "Fragile"
-        elif 'urgent' in text.lower():
-            notes = "Urgent"
-        
-        success = bool(pickup and delivery)
-        
-        if pickup and delivery:
-            print(f"  Pickup: '{pickup}'")
-            print(f"  Delivery: '{delivery}'")
-            print(f"  Weight: {weight} kg")
-        else:
-            print(f"  Could not extract locations from: '{text}'")
-            print(f"  Try: 'from [pickup] to [delivery]'")
-        
-        return {
-            "pickup_address": pickup,
-            "delivery_address": delivery,
-            "weight": weight,
-            "notes": notes,
-            "success": success,
-            "message": "Order details extracted" if success else "I need both locations. Try: 'from Empire State Building to Times Square' or 'from Central Park to Brooklyn 5kg'"
-        }
+        """Fallback: Extract using the precompiled order-text parser"""
+        return parse_order_text(text)
 
-llm_service = LLMService()
\ No newline at end of file
+llm_service = LazyService(LLMService)
\ No newline at end of file
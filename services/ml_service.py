@@ -3,21 +3,20 @@ Machine Learning Service - scikit-learn integration
 """
 
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error
 import pickle
 import os
 from datetime import datetime
+from services.lazy import LazyService
+
+# scikit-learn is imported inside the methods that need it: it is the
+# heaviest import in the backend and most workers never train a model.
 
 class MLService:
     def __init__(self):
         self.traffic_model = None
         self.delivery_time_model = None
         self.cost_model = None
-        self.scaler = StandardScaler()
+        self.scaler = None
         self.models_dir = 'models'
         
         # Create models directory
@@ -49,7 +48,12 @@ class MLService:
         X = np.array(X)
         y = np.array(y)
         
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.metrics import mean_absolute_error
+        
         # Scale features
+        self.scaler = StandardScaler()
         X_scaled = self.scaler.fit_transform(X)
         
         # Train model
@@ -68,7 +72,7 @@ class MLService:
     
     def predict_traffic(self, hour, day_of_week, weather_impact=0):
         """Predict traffic using trained model"""
-        if self.traffic_model is None:
+        if self.traffic_model is None or self.scaler is None:
             # Fallback to simple rules
             if 7 <= hour <= 9 or 17 <= hour <= 19:
                 return 70 + weather_impact * 0.3
@@ -107,6 +111,9 @@ class MLService:
         X = np.array(X)
         y = np.array(y)
         
+        from sklearn.linear_model import LinearRegression
+        from sklearn.metrics import mean_absolute_error
+        
         # Train model
         self.delivery_time_model = LinearRegression()
         self.delivery_time_model.fit(X, y)
@@ -134,6 +141,17 @@ class MLService:
         
         return max(5, prediction)  # Minimum 5 minutes
     
+    def predict_delivery_times(self, distances, weights, traffic_levels=50, weather_impact=0, hours=12):
+        """predict_delivery_time for many trips in one model call (arguments are arrays or scalars)"""
+        distances = np.asarray(distances, dtype=np.float64)
+        if self.delivery_time_model is None:
+            traffic_factor = 1 + np.asarray(traffic_levels, dtype=np.float64) / 200
+            weather_factor = 1 + np.asarray(weather_impact, dtype=np.float64) / 500
+            return distances * 3 * traffic_factor * weather_factor
+        
+        features = np.column_stack(np.broadcast_arrays(distances, weights, traffic_levels, weather_impact, hours))
+        return np.maximum(5, self.delivery_time_model.predict(features.astype(np.float64)))
+    
     def train_cost_optimization_model(self, cost_data):
         """Train cost optimization model"""
         if len(cost_data) < 10:
@@ -158,6 +176,9 @@ class MLService:
         X = np.array(X)
         y = np.array(y)
         
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.metrics import mean_absolute_error
+        
         # Train model
         self.cost_model = RandomForestRegressor(n_estimators=50, random_state=42)
         self.cost_model.fit(X, y)
@@ -258,4 +279,4 @@ class MLService:
             print(f"Error loading models: {e}")
 
 # Global ML service instance
-ml_service = MLService()
\ No newline at end of file
+ml_service = LazyService(MLService)
\ No newline at end of file
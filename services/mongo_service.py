@@ -0,0 +1,80 @@
+"""
+MongoDB Service - Lazy client with background connectivity probe
+The system works without a database; routes ask for `get_db()` and get None until Mongo answers
+"""
+
+import os
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class MongoService:
+    def __init__(self):
+        self.uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/optiroute')
+        self.timeout_ms = int(os.getenv('MONGODB_TIMEOUT_MS', '2000'))
+        self.retry_interval = int(os.getenv('MONGODB_RETRY_INTERVAL', '30'))
+        self.client = None
+        self.db = None
+        self.available = False
+        self._probe_thread = None
+        self._lock = threading.Lock()
+        self._on_connect = []
+
+    def start_probe(self):
+        """Probe connectivity in the background (never blocks the caller)"""
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+            self._probe_thread.start()
+
+    def get_db(self):
+        """Return the database handle, or None while Mongo is unavailable"""
+        if self._probe_thread is None:
+            self.start_probe()
+        return self.db if self.available else None
+
+    def on_connect(self, callback):
+        """Run callback(db) once the connection is established"""
+        self._on_connect.append(callback)
+        if self.available:
+            self._run_callback(callback)
+
+    def _probe_loop(self):
+        """Connect, retrying periodically until Mongo answers"""
+        logged_unavailable = False
+        while not self.available:
+            if self._connect():
+                return
+            if not logged_unavailable:
+                print("MongoDB not available - using in-memory storage")
+                logged_unavailable = True
+            if self.retry_interval <= 0:
+                return
+            time.sleep(self.retry_interval)
+
+    def _connect(self):
+        try:
+            from pymongo import MongoClient
+            client = MongoClient(self.uri, serverSelectionTimeoutMS=self.timeout_ms)
+            client.server_info()  # Test connection
+        except Exception:
+            return False
+
+        self.client = client
+        self.db = client.optiroute
+        self.available = True
+        print("MongoDB connected")
+        for callback in list(self._on_connect):
+            self._run_callback(callback)
+        return True
+
+    def _run_callback(self, callback):
+        try:
+            callback(self.db)
+        except Exception as e:
+            print(f"MongoDB connect hook error: {e}")
+
+mongo_service = MongoService()
@@ -6,6 +6,7 @@ Get API key from: https://openrouteservice.org/dev/#/signup
 import requests
 import os
 from dotenv import load_dotenv
+from services.lazy import LazyService
 
 load_dotenv()
 
@@ -15,6 +16,9 @@ class OpenRouteService:
         # Remove quotes if present
         self.api_key = api_key.strip('"').strip()
         self.base_url = 'https://api.openrouteservice.org'
+        # Directions calls reuse one keep-alive session; OPENROUTE_TIMEOUT caps each
+        self.timeout = float(os.getenv('OPENROUTE_TIMEOUT', '10'))
+        self._session = requests.Session()
     
     def get_route(self, start_coords, end_coords, profile='driving-car'):
         """Get optimized route between two points"""
@@ -34,7 +38,7 @@ class OpenRouteService:
         }
         
         try:
-            response = requests.post(url, json=body, headers=headers)
+            response = self._session.post(url, json=body, headers=headers, timeout=self.timeout)
             if response.status_code == 200:
                 data = response.json()
                 feature = data['features'][0]
@@ -78,4 +82,4 @@ class OpenRouteService:
             'coordinates': [[start['lng'], start['lat']], [end['lng'], end['lat']]]
         }
 
-openroute_service = OpenRouteService()
\ No newline at end of file
+openroute_service = LazyService(OpenRouteService)
\ No newline at end of file
@@ -6,6 +6,7 @@ Get API key from: https://openweathermap.org/api
 import requests
 import os
 from dotenv import load_dotenv
+from services.lazy import LazyService
 
 load_dotenv()
 
@@ -13,6 +14,9 @@ class OpenWeatherService:
     def __init__(self):
         self.api_key = os.getenv('OPENWEATHER_API_KEY', '')
         self.base_url = 'https://api.openweathermap.org/data/2.5'
+        # A route request looks up weather at both ends: keep the connection, cap each at OPENWEATHER_TIMEOUT
+        self.timeout = float(os.getenv('OPENWEATHER_TIMEOUT', '10'))
+        self._session = requests.Session()
     
     def get_current_weather(self, lat, lng):
         """Get current weather for location"""
@@ -26,7 +30,7 @@ class OpenWeatherService:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self._session.get(url, params=params, timeout=self.timeout)
             if response.status_code == 200:
                 data = response.json()
                 return {
@@ -86,4 +90,4 @@ class OpenWeatherService:
             'rain': 0
         }
 
-openweather_service = OpenWeatherService()
\ No newline at end of file
+openweather_service = LazyService(OpenWeatherService)
\ No newline at end of file
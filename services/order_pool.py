@@ -0,0 +1,245 @@
+"""
+Order Pool - Batch incoming orders by pickup area and direction before dispatch
+Orders are bucketed by the geohash of their pickup; an order joins an open
+batch heading the same way (pickup -> delivery bearing) in its own cell or,
+failing that, one of the eight around it, so pickups either side of a cell
+edge still pool. A batch is dispatched as one unit when it is full or its
+oldest order has waited the maximum time (a couple of seconds by default, so
+pooling never delays an order by much), so dispatch sees fewer,
+better-structured problems.
+"""
+
+import atexit
+import functools
+import math
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 0 disables pooling: every order is dispatched on its own as it arrives
+ORDER_POOL_MAX_WAIT = int(os.getenv('ORDER_POOL_MAX_WAIT_MS', '2000')) / 1000
+ORDER_POOL_MAX_BATCH = int(os.getenv('ORDER_POOL_MAX_BATCH', '8'))
+# Precision 6 cells are about 1.2 x 0.6 km
+ORDER_POOL_GEOHASH_PRECISION = int(os.getenv('ORDER_POOL_GEOHASH_PRECISION', '6'))
+ORDER_POOL_MAX_HEADING_DEG = float(os.getenv('ORDER_POOL_MAX_HEADING_DEG', '45'))
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def geohash(lat, lng, precision=ORDER_POOL_GEOHASH_PRECISION):
+    """Standard base32 geohash of a point"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+def geohash_bounds(cell):
+    """(lat_min, lat_max, lng_min, lng_max) of a geohash cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for bit in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            middle = (rng[0] + rng[1]) / 2
+            if value >> bit & 1:
+                rng[0] = middle
+            else:
+                rng[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+@functools.lru_cache(maxsize=4096)
+def geohash_neighbors(cell):
+    """The (up to) eight cells around a geohash cell, same precision"""
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(cell)
+    height, width = lat_max - lat_min, lng_max - lng_min
+    lat, lng = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+    neighbors = []
+    for dlat in (-1, 0, 1):
+        for dlng in (-1, 0, 1):
+            neighbor_lat = lat + dlat * height
+            if (dlat or dlng) and -90 < neighbor_lat < 90:
+                neighbor_lng = (lng + dlng * width + 180) % 360 - 180
+                neighbors.append(geohash(neighbor_lat, neighbor_lng, len(cell)))
+    return tuple(dict.fromkeys(neighbors))
+
+def heading(pickup, delivery):
+    """Initial bearing in degrees from pickup to delivery; None when they coincide"""
+    lat1, lat2 = math.radians(pickup['lat']), math.radians(delivery['lat'])
+    dlng = math.radians(delivery['lng'] - pickup['lng'])
+    x = math.sin(dlng) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlng)
+    if abs(x) < 1e-12 and abs(y) < 1e-12:
+        return None
+    return math.degrees(math.atan2(x, y)) % 360
+
+def _angle_between(a, b):
+    difference = abs(a - b) % 360
+    return min(difference, 360 - difference)
+
+def _located(order, key):
+    location = order.get(key)
+    return isinstance(location, dict) and location.get('lat') is not None and location.get('lng') is not None
+
+class OrderPool:
+    def __init__(self, dispatch, max_wait=ORDER_POOL_MAX_WAIT, max_batch=ORDER_POOL_MAX_BATCH,
+                 precision=ORDER_POOL_GEOHASH_PRECISION, max_heading=ORDER_POOL_MAX_HEADING_DEG):
+        self._dispatch = dispatch  # callable(list of orders)
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.precision = precision
+        self.max_heading = max_heading
+        self._cells = {}  # geohash -> open batches, oldest first
+        # Guards the cells and the stats counters (request threads and the flusher update both)
+        self._changed = threading.Condition()
+        self._flusher = None
+        self.stats = {'orders': 0, 'batches': 0, 'batched_orders': 0, 'full_batches': 0, 'unpooled': 0,
+                      'errors': 0}
+
+    @property
+    def enabled(self):
+        return self.max_wait > 0 and self.max_batch > 1
+
+    def submit(self, order):
+        """Add an order to a batch; returns the batch id, or None if it was dispatched alone
+        (pooling disabled, or a pickup/delivery without coordinates)"""
+        if not self.enabled or not (_located(order, 'pickup_location') and _located(order, 'delivery_location')):
+            self._count(orders=1, unpooled=1)
+            self._run([order])
+            return None
+
+        pickup = order['pickup_location']
+        cell = geohash(pickup['lat'], pickup['lng'], self.precision)
+        direction = heading(pickup, order['delivery_location'])
+        full = None
+        with self._changed:
+            self.stats['orders'] += 1
+            # The order's own cell first, then the cells around it
+            batch = next((b for nearby in (cell,) + geohash_neighbors(cell)
+                          for b in self._cells.get(nearby, ()) if self._compatible(b['heading'], direction)), None)
+            if batch is None:
+                batch = {
+                    'batch_id': uuid.uuid4().hex[:12],
+                    'cell': cell,
+                    'heading': direction,
+                    'orders': [],
+                    'due_at': time.monotonic() + self.max_wait
+                }
+                self._cells.setdefault(cell, []).append(batch)
+                self._changed.notify()
+            batch['orders'].append(order)
+            if len(batch['orders']) >= self.max_batch:
+                self._remove(batch)
+                self.stats['full_batches'] += 1
+                full = batch
+        self._ensure_flusher()
+
+        if full is not None:
+            self._run_batch(full)
+        return batch['batch_id']
+
+    def flush(self):
+        """Dispatch every open batch now"""
+        with self._changed:
+            batches = [batch for cell in self._cells.values() for batch in cell]
+            self._cells = {}
+        for batch in batches:
+            self._run_batch(batch)
+        return len(batches)
+
+    def get_stats(self):
+        with self._changed:
+            stats = dict(self.stats)
+            open_batches = [batch for cell in self._cells.values() for batch in cell]
+        stats['open_batches'] = len(open_batches)
+        stats['waiting_orders'] = sum(len(batch['orders']) for batch in open_batches)
+        stats['avg_batch_size'] = round(stats['batched_orders'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _compatible(self, batch_heading, direction):
+        """Same direction within max_heading; a batch or order without one goes with anything"""
+        if batch_heading is None or direction is None:
+            return True
+        return _angle_between(batch_heading, direction) <= self.max_heading
+
+    def _remove(self, batch):
+        """Take a batch out of its cell (caller holds the lock)"""
+        batches = self._cells.get(batch['cell'], [])
+        if batch in batches:
+            batches.remove(batch)
+        if not batches:
+            self._cells.pop(batch['cell'], None)
+
+    def _run_batch(self, batch):
+        self._count(batches=1, batched_orders=len(batch['orders']))
+        self._run(batch['orders'])
+
+    def _run(self, orders):
+        try:
+            self._dispatch(orders)
+        except Exception as e:
+            self._count(errors=1)
+            print(f"Order pool dispatch error: {e}")
+
+    def _count(self, **increments):
+        with self._changed:
+            for counter, amount in increments.items():
+                self.stats[counter] += amount
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            with self._changed:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='order-pool', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        """Dispatch batches whose oldest order has waited max_wait"""
+        while True:
+            with self._changed:
+                now = time.monotonic()
+                due = [batch for cell in self._cells.values() for batch in cell if batch['due_at'] <= now]
+                for batch in due:
+                    self._remove(batch)
+                if not due:
+                    next_due = min((batch['due_at'] for cell in self._cells.values() for batch in cell),
+                                   default=None)
+                    self._changed.wait(None if next_due is None else next_due - now)
+                    continue
+            for batch in due:
+                self._run_batch(batch)
+
+def dispatch_to_warehouse(orders):
+    """Hand a batch to the warehouse agent (a single order goes through receive_order)"""
+    from api.extensions import active_agents
+
+    warehouse = active_agents.get('warehouse_001')
+    if warehouse is None:
+        return
+    if len(orders) == 1:
+        warehouse.receive_order(orders[0])
+    else:
+        warehouse.receive_batch(orders)
+
+# Global order pool
+order_pool = OrderPool(dispatch_to_warehouse)
+
+atexit.register(order_pool.flush)
@@ -0,0 +1,47 @@
+"""
+Pricing - Delivery cost and time model shared by chat previews and batch quotes
+Vectorized with NumPy so a whole manifest is priced in one array operation
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Base cost: $5, distance cost: $2 per km, weight cost: $1 per kg
+BASE_COST = 5.0
+COST_PER_KM = 2.0
+COST_PER_KG = 1.0
+
+# Estimated time: 3 minutes per km (20 km/h average)
+MINUTES_PER_KM = 3.0
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km between coordinate arrays (degrees)"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lng1, lat2, lng2))
+
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def price_orders(distance_km, weight):
+    """Cost and time for arrays of distances (km) and weights (kg)
+
+    Returns a dict of arrays: cost, estimated_time, base, distance, weight
+    (the last three are the cost breakdown).
+    """
+    distance_km = np.asarray(distance_km, dtype=np.float64)
+    weight = np.asarray(weight, dtype=np.float64)
+
+    distance_cost = distance_km * COST_PER_KM
+    weight_cost = weight * COST_PER_KG
+    total_cost = BASE_COST + distance_cost + weight_cost
+
+    return {
+        'cost': np.round(total_cost, 2),
+        'estimated_time': np.round(distance_km * MINUTES_PER_KM, 0),
+        'base': np.full(distance_km.shape, BASE_COST),
+        'distance': np.round(distance_cost, 2),
+        'weight': np.round(weight_cost, 2)
+    }
@@ -0,0 +1,354 @@
+"""
+Repository - Durable storage for orders, assignments and traffic observations
+MongoRepository uses the shared database; SQLiteRepository is an embedded,
+WAL-mode file for single-node deployments that run without a database server.
+Select with STORAGE_BACKEND=mongo|sqlite (default: mongo if MONGODB_URI is set).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join('data', 'optiroute.db'))
+
+class BaseRepository(ABC):
+    """Storage interface used by the API and agents; every write accepts a batch"""
+
+    name = 'base'
+
+    def save_order(self, order):
+        self.save_orders([order])
+
+    @abstractmethod
+    def save_orders(self, orders):
+        pass
+
+    @abstractmethod
+    def get_order(self, order_id):
+        """Order by its server-assigned order_id, or None"""
+
+    @abstractmethod
+    def list_orders(self, status=None, limit=50):
+        """Most recent orders first, optionally filtered by status"""
+
+    @abstractmethod
+    def update_order_status(self, order_id, status):
+        pass
+
+    def save_assignment(self, assignment):
+        self.save_assignments([assignment])
+
+    @abstractmethod
+    def save_assignments(self, assignments):
+        pass
+
+    @abstractmethod
+    def get_assignments(self, order_id=None, agent_id=None, limit=50):
+        pass
+
+    def save_traffic(self, observation):
+        self.save_traffic_batch([observation])
+
+    @abstractmethod
+    def save_traffic_batch(self, observations):
+        pass
+
+    @abstractmethod
+    def recent_traffic(self, route=None, limit=10):
+        """Latest traffic observations first, optionally for one route"""
+
+    def flush(self, timeout=10.0):
+        """Wait for buffered writes (no-op for synchronous backends)"""
+        return True
+
+class MongoRepository(BaseRepository):
+    """Inserts go through the write-behind buffers
+
+    While Mongo is unavailable (not reached yet, or down) writes also go to an
+    embedded SQLite store and reads are served from it, so the API keeps
+    working; the buffers still deliver the writes to Mongo once it is back if
+    WRITE_BUFFER_SPILL_DIR is set. Orders still in a buffer are found by get_order.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, fallback_path=SQLITE_PATH):
+        from services.mongo_service import mongo_service
+        from services.write_buffer import get_write_buffer
+
+        self._mongo = mongo_service
+        self._orders = get_write_buffer('orders')
+        self._assignments = get_write_buffer('assignments')
+        self._traffic = get_write_buffer('traffic_updates')
+        self._fallback_path = fallback_path
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+
+    def _db(self):
+        """(Mongo database, None) or, while Mongo is unavailable, (None, SQLite fallback)"""
+        db = self._mongo.get_db()
+        if db is not None:
+            return db, None
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    print("⚠️ MongoDB unavailable - serving storage from SQLite until it is back")
+                    self._fallback = SQLiteRepository(self._fallback_path)
+        return None, self._fallback
+
+    def _pending_order(self, order_id):
+        return self._orders.find_pending(lambda document: document.get('order_id') == order_id)
+
+    def save_orders(self, orders):
+        from services.storage import add_geo_points
+
+        _, fallback = self._db()
+        if fallback is not None:
+            fallback.save_orders(orders)
+        for order in orders:
+            self._orders.write(add_geo_points(dict(order)))
+
+    def get_order(self, order_id):
+        pending = self._pending_order(order_id)
+        if pending is not None:
+            return {key: value for key, value in pending.items()
+                    if key not in ('_id', 'pickup_point', 'delivery_point')}
+        db, fallback = self._db()
+        if db is None:
+            return fallback.get_order(order_id)
+        order = db.orders.find_one({'order_id': order_id}, {'_id': 0, 'pickup_point': 0, 'delivery_point': 0})
+        if order is None and self._fallback is not None:
+            # Taken while Mongo was away and not replayed into it
+            order = self._fallback.get_order(order_id)
+        return order
+
+    def list_orders(self, status=None, limit=50):
+        db, fallback = self._db()
+        if db is None:
+            return fallback.list_orders(status, limit)
+        query = {'status': status} if status else {}
+        cursor = db.orders.find(query, {'_id': 0, 'pickup_point': 0, 'delivery_point': 0})
+        return list(cursor.sort('created_at', -1).limit(limit))
+
+    def update_order_status(self, order_id, status):
+        # A queued order is written with the new status
+        pending = self._pending_order(order_id)
+        if pending is not None:
+            pending['status'] = status
+        db, fallback = self._db()
+        if db is None:
+            return fallback.update_order_status(order_id, status) or pending is not None
+        result = db.orders.update_one({'order_id': order_id}, {'$set': {'status': status}})
+        if self._fallback is not None:
+            self._fallback.update_order_status(order_id, status)
+        return result.matched_count > 0 or pending is not None
+
+    def save_assignments(self, assignments):
+        _, fallback = self._db()
+        if fallback is not None:
+            fallback.save_assignments(assignments)
+        for assignment in assignments:
+            self._assignments.write(assignment)
+
+    def get_assignments(self, order_id=None, agent_id=None, limit=50):
+        db, fallback = self._db()
+        if db is None:
+            return fallback.get_assignments(order_id, agent_id, limit)
+        query = {}
+        if order_id:
+            query['order_id'] = order_id
+        if agent_id:
+            query['agent_id'] = agent_id
+        return list(db.assignments.find(query, {'_id': 0}).sort('assigned_at', -1).limit(limit))
+
+    def save_traffic_batch(self, observations):
+        _, fallback = self._db()
+        if fallback is not None:
+            fallback.save_traffic_batch(observations)
+        for observation in observations:
+            self._traffic.write(observation)
+
+    def recent_traffic(self, route=None, limit=10):
+        db, fallback = self._db()
+        if db is None:
+            return fallback.recent_traffic(route, limit)
+        query = {'route': route} if route else {}
+        return list(db.traffic_updates.find(query, {'_id': 0}).sort('timestamp', -1).limit(limit))
+
+    def flush(self, timeout=10.0):
+        return all(buffer.flush(timeout) for buffer in (self._orders, self._assignments, self._traffic))
+
+def _to_json(document):
+    return json.dumps(document, default=_json_default, separators=(',', ':'))
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _timestamp(value):
+    """Sortable text for a datetime or ISO timestamp column"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value) if value is not None else datetime.now().isoformat()
+
+class SQLiteRepository(BaseRepository):
+    """Embedded store: one WAL-mode SQLite file, documents kept as JSON next to indexed columns
+
+    Each thread gets its own connection (WAL lets readers run alongside the
+    writer); a batch is written with executemany in one transaction.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id TEXT PRIMARY KEY,
+            status TEXT,
+            created_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS orders_status_created ON orders (status, created_at);
+        CREATE INDEX IF NOT EXISTS orders_created ON orders (created_at);
+
+        CREATE TABLE IF NOT EXISTS assignments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT,
+            agent_id TEXT,
+            assigned_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS assignments_order ON assignments (order_id, assigned_at);
+        CREATE INDEX IF NOT EXISTS assignments_agent ON assignments (agent_id, assigned_at);
+
+        CREATE TABLE IF NOT EXISTS traffic_updates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            route TEXT,
+            timestamp TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS traffic_timestamp ON traffic_updates (timestamp);
+        CREATE INDEX IF NOT EXISTS traffic_route_timestamp ON traffic_updates (route, timestamp);
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+        print(f"SQLite storage at {path}")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # WAL + NORMAL: commits survive a process crash; only a power loss can drop the last ones
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _write(self, sql, rows):
+        if not rows:
+            return
+        connection = self._connection()
+        with connection:
+            connection.executemany(sql, rows)
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def save_orders(self, orders):
+        self._write(
+            'INSERT OR REPLACE INTO orders (order_id, status, created_at, data) VALUES (?, ?, ?, ?)',
+            [(o['order_id'], o.get('status'), _timestamp(o.get('created_at')), _to_json(o)) for o in orders]
+        )
+
+    def get_order(self, order_id):
+        rows = self._query('SELECT data FROM orders WHERE order_id = ?', (order_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def list_orders(self, status=None, limit=50):
+        if status:
+            rows = self._query('SELECT data FROM orders WHERE status = ? ORDER BY created_at DESC LIMIT ?', (status, limit))
+        else:
+            rows = self._query('SELECT data FROM orders ORDER BY created_at DESC LIMIT ?', (limit,))
+        return [json.loads(row[0]) for row in rows]
+
+    def update_order_status(self, order_id, status):
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "UPDATE orders SET status = ?, data = json_set(data, '$.status', ?) WHERE order_id = ?",
+                (status, status, order_id)
+            )
+        return cursor.rowcount > 0
+
+    def save_assignments(self, assignments):
+        self._write(
+            'INSERT INTO assignments (order_id, agent_id, assigned_at, data) VALUES (?, ?, ?, ?)',
+            [(a.get('order_id'), a.get('agent_id'), _timestamp(a.get('assigned_at')), _to_json(a)) for a in assignments]
+        )
+
+    def get_assignments(self, order_id=None, agent_id=None, limit=50):
+        clauses, params = [], []
+        if order_id:
+            clauses.append('order_id = ?')
+            params.append(order_id)
+        if agent_id:
+            clauses.append('agent_id = ?')
+            params.append(agent_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._query(f'SELECT data FROM assignments {where} ORDER BY assigned_at DESC LIMIT ?', (*params, limit))
+        return [json.loads(row[0]) for row in rows]
+
+    def save_traffic_batch(self, observations):
+        self._write(
+            'INSERT INTO traffic_updates (route, timestamp, data) VALUES (?, ?, ?)',
+            [(o.get('route'), _timestamp(o.get('timestamp')), _to_json(o)) for o in observations]
+        )
+
+    def recent_traffic(self, route=None, limit=10):
+        if route:
+            rows = self._query('SELECT data FROM traffic_updates WHERE route = ? ORDER BY timestamp DESC LIMIT ?', (route, limit))
+        else:
+            rows = self._query('SELECT data FROM traffic_updates ORDER BY timestamp DESC LIMIT ?', (limit,))
+        return [json.loads(row[0]) for row in rows]
+
+_repositories = {}
+_repositories_lock = threading.Lock()
+_default_backend = None
+
+def configured_backend():
+    return _default_backend or os.getenv('STORAGE_BACKEND') or ('mongo' if os.getenv('MONGODB_URI') else 'sqlite')
+
+def set_default_backend(backend):
+    """Backend that get_repository() uses without an argument (the agent fleet's app sets it)"""
+    global _default_backend
+    _default_backend = backend
+
+def get_repository(backend=None):
+    """Shared repository for a backend, default the configured STORAGE_BACKEND;
+    one instance per backend per process"""
+    backend = backend or configured_backend()
+    repository = _repositories.get(backend)
+    if repository is None:
+        with _repositories_lock:
+            repository = _repositories.get(backend)
+            if repository is None:
+                if backend == 'sqlite':
+                    repository = SQLiteRepository()
+                elif backend == 'mongo':
+                    repository = MongoRepository()
+                else:
+                    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+                _repositories[backend] = repository
+    return repository
@@ -0,0 +1,112 @@
+"""
+Storage - Collection layout and indexes for the optiroute database
+Runs once per connection (registered as a mongo_service connect hook) so every
+query the API makes is served by an index, however large the collections grow.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Traffic observations are only useful for a while; expire them server-side
+TRAFFIC_TTL_SECONDS = int(os.getenv('TRAFFIC_TTL_HOURS', '168')) * 3600
+
+ORDER_INDEXES = [
+    # /api/orders/<order_id> - orders are looked up by their server-assigned ID, not _id
+    ([('order_id', 1)], {'name': 'order_id', 'unique': True,
+                          'partialFilterExpression': {'order_id': {'$exists': True}}}),
+    ([('client_order_id', 1)], {'name': 'client_order_id', 'sparse': True}),
+    ([('status', 1), ('created_at', -1)], {'name': 'status_created_at'}),
+    ([('created_at', -1)], {'name': 'created_at'}),
+    ([('pickup_point', '2dsphere')], {'name': 'pickup_point'}),
+    ([('delivery_point', '2dsphere')], {'name': 'delivery_point'})
+]
+
+ASSIGNMENT_INDEXES = [
+    ([('order_id', 1), ('assigned_at', -1)], {'name': 'order_assigned_at'}),
+    ([('agent_id', 1), ('assigned_at', -1)], {'name': 'agent_assigned_at'})
+]
+
+TRAFFIC_INDEXES = [
+    ([('route', 1), ('timestamp', -1)], {'name': 'route_timestamp'})
+]
+
+def to_point(location):
+    """GeoJSON point for a {'lat', 'lng'} location, or None if it has no usable coordinates"""
+    if not isinstance(location, dict):
+        return None
+    try:
+        lat, lng = float(location['lat']), float(location['lng'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return {'type': 'Point', 'coordinates': [lng, lat]}
+
+def add_geo_points(order):
+    """Add indexed GeoJSON copies of the pickup/delivery coordinates to an order document
+
+    The {'lat', 'lng'} locations the frontend uses are kept as-is; 2dsphere
+    indexes need [lng, lat] order, and documents without valid points are
+    simply left out of the geo indexes.
+    """
+    for field in ('pickup', 'delivery'):
+        point = to_point(order.get(f'{field}_location'))
+        if point is not None:
+            order[f'{field}_point'] = point
+    return order
+
+def ensure_traffic_collection(db):
+    """Create traffic_updates as a time-series collection with TTL expiry
+
+    Falls back to a regular collection with a TTL index on servers without
+    time-series support (MongoDB < 5.0). An existing collection is kept as is.
+    """
+    if 'traffic_updates' in db.list_collection_names(filter={'name': 'traffic_updates'}):
+        return
+
+    from pymongo.errors import CollectionInvalid, OperationFailure
+
+    try:
+        db.create_collection(
+            'traffic_updates',
+            timeseries={'timeField': 'timestamp', 'metaField': 'route', 'granularity': 'seconds'},
+            expireAfterSeconds=TRAFFIC_TTL_SECONDS
+        )
+        print("Storage: traffic_updates created as time-series collection")
+    except CollectionInvalid:
+        pass  # Created concurrently by another worker
+    except OperationFailure as e:
+        print(f"Storage: time-series collections unavailable ({e}), using TTL index")
+
+def _create_index(collection, keys, options):
+    """Create one index; a conflict (e.g. duplicate legacy order_ids) is reported, not fatal"""
+    from pymongo.errors import OperationFailure
+
+    try:
+        collection.create_index(keys, **options)
+    except OperationFailure as e:
+        print(f"Storage: could not create index {options.get('name')} on {collection.name}: {e}")
+
+def ensure_indexes(db):
+    """Create the collections and indexes the API relies on (idempotent)"""
+    ensure_traffic_collection(db)
+
+    for keys, options in ORDER_INDEXES:
+        _create_index(db.orders, keys, options)
+
+    for keys, options in ASSIGNMENT_INDEXES:
+        _create_index(db.assignments, keys, options)
+
+    for keys, options in TRAFFIC_INDEXES:
+        _create_index(db.traffic_updates, keys, options)
+    # /api/traffic/status reads the latest observations by timestamp. Time-series
+    # collections expire on their own; a regular one needs the index to be a TTL index.
+    if 'timeseries' in db.traffic_updates.options():
+        _create_index(db.traffic_updates, [('timestamp', -1)], {'name': 'timestamp'})
+    else:
+        _create_index(db.traffic_updates, [('timestamp', 1)],
+                      {'name': 'timestamp_ttl', 'expireAfterSeconds': TRAFFIC_TTL_SECONDS})
+
+    print("Storage: indexes ready")
@@ -0,0 +1,244 @@
+"""
+Write-Behind Buffer - Batch MongoDB inserts off the request thread
+Documents are queued and flushed with unordered insert_many when a batch
+fills or the flush interval passes. Failed batches are retried with backoff
+and, if a spill file is configured, written to disk while Mongo is away and
+replayed once it is back.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WRITE_BUFFER_BATCH = int(os.getenv('WRITE_BUFFER_BATCH', '500'))
+WRITE_BUFFER_FLUSH = int(os.getenv('WRITE_BUFFER_FLUSH_MS', '1000')) / 1000
+WRITE_BUFFER_MAX = int(os.getenv('WRITE_BUFFER_MAX', '10000'))
+# Empty disables spilling: batches that cannot be written are dropped
+WRITE_BUFFER_SPILL_DIR = os.getenv('WRITE_BUFFER_SPILL_DIR', '')
+
+class WriteBehindBuffer:
+    def __init__(self, name, get_collection, max_batch=500, flush_interval=1.0,
+                 max_buffered=10000, put_timeout=0.05, max_retries=4, spill_path=None):
+        self.name = name
+        self._get_collection = get_collection  # callable -> collection or None
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_buffered)
+        self._flusher = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._in_flight = []  # the batch the flusher is writing
+        # Guards the stats counters (request threads and the flusher update them)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'buffered': 0,
+            'written': 0,
+            'batches': 0,
+            'retries': 0,
+            'spilled': 0,
+            'replayed': 0,
+            'dropped': 0
+        }
+
+    def write(self, document):
+        """Queue a document; blocks at most put_timeout when the buffer is full.
+        Returns False if the document had to be spilled or dropped instead."""
+        self._ensure_flusher()
+        try:
+            self._queue.put(dict(document), timeout=self.put_timeout)
+            self._count(buffered=1)
+            return True
+        except queue.Full:
+            # Backpressure exhausted: keep memory bounded
+            self._spill_or_drop([dict(document)])
+            return False
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued so far has been written, spilled or dropped"""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(min(remaining, 0.05))
+        return True
+
+    def find_pending(self, match):
+        """First queued or in-flight document for which match(document) is true, or None"""
+        with self._queue.mutex:
+            pending = list(self._queue.queue)
+        for document in pending + list(self._in_flight):
+            if match(document):
+                return document
+        return None
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for counter, amount in increments.items():
+                self.stats[counter] += amount
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            with self._start_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name=f'write-behind-{self.name}', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            window_end = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._in_flight = batch
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Write buffer {self.name} error: {e}")
+                self._spill_or_drop(batch)
+            finally:
+                self._in_flight = []
+                for _ in batch:
+                    self._queue.task_done()
+                with self._idle:
+                    self._idle.notify_all()
+
+    def _write_batch(self, batch):
+        collection = self._get_collection()
+        if collection is None:
+            self._spill_or_drop(batch)
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._insert(collection, batch)
+                self._count(written=len(batch), batches=1)
+                self._replay_spill(collection)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Write buffer {self.name}: giving up after {attempt + 1} attempts: {e}")
+                    break
+                self._count(retries=1)
+                time.sleep(min(0.5 * (2 ** attempt), 8.0))
+
+        self._spill_or_drop(batch)
+
+    def _insert(self, collection, batch):
+        """Unordered insert_many; documents already written by an earlier attempt are fine"""
+        from pymongo.errors import BulkWriteError
+
+        try:
+            collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+
+    def _spill_or_drop(self, batch):
+        if not self.spill_path:
+            self._count(dropped=len(batch))
+            return
+
+        from bson import ObjectId, json_util
+
+        # Every spilled document carries its _id, so a replay cut short and run
+        # again skips the ones already written instead of inserting copies
+        for document in batch:
+            document.setdefault('_id', ObjectId())
+        with self._spill_lock:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for document in batch:
+                    f.write(json_util.dumps(document) + '\n')
+        self._count(spilled=len(batch))
+
+    def _replay_spill(self, collection):
+        """Write back documents spilled while Mongo was unavailable"""
+        if not self.spill_path:
+            return
+
+        from bson import json_util
+
+        # A leftover .replay file is from an interrupted replay; finish it first.
+        # Spilled documents all have an _id, so any that were already written
+        # are skipped as duplicate keys.
+        replay_path = self.spill_path + '.replay'
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        batch = []
+        with open(replay_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    batch.append(json_util.loads(line))
+                if len(batch) >= self.max_batch:
+                    self._insert(collection, batch)
+                    self._count(replayed=len(batch))
+                    batch = []
+        if batch:
+            self._insert(collection, batch)
+            self._count(replayed=len(batch))
+        os.remove(replay_path)
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+def get_write_buffer(collection_name):
+    """Shared write-behind buffer for a collection of the optiroute database"""
+    with _buffers_lock:
+        if collection_name not in _buffers:
+            from services.mongo_service import mongo_service
+
+            def get_collection():
+                db = mongo_service.get_db()
+                return db[collection_name] if db is not None else None
+
+            spill_path = None
+            if WRITE_BUFFER_SPILL_DIR:
+                spill_path = os.path.join(WRITE_BUFFER_SPILL_DIR, f'{collection_name}.jsonl')
+
+            _buffers[collection_name] = WriteBehindBuffer(
+                collection_name,
+                get_collection,
+                max_batch=WRITE_BUFFER_BATCH,
+                flush_interval=WRITE_BUFFER_FLUSH,
+                max_buffered=WRITE_BUFFER_MAX,
+                spill_path=spill_path
+            )
+        return _buffers[collection_name]
+
+def flush_all(timeout=5.0):
+    """Flush every buffer (called at interpreter exit)"""
+    for buffer in list(_buffers.values()):
+        buffer.flush(timeout)
+
+atexit.register(flush_all)
@@ -0,0 +1,27 @@
+"""
+WSGI Entry Point - Production server for the OptiroRoute API
+  gunicorn -c gunicorn.conf.py wsgi:app    (worker model and count from the environment)
+  python wsgi.py                           (one process on the eventlet/gevent server)
+Cooperative I/O is patched in here, before the app or any client library is imported.
+"""
+
+import os
+
+from api.async_mode import monkey_patch, resolve_async_mode, socketio_async_mode
+
+CONFIGURED_MODE = socketio_async_mode()
+ASYNC_MODE = resolve_async_mode()
+monkey_patch(ASYNC_MODE)
+# The app's SocketIO must use the same worker model that was just patched in
+os.environ['SOCKETIO_ASYNC_MODE'] = ASYNC_MODE
+
+from api.app import app, socketio
+
+if __name__ == '__main__':
+    host = os.getenv('HOST', '0.0.0.0')
+    port = int(os.getenv('PORT', '5000'))
+    print(f'OptiroRoute API on {host}:{port} ({ASYNC_MODE})')
+    if ASYNC_MODE == 'threading' and not CONFIGURED_MODE:
+        print('eventlet/gevent not installed - falling back to threads; pip install eventlet for production')
+    socketio.run(app, host=host, port=port, debug=False, log_output=False,
+                 allow_unsafe_werkzeug=ASYNC_MODE == 'threading')